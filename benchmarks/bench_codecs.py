@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Сравнение кодеков файлов данных: время dump/load и размер.
+
+Данные повторяют формат users.json, снимка журнала, rates.json и
+orders.json. Пример: python benchmarks/bench_codecs.py --users 20000
+"""
+import argparse
+import hashlib
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from valutatrade_hub.infra.codecs import available_codecs
+
+CURRENCIES = ["USD", "EUR", "GBP", "RUB", "BTC", "ETH", "SOL", "USDT"]
+
+def make_users(count: int) -> List[Dict[str, Any]]:
+    start = datetime(2025, 1, 1)
+    users = []
+    for user_id in range(1, count + 1):
+        salt = str(uuid.uuid4())
+        users.append({
+            "user_id": user_id,
+            "username": f"user_{user_id}",
+            "hashed_password": hashlib.sha256(salt.encode()).hexdigest(),
+            "salt": salt,
+            "registration_date": (start + timedelta(minutes=user_id)).isoformat(),
+        })
+    return users
+
+def make_snapshot(count: int) -> Dict[str, Any]:
+    portfolios = {}
+    for user_id in range(1, count + 1):
+        codes = random.sample(CURRENCIES, random.randint(1, 4))
+        portfolios[str(user_id)] = {code: round(random.uniform(0, 10000), 8)
+                                    for code in codes}
+    return {"seq": count * 5, "offset": count * 900,
+            "created_at": datetime.now().isoformat(), "portfolios": portfolios}
+
+def make_rates() -> Dict[str, Any]:
+    now = datetime.utcnow().isoformat() + "Z"
+    pairs = {}
+    for base in CURRENCIES[1:]:
+        for quote in CURRENCIES:
+            if base == quote:
+                continue
+            pairs[f"{base}_{quote}"] = {
+                "rate": random.uniform(0.001, 100000), "updated_at": now,
+                "source": "aggregate", "providers": ["coingecko", "exchangerate"],
+                "sources": {"coingecko": random.random(),
+                            "exchangerate": random.random()}}
+    return {"pairs": pairs, "last_refresh": now, "version": 1234}
+
+def make_orders(count: int) -> List[Dict[str, Any]]:
+    return [{"order_id": i, "user_id": random.randint(1, 1000),
+             "pair": "BTC_USD", "currency": "BTC",
+             "side": random.choice(["BUY", "SELL"]), "type": "LIMIT",
+             "trigger": "below", "price": random.uniform(20000, 80000),
+             "amount": random.uniform(0.001, 2), "status": "OPEN",
+             "created_at": datetime.now().isoformat()} for i in range(1, count + 1)]
+
+def best_of(repeats: int, func: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    datasets = {
+        "users.json": make_users(args.users),
+        "ledger_snapshot.json": make_snapshot(args.users),
+        "rates.json": make_rates(),
+        "orders.json": make_orders(args.orders),
+    }
+    codecs = available_codecs()
+    print(f"Кодеки: {', '.join(codecs)}")
+    for name, data in datasets.items():
+        print(f"\n{name}")
+        print(f"{'кодек':<10}{'размер, КБ':>12}{'dump, мс':>12}{'load, мс':>12}")
+        for codec in codecs.values():
+            payload = codec.dumps(data)
+            if codec.loads(payload) != data:
+                raise SystemExit(f"{codec.name}: данные не совпали после load")
+            dump_time = best_of(args.repeats, lambda: codec.dumps(data))
+            load_time = best_of(args.repeats, lambda: codec.loads(payload))
+            print(f"{codec.name:<10}{len(payload) / 1024:>12.1f}"
+                  f"{dump_time * 1000:>12.2f}{load_time * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Нагрузочный тест HTTP API: req/s и задержки p50/p99 при росте конкурентности.
+
+Пример: python benchmarks/loadtest_api.py --port 8000 --target-p99-ms 50
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str,
+            body: Optional[Dict] = None, token: Optional[str] = None) -> Dict:
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, body=json.dumps(body) if body else None,
+                 headers=headers)
+    response = conn.getresponse()
+    return json.loads(response.read())
+
+def prepare_user(host: str, port: int) -> str:
+    """Регистрирует тестового пользователя, пополняет USD и возвращает токен."""
+    conn = http.client.HTTPConnection(host, port)
+    credentials = {"username": f"load_{uuid.uuid4().hex[:8]}", "password": "secret"}
+    request(conn, "POST", "/register", credentials)
+    token = request(conn, "POST", "/login", credentials)["token"]
+    request(conn, "POST", "/deposit", {"currency": "USD", "amount": 1_000_000}, token)
+    conn.close()
+    return token
+
+def run_level(host: str, port: int, token: str, concurrency: int,
+              duration: float, mix: List[Tuple[str, str, Optional[Dict]]]
+              ) -> Tuple[float, float, float, int]:
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection(host, port)
+        local, failed, i = [], 0, 0
+        while time.perf_counter() < deadline:
+            method, path, body = mix[i % len(mix)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                if "error" in request(conn, method, path, body, token):
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port)
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0, 0.0, errors
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return len(latencies) / elapsed, p50, p99, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help="Длительность каждого уровня, с")
+    parser.add_argument('--levels', type=str, default="1,4,16,64",
+                        help="Уровни конкурентности через запятую")
+    parser.add_argument('--target-p99-ms', type=float, default=50.0)
+    parser.add_argument('--trade', action='store_true',
+                        help="Добавить в смесь запросов покупку и продажу")
+    args = parser.parse_args()
+
+    token = prepare_user(args.host, args.port)
+    mix = [("GET", "/rate?from=BTC&to=USD", None),
+           ("GET", "/rates?base=USD", None),
+           ("GET", "/portfolio?base=USD", None)]
+    if args.trade:
+        mix += [("POST", "/buy", {"currency": "EUR", "amount": 1}),
+                ("POST", "/sell", {"currency": "EUR", "amount": 1})]
+
+    print(f"{'Потоки':>7} {'req/s':>10} {'p50, мс':>9} {'p99, мс':>9} {'ошибки':>7}")
+    best = None
+    for level in (int(value) for value in args.levels.split(",")):
+        rps, p50, p99, errors = run_level(args.host, args.port, token, level,
+                                          args.duration, mix)
+        print(f"{level:>7} {rps:>10.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+        if p99 <= args.target_p99_ms and (best is None or rps > best[1]):
+            best = (level, rps, p99)
+    if best is None:
+        print(f"Ни один уровень не уложился в p99 ≤ {args.target_p99_ms} мс")
+    else:
+        print(f"Максимум при p99 ≤ {args.target_p99_ms} мс: {best[1]:.1f} req/s "
+              f"({best[0]} потоков, p99 {best[2]:.2f} мс)")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 
 from valutatrade_hub.cli.interface import CLI
+from valutatrade_hub.core.warm_state import load_warm_state, save_warm_state
+from valutatrade_hub.parser_service.config import ParserConfig
 from valutatrade_hub.parser_service.scheduler import Scheduler
+from valutatrade_hub.parser_service.storage import Storage
+from valutatrade_hub.parser_service.streaming import StreamIngestor, get_stream_client
 
 
 def main():
+    load_warm_state()
     scheduler = Scheduler()
     scheduler.start()
+    config = ParserConfig()
+    if config.STREAM_URL:
+        StreamIngestor(get_stream_client(config), Storage(config)).start()
     cli = CLI()
     cli.run()
+    save_warm_state()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
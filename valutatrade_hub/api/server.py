@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import signal
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from ..core.exceptions import (
+    ApiRequestError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+)
+from ..core.rates_view import get_rates_view
+from ..core.usecases import UseCases
+from ..core.warm_state import load_warm_state
+from ..infra.settings import SettingsLoader
+
+logger = logging.getLogger('ValutaTrade')
+
+class AuthError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+def _sign(payload: bytes, secret: str) -> str:
+    digest = hmac.new(secret.encode(), payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def issue_token(user_id: int, secret: str, ttl: int) -> str:
+    """Выдаёт подписанный токен: любой воркер проверяет его без общего состояния."""
+    payload = f"{user_id}.{int(time.time()) + ttl}"
+    return f"{payload}.{_sign(payload.encode(), secret)}"
+
+def verify_token(token: str, secret: str) -> int:
+    """Проверяет подпись и срок действия токена, возвращает user_id."""
+    try:
+        user_id, expires, signature = token.split(".")
+        expected = _sign(f"{user_id}.{expires}".encode(), secret)
+        valid = hmac.compare_digest(signature, expected)
+        expired = int(expires) < time.time()
+    except ValueError:
+        raise AuthError("Некорректный токен")
+    if not valid:
+        raise AuthError("Неверная подпись токена")
+    if expired:
+        raise AuthError("Срок действия токена истёк, выполните login")
+    return int(user_id)
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON-обёртка над UseCases."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    routes = {
+        ("POST", "/register"): "register",
+        ("POST", "/bulk-register"): "bulk_register",
+        ("POST", "/login"): "login",
+        ("POST", "/buy"): "buy",
+        ("POST", "/sell"): "sell",
+        ("POST", "/deposit"): "deposit",
+        ("POST", "/quote"): "quote",
+        ("GET", "/rate"): "get_rate",
+        ("GET", "/portfolio"): "show_portfolio",
+        ("GET", "/rates"): "show_rates",
+    }
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        route = self.routes.get((method, parsed.path.rstrip("/") or "/"))
+        try:
+            params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+            length = int(self.headers.get("Content-Length", 0))
+            if length:
+                params.update(json.loads(self.rfile.read(length)))
+            if route is None:
+                status, payload = 404, {"error": "Неизвестный метод API"}
+            else:
+                status, payload = getattr(self, f"_handle_{route}")(params)
+        except AuthError as e:
+            status, payload = 401, {"error": e.message}
+        except (InsufficientFundsError, CurrencyNotFoundError) as e:
+            status, payload = 400, {"error": e.message}
+        except ApiRequestError as e:
+            status, payload = 503, {"error": e.message}
+        except (KeyError, TypeError, ValueError) as e:
+            status, payload = 400, {"error": f"Некорректный запрос: {str(e)}"}
+        except Exception as e:
+            # Воркер отвечает всегда: иначе клиент ждёт до таймаута.
+            logger.exception(f"API {method} {parsed.path} failed: {str(e)}")
+            status, payload = 500, {"error": "Внутренняя ошибка сервера"}
+        self._send(status, payload)
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _user_id(self) -> int:
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise AuthError("Требуется заголовок Authorization: Bearer <token>")
+        return verify_token(header[len("Bearer "):], self.server.secret)
+
+    def _handle_register(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        result = UseCases.register(params["username"], params["password"])
+        return 200, {"result": result}
+
+    def _handle_bulk_register(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        users = params["users"]
+        if not isinstance(users, list):
+            raise ValueError("users должен быть списком {username, password}")
+        result = UseCases.bulk_register(self._user_id(), users,
+                                        int(params.get("batch_size", 1000)))
+        return 200, {"result": result}
+
+    def _handle_login(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        user, message = UseCases.login(params["username"], params["password"])
+        if user is None:
+            raise AuthError(message)
+        token = issue_token(user.user_id, self.server.secret, self.server.token_ttl)
+        return 200, {"result": message, "token": token}
+
+    def _trade(self, operation, params: Dict[str, Any], *extra) -> Tuple[int, Dict]:
+        user_id = self._user_id()
+        result = operation(user_id, str(params["currency"]).upper(),
+                           float(params["amount"]), *extra)
+        return 200, {"result": result}
+
+    def _handle_buy(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        return self._trade(UseCases.buy, params, params.get("quote_id"))
+
+    def _handle_sell(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        return self._trade(UseCases.sell, params, params.get("quote_id"))
+
+    def _handle_quote(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        return self._trade(UseCases.quote, params, params.get("side", "buy"))
+
+    def _handle_deposit(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        return self._trade(UseCases.deposit, params)
+
+    def _handle_get_rate(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        return 200, {"result": UseCases.get_rate(params["from"].upper(),
+                                                 params["to"].upper())}
+
+    def _handle_show_portfolio(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        base = params.get("base", "USD").upper()
+        return 200, {"result": UseCases.show_portfolio(self._user_id(), base)}
+
+    def _handle_show_rates(self, params: Dict[str, Any]) -> Tuple[int, Dict]:
+        base = params.get("base", "USD").upper()
+        currency = params.get("currency", "").upper() or None
+        top = int(params["top"]) if params.get("top") else None
+        per_page = int(params["per_page"]) if params.get("per_page") else None
+        rows, total = get_rates_view().select(base, currency, top,
+                                              int(params.get("page", 1)), per_page)
+        return 200, {"result": rows, "total": total}
+
+    def log_message(self, format, *args):
+        pass
+
+class ApiServer(ThreadingHTTPServer):
+    """HTTP-сервер воркера; слушающий сокет создаётся один раз до fork."""
+    daemon_threads = True
+
+    def __init__(self, sock: socket.socket, secret: str, token_ttl: int):
+        super().__init__(sock.getsockname()[:2], ApiHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.secret = secret
+        self.token_ttl = token_ttl
+
+def _resolve_secret() -> str:
+    return os.getenv("API_SECRET") or SettingsLoader().get('api_secret') \
+        or secrets.token_hex(32)
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 4,
+          secret: Optional[str] = None) -> None:
+    """Запускает пул заранее порождённых процессов, разделяющих один сокет."""
+    secret = secret or _resolve_secret()
+    token_ttl = SettingsLoader().get('api_token_ttl_seconds', 3600)
+    sock = socket.create_server((host, port), backlog=1024, reuse_port=False)
+    # Прогретое состояние загружается до fork и достаётся всем воркерам.
+    load_warm_state()
+    if workers <= 1 or not hasattr(os, "fork"):
+        ApiServer(sock, secret, token_ttl).serve_forever()
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                ApiServer(sock, secret, token_ttl).serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop(None, None)
+    finally:
+        sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API ValutaTrade")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    print(f"API доступен по адресу http://{args.host}:{args.port} "
+          f"({args.workers} воркеров)")
+    serve(args.host, args.port, args.workers)
+
+if __name__ == "__main__":
+    main()
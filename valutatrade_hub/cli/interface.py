@@ -2,15 +2,30 @@
 import argparse
 from datetime import datetime
 
+from ..core.backtest import STRATEGIES, RateTape, parse_grid, run_grid
+from ..core.currencies import get_currency, list_currencies
 from ..core.exceptions import (
     ApiRequestError,
     CurrencyNotFoundError,
     InsufficientFundsError,
 )
 from ..core.models import User
+from ..core.portfolio_history import PortfolioHistory
+from ..core.rates_view import OUTPUT_FORMATS, get_rates_view, render
+from ..core.transfer import (
+    DATASETS,
+    FORMATS,
+    Importer,
+    detect_format,
+    export_dataset,
+    read_rows,
+)
 from ..core.usecases import UseCases
+from ..core.utils import get_rates_snapshot
 from ..parser_service.config import ParserConfig
-from ..parser_service.storage import Storage
+from ..parser_service.history_store import ColumnarHistory, from_epoch_ms, to_epoch_ms
+from ..parser_service.reindex import HistoryReindexer
+from ..parser_service.retention import HistoryRollups
 from ..parser_service.updater import get_updater
 
 
@@ -34,10 +49,18 @@ class CLI:
         buy_parser = self.subparsers.add_parser('buy')
         buy_parser.add_argument('--currency', type=str, required=True)
         buy_parser.add_argument('--amount', type=float, required=True)
+        buy_parser.add_argument('--quote-id', type=str, required=False)
 
         sell_parser = self.subparsers.add_parser('sell')
         sell_parser.add_argument('--currency', type=str, required=True)
         sell_parser.add_argument('--amount', type=float, required=True)
+        sell_parser.add_argument('--quote-id', type=str, required=False)
+
+        quote_parser = self.subparsers.add_parser('quote')
+        quote_parser.add_argument('--currency', type=str, required=True)
+        quote_parser.add_argument('--amount', type=float, required=True)
+        quote_parser.add_argument('--side', type=str, default='buy',
+                                  choices=['buy', 'sell'])
 
         rate_parser = self.subparsers.add_parser('get-rate')
         rate_parser.add_argument('--from', type=str, required=True)
@@ -54,6 +77,98 @@ class CLI:
         show_rates_parser.add_argument('--currency', type=str, required=False)
         show_rates_parser.add_argument('--top', type=int, required=False)
         show_rates_parser.add_argument('--base', type=str, default='USD')
+        show_rates_parser.add_argument('--page', type=int, default=1)
+        show_rates_parser.add_argument('--per-page', type=int, required=False)
+        show_rates_parser.add_argument('--format', type=str, default='table',
+                                       choices=list(OUTPUT_FORMATS))
+
+        portfolio_history_parser = self.subparsers.add_parser('portfolio-history')
+        portfolio_history_parser.add_argument('--base', type=str, default='USD')
+        portfolio_history_parser.add_argument('--since', type=str, required=False)
+        portfolio_history_parser.add_argument('--step', type=str, default='1h')
+        portfolio_history_parser.add_argument('--no-cache', action='store_true')
+
+        place_order_parser = self.subparsers.add_parser('place-order')
+        place_order_parser.add_argument('--currency', type=str, required=True)
+        place_order_parser.add_argument('--side', type=str, required=True,
+                                        choices=['buy', 'sell'])
+        place_order_parser.add_argument('--type', type=str, default='limit',
+                                        choices=['limit', 'stop'])
+        place_order_parser.add_argument('--price', type=float, required=True)
+        place_order_parser.add_argument('--amount', type=float, required=True)
+
+        list_orders_parser = self.subparsers.add_parser('list-orders')
+        list_orders_parser.add_argument('--all', action='store_true')
+
+        cancel_order_parser = self.subparsers.add_parser('cancel-order')
+        cancel_order_parser.add_argument('--id', type=int, required=True)
+
+        add_alert_parser = self.subparsers.add_parser('add-alert')
+        add_alert_parser.add_argument('--pair', type=str, required=True)
+        add_alert_parser.add_argument('--level', type=float, required=False)
+        add_alert_parser.add_argument('--change-pct', type=float, required=False)
+        add_alert_parser.add_argument('--window', type=str, default='1h')
+        add_alert_parser.add_argument('--direction', type=str, default='any',
+                                      choices=['up', 'down', 'any'])
+
+        list_alerts_parser = self.subparsers.add_parser('list-alerts')
+        list_alerts_parser.add_argument('--all', action='store_true')
+
+        remove_alert_parser = self.subparsers.add_parser('remove-alert')
+        remove_alert_parser.add_argument('--id', type=int, required=True)
+
+        exposure_parser = self.subparsers.add_parser('exposure')
+        exposure_parser.add_argument('--base', type=str, default='USD')
+
+        for command in ('export', 'import'):
+            transfer_parser = self.subparsers.add_parser(command)
+            transfer_parser.add_argument('--dataset', type=str, required=True,
+                                         choices=list(DATASETS))
+            transfer_parser.add_argument('--file', type=str, required=True)
+            transfer_parser.add_argument('--format', type=str, required=False,
+                                         choices=list(FORMATS))
+            if command == 'import':
+                transfer_parser.add_argument('--batch-size', type=int, default=1000)
+
+        self.subparsers.add_parser('convert-history')
+        self.subparsers.add_parser('compact-history')
+        reindex_parser = self.subparsers.add_parser('reindex-history')
+        reindex_parser.add_argument('--workers', type=int, required=False)
+        reindex_parser.add_argument('--chunk-rows', type=int, required=False)
+
+        history_stats_parser = self.subparsers.add_parser('history-stats')
+        history_stats_parser.add_argument('--pair', type=str, required=True)
+        history_stats_parser.add_argument('--stat', type=str, default='ohlc',
+                                          choices=['ohlc', 'volatility', 'ma'])
+        history_stats_parser.add_argument('--interval', type=int, default=3600)
+        history_stats_parser.add_argument('--window', type=int, default=20)
+        history_stats_parser.add_argument('--since', type=str, required=False)
+        history_stats_parser.add_argument('--until', type=str, required=False)
+        history_stats_parser.add_argument('--top', type=int, default=10)
+
+        bulk_register_parser = self.subparsers.add_parser('bulk-register')
+        bulk_register_parser.add_argument('--file', type=str, required=True)
+        bulk_register_parser.add_argument('--format', type=str, required=False,
+                                          choices=list(FORMATS))
+        bulk_register_parser.add_argument('--batch-size', type=int, default=1000)
+
+        audit_parser = self.subparsers.add_parser('audit-search')
+        audit_parser.add_argument('--user', type=str, required=False)
+        audit_parser.add_argument('--action', type=str, required=False)
+        audit_parser.add_argument('--since', type=str, required=False)
+        audit_parser.add_argument('--until', type=str, required=False)
+        audit_parser.add_argument('--limit', type=int, default=50)
+
+        backtest_parser = self.subparsers.add_parser('backtest')
+        backtest_parser.add_argument('--strategy', type=str, required=True,
+                                     choices=list(STRATEGIES))
+        backtest_parser.add_argument('--currency', type=str, required=True)
+        backtest_parser.add_argument('--param', type=str, action='append', default=[])#noqa: E501
+        backtest_parser.add_argument('--cash', type=float, default=10000.0)
+        backtest_parser.add_argument('--since', type=str, required=False)
+        backtest_parser.add_argument('--until', type=str, required=False)
+        backtest_parser.add_argument('--workers', type=int, required=False)
+        backtest_parser.add_argument('--top', type=int, default=10)
 
         self.subparsers.add_parser('help')
 
@@ -68,23 +183,63 @@ class CLI:
         print("Вход в систему\n*******")
         print("\nshow-portfolio [--base <currency>]")
         print("Показать портфель пользователя (валюта по умолчанию: USD)\n*******")
-        print("\nbuy --currency <currency> --amount <amount>")
-        print("Купить валюту\n*******")
-        print("\nsell --currency <currency> --amount <amount>")
-        print("Продать валюту\n*******")
+        print("\nbuy --currency <currency> --amount <amount> [--quote-id <id>]")
+        print("Купить валюту (по рынку или по котировке)\n*******")
+        print("\nsell --currency <currency> --amount <amount> [--quote-id <id>]")
+        print("Продать валюту (по рынку или по котировке)\n*******")
+        print("\nquote --currency <currency> --amount <amount> [--side <buy|sell>]")
+        print("Зафиксировать курс для покупки или продажи на несколько секунд\n*******")#noqa: E501
         print("\nget-rate --from <currency> --to <currency>")
-        print("Получить курс валют (поддерживаемые валюты: USD, EUR, BTC, ETH)\n*******")#noqa: E501
+        print(f"Получить курс валют (поддерживаемые валюты: {self._supported_codes()})\n*******")#noqa: E501
         print("\ndeposit --currency <currency> --amount <amount>")
         print("Пополнить баланс\n*******")
-        print("\nupdate-rates [--source <coingecko|exchangerate>]")
+        print("\nupdate-rates [--source <coingecko|exchangerate|offline>]")
         print("Обновить курсы валют\n*******")
-        print("\nshow-rates [--currency <currency>] [--top <N>] [--base <currency>]")
-        print("Показать актуальные курсы\n*******")
+        print("\nshow-rates [--currency <currency>] [--top <N>] [--base <currency>] [--page <N> --per-page <N>] [--format <table|json|csv>]")#noqa: E501
+        print("Показать актуальные курсы (к любой базе, в том числе кросс-курсы)\n*******")#noqa: E501
+        print("\nportfolio-history [--base <currency>] [--since <ISO>] [--step <15m|1h|1d>] [--no-cache]")#noqa: E501
+        print("История стоимости портфеля и P&L (по умолчанию за последние сутки)\n*******")#noqa: E501
+        print("\nplace-order --currency <currency> --side <buy|sell> [--type <limit|stop>] --price <USD> --amount <amount>")#noqa: E501
+        print("Выставить заявку, исполняемую при обновлении курсов\n*******")
+        print("\nlist-orders [--all]")
+        print("Показать открытые (или все) заявки\n*******")
+        print("\ncancel-order --id <order_id>")
+        print("Отменить заявку\n*******")
+        print("\nadd-alert --pair <PAIR> (--level <rate> | --change-pct <X> [--window <1h>]) [--direction <up|down|any>]")#noqa: E501
+        print("Подписаться на пересечение уровня или изменение курса на X% за окно\n*******")#noqa: E501
+        print("\nlist-alerts [--all]")
+        print("Показать подписки и последние уведомления\n*******")
+        print("\nremove-alert --id <alert_id>")
+        print("Удалить подписку\n*******")
+        print("\nexposure [--base <currency>]")
+        print("Совокупная позиция всех пользователей по валютам (для администраторов)\n*******")#noqa: E501
+        print("\nbulk-register --file <users.csv|users.jsonl> [--format <jsonl|csv>] [--batch-size <N>]")#noqa: E501
+        print("Зарегистрировать пользователей из файла (колонки username, password; для администраторов)\n*******")#noqa: E501
+        print("\naudit-search [--user <username>] [--action <BUY|SELL|...>] [--since <ISO>] [--until <ISO>] [--limit <N>]")#noqa: E501
+        print("Поиск по журналу действий logs/actions.log* через индекс\n*******")
+        print("\nexport --dataset <users|portfolios|history> --file <path> [--format <jsonl|csv>]")#noqa: E501
+        print("Выгрузить пользователей, портфели или историю курсов в JSON Lines или CSV\n*******")#noqa: E501
+        print("\nimport --dataset <users|portfolios|history> --file <path> [--format <jsonl|csv>] [--batch-size <N>]")#noqa: E501
+        print("Загрузить данные из JSON Lines или CSV с проверкой и записью пачками\n*******")#noqa: E501
+        print("\nconvert-history")
+        print("Построить колоночное хранилище истории из exchange_rates.json\n*******")#noqa: E501
+        print("\ncompact-history")
+        print("Свернуть историю старше срока хранения в часовые и дневные свечи\n*******")#noqa: E501
+        print("\nreindex-history [--workers <N>] [--chunk-rows <N>]")
+        print("Пересобрать колоночное хранилище истории параллельно по парам\n*******")#noqa: E501
+        print("\nhistory-stats --pair <PAIR> [--stat <ohlc|volatility|ma>] [--interval <sec>] [--window <N>] [--since <ISO>] [--until <ISO>] [--top <N>]")#noqa: E501
+        print("Аналитика по истории курса из колоночного хранилища\n*******")
+        print(f"\nbacktest --strategy <{'|'.join(STRATEGIES)}> --currency <BTC[,ETH]> [--param <name=v1,v2>]... [--cash <USD>] [--since <ISO>] [--until <ISO>] [--workers <N>] [--top <N>]")#noqa: E501
+        print("Проверить стратегию на истории курсов (сетка параметров — параллельно)\n*******")#noqa: E501
         print("\nhelp")
         print("Показать список команд\n*******")
         print("\nexit")
         print("Выйти из программы\n")
 
+    @staticmethod
+    def _supported_codes() -> str:
+        return ", ".join(currency.code for currency in list_currencies())
+
     def run(self):
         while True:
             try:
@@ -110,64 +265,87 @@ class CLI:
                 user, message = UseCases.login(args.username, args.password)
                 self.current_user = user
                 print(message)
-            elif args.command in ['show-portfolio', 'buy', 'sell', 'deposit']:
+            elif args.command in ['show-portfolio', 'buy', 'sell', 'deposit', 'quote',
+                                  'portfolio-history', 'place-order', 'list-orders',
+                                  'cancel-order', 'add-alert', 'list-alerts',
+                                  'remove-alert', 'exposure', 'audit-search',
+                                  'bulk-register']:
                 if not self.current_user:
                     print("Сначала выполните login")
                     return
                 if args.command == 'show-portfolio':
                     print(UseCases.show_portfolio(self.current_user.user_id, args.base.upper()))#noqa: E501
                 elif args.command == 'buy':
-                    print(UseCases.buy(self.current_user.user_id, args.currency.upper(), args.amount))#noqa: E501
+                    print(UseCases.buy(self.current_user.user_id, args.currency.upper(), args.amount, args.quote_id))#noqa: E501
                 elif args.command == 'sell':
-                    print(UseCases.sell(self.current_user.user_id, args.currency.upper(), args.amount))#noqa: E501
+                    print(UseCases.sell(self.current_user.user_id, args.currency.upper(), args.amount, args.quote_id))#noqa: E501
+                elif args.command == 'quote':
+                    print(UseCases.quote(self.current_user.user_id, args.currency.upper(), args.amount, args.side))#noqa: E501
                 elif args.command == 'deposit':
                     print(UseCases.deposit(self.current_user.user_id, args.currency.upper(), args.amount))#noqa: E501
+                elif args.command == 'portfolio-history':
+                    self.show_portfolio_history(args)
+                elif args.command == 'place-order':
+                    print(UseCases.place_order(self.current_user.user_id,
+                                               args.currency.upper(), args.amount,
+                                               args.side, args.type, args.price))
+                elif args.command == 'list-orders':
+                    print(UseCases.list_orders(self.current_user.user_id, args.all))
+                elif args.command == 'cancel-order':
+                    print(UseCases.cancel_order(self.current_user.user_id, args.id))
+                elif args.command == 'add-alert':
+                    print(UseCases.add_alert(self.current_user.user_id, args.pair,
+                                             args.direction, args.level,
+                                             args.change_pct, args.window))
+                elif args.command == 'list-alerts':
+                    print(UseCases.list_alerts(self.current_user.user_id, args.all))
+                elif args.command == 'remove-alert':
+                    print(UseCases.remove_alert(self.current_user.user_id, args.id))
+                elif args.command == 'exposure':
+                    print(UseCases.exposure(self.current_user.user_id, args.base.upper()))#noqa: E501
+                elif args.command == 'bulk-register':
+                    self.bulk_register(args)
+                elif args.command == 'audit-search':
+                    print(UseCases.audit_search(self.current_user.user_id, args.user,
+                                                args.action, args.since, args.until,
+                                                args.limit))
             elif args.command == 'get-rate':
                 print(UseCases.get_rate(args.__dict__['from'].upper(), args.to.upper()))
             elif args.command == 'update-rates':
-                updater = get_updater()
-                count = updater.run_update(args.source)
-                if count > 0:
-                    print(f"Успешно обновлены курсы для {count} валют. Последнее обновление: {datetime.utcnow().strftime("%Y-%m-%d %H:%M")}")#noqa: E501
-                else:
-                    print("Ошибка при обновлении. Подробности в файле logs")
+                self.update_rates(args)
             elif args.command == 'show-rates':
-                config = ParserConfig()
-                storage = Storage(config)
-                data = storage.load_rates()
-                pairs = data.get("pairs", {})
-                last_refresh = data.get("last_refresh", "Unknown")
-                last_refresh = last_refresh[:16].replace("T", " ")
-
-                if not pairs:
-                    print("Локальный кеш курсов пуст. Выполните 'update-rates', чтобы загрузить данные.")#noqa: E501
-                    return
-
-                filtered = {}
-                base = args.base.upper()
-                for key, value in pairs.items():
-                    from_curr, to_curr = key.split("_")
-                    if to_curr != base:
-                        continue
-                    if args.currency and from_curr != args.currency.upper():
-                        continue
-                    filtered[key] = value
-
-                if not filtered:
-                    if args.currency:
-                        print(f"Курс для '{args.currency.upper()}' не найден в кеше.")
-                    else:
-                        print("Нет данных по указанным фильтрам.")
-                    return
-
-                sorted_pairs = sorted(filtered.items(), \
-                                      key=lambda x: x[1]["rate"], reverse=True)
-                if args.top:
-                    sorted_pairs = sorted_pairs[:args.top]
-
-                print(f"Курсы из кеша (последнее обновление {last_refresh}):")
-                for key, value in sorted_pairs:
-                    print(f"- {key}: {value['rate']:.2f}")
+                self.show_rates(args)
+            elif args.command == 'export':
+                rows = export_dataset(args.dataset, args.file, args.format,
+                                      self._report_progress)
+                print(f"Выгружено записей: {rows} → {args.file}")
+            elif args.command == 'import':
+                self.import_dataset(args)
+            elif args.command == 'convert-history':
+                try:
+                    rows = ColumnarHistory(ParserConfig()).convert_from_json()
+                    print(f"Колоночное хранилище истории построено: {rows} записей.")
+                except FileNotFoundError:
+                    print("История курсов (exchange_rates.json) не найдена.")
+            elif args.command == 'compact-history':
+                stats = HistoryRollups(ParserConfig()).compact()
+                if stats['skipped'] == 'disabled':
+                    print("Срок хранения сырых записей не ограничен "
+                          "(history_raw_retention_days = 0): сжатие не нужно.")
+                elif stats['skipped'] == 'up_to_date':
+                    print("Граница хранения не сдвинулась с прошлого сжатия: файл "
+                          "истории не читался. Старые записи, добавленные после "
+                          "него, учитываются в свечах и будут свёрнуты позже.")
+                else:
+                    print(f"Свёрнуто записей: {stats['compacted']} в {stats['candles']} свечей, "#noqa: E501
+                          f"осталось сырых: {stats['kept']}, удалено часовых свечей: "
+                          f"{stats['hourly_dropped']}.")
+            elif args.command == 'reindex-history':
+                self.reindex_history(args)
+            elif args.command == 'history-stats':
+                self.show_history_stats(args)
+            elif args.command == 'backtest':
+                self.backtest(args)
             elif args.command == 'help':
                 self.show_help()
             else:
@@ -175,12 +353,193 @@ class CLI:
         except InsufficientFundsError as e:
             print(f"Ошибка: {e.message}")
         except CurrencyNotFoundError as e:
-            print(f"Ошибка: {e.message}. Поддерживаемые валюты: USD, EUR, BTC, ETH.")
+            print(f"Ошибка: {e.message}. Поддерживаемые валюты: {self._supported_codes()}.")#noqa: E501
         except ApiRequestError as e:
             print(f"Ошибка: {e.message}. Повторите попытку позже или проверьте сеть.")
         except ValueError as e:
             print(f"Ошибка конфигурации: {str(e)}")
 
+    @staticmethod
+    def _report_progress(rows: int) -> None:
+        print(f"... обработано строк: {rows}")
+
+    def update_rates(self, args):
+        updater = get_updater()
+        count = updater.run_update(args.source)
+        if not updater.report:
+            if args.source:
+                print(f"Источник '{args.source}' не подключён (настройка rate_providers).")#noqa: E501
+            else:
+                print("Не подключено ни одного источника курсов: список rate_providers "
+                      "в config.json пуст.")
+            return
+        for name, (_, detail) in updater.report.items():
+            print(f"- {name}: {detail}")
+        if count > 0:
+            print(f"Успешно обновлены курсы для {count} валют. Последнее обновление: {datetime.utcnow().strftime("%Y-%m-%d %H:%M")}")#noqa: E501
+            return
+        snapshot = get_rates_snapshot()
+        if snapshot.pairs:
+            print(f"Новых курсов нет: работаем по последним известным (обновлены "
+                  f"{snapshot.last_refresh}). Сделки по устаревшим курсам подчиняются "#noqa: E501
+                  f"stale_policy и stale_max_age_seconds. Подробности в файле logs")
+        else:
+            print("Курсов нет ни от источников, ни в кэше. Для работы без сети "
+                  "добавьте 'offline' в rate_providers и положите курсы в "
+                  "data/offline_rates.json. Подробности в файле logs")
+
+    def reindex_history(self, args):
+        if (args.workers is not None and args.workers < 1) \
+                or (args.chunk_rows is not None and args.chunk_rows < 1):
+            print("--workers и --chunk-rows должны быть положительными.")
+            return
+        reindexer = HistoryReindexer(ParserConfig(), args.workers, args.chunk_rows)
+        try:
+            stats = reindexer.run(self._report_progress)
+        except FileNotFoundError:
+            print("История курсов (exchange_rates.json) не найдена.")
+            return
+        print(f"Колоночное хранилище пересобрано: {stats['rows']} строк, "
+              f"{stats['pairs']} пар, процессов: {stats['workers']}.")
+        print(f"Уникальных записей: {stats['kept']}, дубликатов: {stats['duplicates']}, "#noqa: E501
+              f"некорректных: {stats['invalid']}, пар с внешней сортировкой: "
+              f"{stats['external_pairs']}.")
+        print(f"Время: разбиение {stats['partition_seconds']:.2f} с, сортировка "
+              f"{stats['sort_seconds']:.2f} с, всего {stats['seconds']:.2f} с "
+              f"({stats['rows_per_second']:.0f} строк/с).")
+
+    def import_dataset(self, args):
+        if args.batch_size < 1:
+            print("Размер пачки должен быть положительным.")
+            return
+        importer = Importer(args.dataset, args.batch_size)
+        try:
+            imported = importer.run(args.file, args.format, self._report_progress)
+        except FileNotFoundError:
+            print(f"Файл {args.file} не найден.")
+            return
+        print(f"Импортировано: {imported}, отклонено: {importer.rejected}.")
+        if importer.reindexed:
+            print("Записи истории пришли не по порядку времени: колоночное хранилище пересобрано.")#noqa: E501
+        for error in importer.errors:
+            print(f"- {error}")
+
+    def bulk_register(self, args):
+        try:
+            with open(args.file, 'r', newline='') as f:
+                rows = read_rows(f, detect_format(args.file, args.format))
+                print(UseCases.bulk_register(self.current_user.user_id, rows,
+                                             args.batch_size, self._report_progress))
+        except FileNotFoundError:
+            print(f"Файл {args.file} не найден.")
+
+    def show_rates(self, args):
+        view = get_rates_view()
+        if not view.snapshot.pairs:
+            print("Локальный кеш курсов пуст. Выполните 'update-rates', чтобы загрузить данные.")#noqa: E501
+            return
+        base = args.base.upper()
+        currency = args.currency.upper() if args.currency else None
+        if args.page < 1 or (args.per_page is not None and args.per_page < 1):
+            print("Номер страницы и размер страницы должны быть положительными.")
+            return
+        rows, total = view.select(base, currency, args.top, args.page, args.per_page)
+        if args.format != 'table':
+            print(render(rows, args.format))
+            return
+        if not rows:
+            if currency:
+                print(f"Курс {currency}→{base} не найден в кеше.")
+            else:
+                print("Нет данных по указанным фильтрам.")
+            return
+        last_refresh = (view.snapshot.last_refresh or "Unknown")[:16].replace("T", " ")#noqa: E501
+        print(f"Курсы к {base} из кеша (последнее обновление {last_refresh}):")
+        print(render(rows))
+        if args.per_page:
+            pages = (total + args.per_page - 1) // args.per_page
+            print(f"Страница {args.page} из {pages} (всего {total})")
+
+    def show_portfolio_history(self, args):
+        base = args.base.upper()
+        points = PortfolioHistory().series(self.current_user.user_id, base,
+                                           args.since, args.step,
+                                           use_cache=not args.no_cache)
+        if not points:
+            print("Нет данных за указанный период.")
+            return
+        print(f"История портфеля '{self.current_user.username}' (база: {base}, шаг {args.step}):")#noqa: E501
+        for point in points:
+            if point["value"] is None:
+                print(f"- {point['time'][:16]}: нет курса {base}→USD")
+                continue
+            line = (f"- {point['time'][:16]}: {point['value']:.2f} {base} "
+                    f"(реализ. {point['realised']:+.2f}, нереализ. {point['unrealised']:+.2f})")#noqa: E501
+            if point["missing"]:
+                line += f" без учёта {', '.join(point['missing'])}"
+            print(line)
+
+    def show_history_stats(self, args):
+        config = ParserConfig()
+        history = ColumnarHistory(config)
+        pair = args.pair.upper()
+        since = to_epoch_ms(args.since) if args.since else None
+        until = to_epoch_ms(args.until) if args.until else None
+        if args.stat != 'ohlc' and not history.exists():
+            print("Колоночное хранилище не найдено. Выполните 'convert-history'.")
+            return
+        if args.stat == 'volatility':
+            volatility = history.volatility(pair, since, until)
+            if volatility is None:
+                print(f"Недостаточно данных по паре {pair}.")
+            else:
+                print(f"Волатильность {pair} (σ лог-доходностей): {volatility:.6f}")
+            return
+        if args.stat == 'ma':
+            points = history.moving_average(pair, args.window, since, until)
+            rows = [f"- {from_epoch_ms(ts)}: {value:.6f}" for ts, value in points]
+            title = f"Скользящее среднее {pair} (окно {args.window}):"
+        else:
+            # Свечи собираются из сырых записей и свёрнутой истории.
+            candles = HistoryRollups(config).ohlc(pair, args.interval, since, until)
+            rows = [f"- {from_epoch_ms(c['bucket'])}: O {c['open']:.6f} "
+                    f"H {c['high']:.6f} L {c['low']:.6f} C {c['close']:.6f} "
+                    f"({c['count']})" for c in candles]
+            title = f"Свечи {pair} по {args.interval} с:"
+        if not rows:
+            print(f"Нет данных по паре {pair}.")
+            return
+        print(title)
+        print("\n".join(rows[-args.top:]))
+
+    def backtest(self, args):
+        if args.cash <= 0 or args.top < 1 or (args.workers is not None and args.workers < 1):#noqa: E501
+            print("Сумма, --top и --workers должны быть положительными.")
+            return
+        currencies = [code.strip().upper() for code in args.currency.split(',')
+                      if code.strip()]
+        for code in currencies:
+            get_currency(code)
+        grid = parse_grid(args.param)
+        tape = RateTape.load(currencies,
+                             to_epoch_ms(args.since) if args.since else None,
+                             to_epoch_ms(args.until) if args.until else None)
+        if not len(tape):
+            print(f"Нет истории курсов {', '.join(currencies)}→USD за указанный период.")#noqa: E501
+            return
+        results = run_grid(args.strategy, grid, tape, args.cash, args.workers)
+        print(f"Бэктест {args.strategy}: {len(tape)} событий "
+              f"({from_epoch_ms(tape.times[0])[:16]} — {from_epoch_ms(tape.times[-1])[:16]}), "#noqa: E501
+              f"прогонов: {len(results)}, начальный капитал {args.cash:.2f} USD")
+        for result in results[:args.top]:
+            params = ", ".join(f"{k}={v}" for k, v in result['params'].items())
+            if 'error' in result:
+                print(f"- {params}: ошибка — {result['error']}")
+                continue
+            print(f"- {params}: P&L {result['pnl']:+.2f} USD ({result['pnl_pct']:+.2f}%), "#noqa: E501
+                  f"просадка {result['max_drawdown_pct']:.2f}%, сделок {result['trades']}, "#noqa: E501
+                  f"отклонено {result['rejected']}")
+
 if __name__ == "__main__":
     cli = CLI()
     cli.run()
\ No newline at end of file
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..infra.database import DatabaseManager, _file_signature
+from ..infra.locks import FileLock
+from .portfolio_history import parse_step
+
+logger = logging.getLogger('ParserService')
+
+ALERTS_FILE = 'alerts.json'
+DIRECTIONS = ('up', 'down', 'any')
+
+class RollingWindow:
+    """Курсы пары за последние window_seconds с минимумом и максимумом за O(1).
+
+    Минимум и максимум поддерживаются монотонными очередями, поэтому
+    каждый новый курс обрабатывается за амортизированное O(1).
+    """
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self.samples: Deque[Tuple[float, float]] = deque()
+        self._min: Deque[Tuple[float, float]] = deque()
+        self._max: Deque[Tuple[float, float]] = deque()
+
+    def push(self, timestamp: float, rate: float) -> None:
+        self.samples.append((timestamp, rate))
+        while self._min and self._min[-1][1] >= rate:
+            self._min.pop()
+        self._min.append((timestamp, rate))
+        while self._max and self._max[-1][1] <= rate:
+            self._max.pop()
+        self._max.append((timestamp, rate))
+        horizon = timestamp - self.window_seconds
+        while self.samples and self.samples[0][0] < horizon:
+            self.samples.popleft()
+        for extreme in (self._min, self._max):
+            while extreme and extreme[0][0] < horizon:
+                extreme.popleft()
+
+    def moves(self, rate: float) -> Tuple[float, float]:
+        """Рост от минимума и падение от максимума окна, в процентах."""
+        low, high = self._min[0][1], self._max[0][1]
+        rise = (rate - low) / low * 100 if low > 0 else 0.0
+        fall = (high - rate) / high * 100 if high > 0 else 0.0
+        return rise, fall
+
+class AlertEngine:
+    """Подписки на курсы: пересечение уровня и изменение на X% за окно.
+
+    Уровни каждой пары хранятся отсортированными: при обновлении курса
+    бинарным поиском выбираются только уровни между прежним и новым
+    курсом. Подписки на изменение сгруппированы по (пара, окно) и
+    отсортированы по порогу. Сработавшие подписки дописываются в
+    data/alerts_outbox.jsonl.
+    """
+    def __init__(self):
+        self.db = DatabaseManager()
+        self.path = os.path.join(self.db._data_dir, ALERTS_FILE)
+        self.state_path = os.path.join(self.db._data_dir, 'alerts_state.json')
+        self.outbox_path = os.path.join(self.db._data_dir, 'alerts_outbox.jsonl')
+        self._file_lock = FileLock(os.path.join(self.db._data_dir, 'alerts.lock'))
+        self._lock = threading.RLock()
+        self._alerts: Dict[int, Dict[str, Any]] = {}
+        self._levels: Dict[str, List[Tuple[float, int]]] = {}
+        self._thresholds: Dict[str, Dict[int, List[Tuple[float, int]]]] = {}
+        self._windows: Dict[Tuple[str, int], RollingWindow] = {}
+        self._last_rates: Dict[str, float] = {}
+        self._signature = None
+        self._load_state()
+
+    def _load_state(self) -> None:
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self._last_rates = state.get('last_rates', {})
+        for key, samples in state.get('windows', {}).items():
+            pair, window_seconds = key.rsplit('|', 1)
+            window = RollingWindow(int(window_seconds))
+            for timestamp, rate in samples:
+                window.push(timestamp, rate)
+            self._windows[(pair, int(window_seconds))] = window
+
+    def _save_state(self) -> None:
+        state = {
+            'last_rates': self._last_rates,
+            'windows': {f"{pair}|{window_seconds}": list(window.samples)
+                        for (pair, window_seconds), window in self._windows.items()
+                        if window_seconds in self._thresholds.get(pair, {})}
+        }
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def _reload_if_changed(self) -> None:
+        """Перестраивает индексы, если файл подписок изменил другой процесс."""
+        signature = _file_signature(self.path)
+        if signature is not None and signature == self._signature:
+            return
+        self._alerts = {alert['alert_id']: alert
+                        for alert in self.db._read_json(ALERTS_FILE)}
+        self._levels, self._thresholds = {}, {}
+        for alert in self._alerts.values():
+            if alert['status'] == 'ACTIVE':
+                self._index(alert)
+        for entries in self._levels.values():
+            entries.sort()
+        for groups in self._thresholds.values():
+            for entries in groups.values():
+                entries.sort()
+        self._signature = _file_signature(self.path)
+
+    def _index(self, alert: Dict[str, Any], ordered: bool = False) -> None:
+        """Добавляет подписку в индекс; ordered — сразу на своё место (insort)."""
+        add = insort if ordered else list.append
+        if alert['kind'] == 'CROSS':
+            add(self._levels.setdefault(alert['pair'], []),
+                (alert['level'], alert['alert_id']))
+        else:
+            window_seconds = alert['window_seconds']
+            groups = self._thresholds.setdefault(alert['pair'], {})
+            add(groups.setdefault(window_seconds, []),
+                (alert['pct'], alert['alert_id']))
+            self._windows.setdefault((alert['pair'], window_seconds),
+                                     RollingWindow(window_seconds))
+
+    def _save(self) -> None:
+        self.db._write_json(ALERTS_FILE, sorted(self._alerts.values(),
+                                                key=lambda a: a['alert_id']))
+        self._signature = _file_signature(self.path)
+
+    def add(self, user_id: int, pair: str, direction: str = 'any',
+            level: Optional[float] = None, pct: Optional[float] = None,
+            window: str = '1h') -> Dict[str, Any]:
+        """Создаёт подписку на уровень (level) или на изменение на pct% за window."""
+        direction = direction.lower()
+        if direction not in DIRECTIONS:
+            raise ValueError("Направление: up|down|any")
+        if (level is None) == (pct is None):
+            raise ValueError("Укажите либо уровень, либо процент изменения")
+        if (level is not None and level <= 0) or (pct is not None and pct <= 0):
+            raise ValueError("Уровень и процент должны быть положительными числами")
+        alert = {'user_id': user_id, 'pair': pair.upper(), 'direction': direction,
+                 'status': 'ACTIVE', 'created_at': datetime.now().isoformat()}
+        if level is not None:
+            alert.update({'kind': 'CROSS', 'level': level})
+        else:
+            alert.update({'kind': 'CHANGE', 'pct': pct,
+                          'window_seconds': parse_step(window)})
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            alert['alert_id'] = max(self._alerts, default=0) + 1
+            self._alerts[alert['alert_id']] = alert
+            self._index(alert, ordered=True)
+            self._save()
+        return alert
+
+    def remove(self, user_id: int, alert_id: int) -> Optional[Dict[str, Any]]:
+        """Снимает подписку; из индекса она уйдёт при следующей перестройке."""
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            alert = self._alerts.get(alert_id)
+            if alert is None or alert['user_id'] != user_id \
+                    or alert['status'] != 'ACTIVE':
+                return None
+            alert['status'] = 'REMOVED'
+            self._save()
+        return alert
+
+    def list_alerts(self, user_id: int,
+                    include_closed: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._reload_if_changed()
+            return [alert for alert in self._alerts.values()
+                    if alert['user_id'] == user_id
+                    and (include_closed or alert['status'] == 'ACTIVE')]
+
+    def _crossed(self, pair: str, previous: float, rate: float) -> List[Tuple[int, str]]:#noqa: E501
+        levels = self._levels.get(pair)
+        if not levels or previous == rate:
+            return []
+        low, high = min(previous, rate), max(previous, rate)
+        start = bisect_left(levels, (low, -1))
+        end = bisect_right(levels, (high, float('inf')))
+        direction = 'up' if rate > previous else 'down'
+        fired = []
+        for level, alert_id in levels[start:end]:
+            alert = self._alerts[alert_id]
+            # Уровень пересечён, если курс был строго по одну сторону и дошёл до него.
+            if alert['status'] != 'ACTIVE' or level == previous \
+                    or alert['direction'] not in ('any', direction):
+                continue
+            arrow = '↑' if direction == 'up' else '↓'
+            fired.append((alert_id, f"{pair} пересёк {level:g} {arrow}: {rate:g}"))
+        return fired
+
+    def _changed(self, pair: str, rate: float, now: float) -> List[Tuple[int, str]]:
+        fired = []
+        for window_seconds, thresholds in self._thresholds.get(pair, {}).items():
+            window = self._windows[(pair, window_seconds)]
+            window.push(now, rate)
+            rise, fall = window.moves(rate)
+            end = bisect_right(thresholds, (max(rise, fall), float('inf')))
+            for pct, alert_id in thresholds[:end]:
+                alert = self._alerts[alert_id]
+                if alert['status'] != 'ACTIVE':
+                    continue
+                move = {'up': rise, 'down': fall, 'any': max(rise, fall)}[alert['direction']]#noqa: E501
+                if move >= pct:
+                    sign = '+' if move == rise else '-'
+                    fired.append((alert_id, f"{pair} изменился на {sign}{move:.2f}% "
+                                            f"за {window_seconds} с: {rate:g}"))
+        return fired
+
+    def process(self, rates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Проверяет подписки, затронутые новыми курсами. Слушатель RatesUpdater."""
+        now = time.time()
+        notifications = []
+        changed = False
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            for pair, info in rates.items():
+                rate = info.get('rate')
+                if rate is None:
+                    continue
+                previous = self._last_rates.get(pair)
+                # Состояние пишется, только если сдвинулось окно или курс
+                # пары, на которую есть подписки.
+                changed = changed or pair in self._thresholds \
+                    or (pair in self._levels and previous != rate)
+                candidates = self._changed(pair, rate, now)
+                if previous is not None:
+                    candidates += self._crossed(pair, previous, rate)
+                self._last_rates[pair] = rate
+                for alert_id, message in candidates:
+                    alert = self._alerts[alert_id]
+                    if alert['status'] != 'ACTIVE':
+                        continue
+                    alert.update({'status': 'FIRED', 'message': message,
+                                  'fired_at': datetime.now().isoformat()})
+                    notifications.append({'alert_id': alert_id,
+                                          'user_id': alert['user_id'],
+                                          'pair': pair, 'rate': rate,
+                                          'message': message,
+                                          'fired_at': alert['fired_at']})
+            if notifications:
+                self._deliver(notifications)
+                self._save()
+            if changed:
+                self._save_state()
+        return notifications
+
+    def _deliver(self, notifications: List[Dict[str, Any]]) -> None:
+        with open(self.outbox_path, 'a') as f:
+            for notification in notifications:
+                f.write(json.dumps(notification, ensure_ascii=False) + "\n")
+        logger.info(f"Delivered {len(notifications)} alerts to {self.outbox_path}")
+
+    def outbox(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние уведомления пользователя из outbox."""
+        recent: Deque[Dict[str, Any]] = deque(maxlen=limit)
+        try:
+            with open(self.outbox_path, 'r') as f:
+                for line in f:
+                    notification = json.loads(line)
+                    if notification['user_id'] == user_id:
+                        recent.append(notification)
+        except FileNotFoundError:
+            pass
+        return list(recent)
+
+_alert_engine: Optional[AlertEngine] = None
+
+def get_alert_engine() -> AlertEngine:
+    """Общий для процесса движок подписок."""
+    global _alert_engine
+    if _alert_engine is None:
+        _alert_engine = AlertEngine()
+    return _alert_engine
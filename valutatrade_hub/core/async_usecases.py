@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from ..infra.settings import SettingsLoader
+from .models import User
+from .usecases import UseCases
+
+_executor: Optional[ThreadPoolExecutor] = None
+_user_locks: Dict[int, asyncio.Lock] = {}
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = SettingsLoader().get('async_executor_workers', 32)
+        _executor = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix="usecases")
+    return _executor
+
+async def _run(func: Callable, *args, **kwargs):
+    """Выполняет блокирующий use case в пуле потоков, не занимая цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+def _user_lock(user_id: int) -> asyncio.Lock:
+    """Операции одного пользователя выполняются по очереди: use cases
+    читают и перезаписывают портфель целиком."""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+class AsyncUseCases:
+    """Асинхронные точки входа в UseCases для серверов на asyncio."""
+    @staticmethod
+    async def register(username: str, password: str) -> str:
+        return await _run(UseCases.register, username, password)
+
+    @staticmethod
+    async def login(username: str, password: str) -> tuple[Optional[User], str]:
+        return await _run(UseCases.login, username, password)
+
+    @staticmethod
+    async def show_portfolio(user_id: int, base_currency: str = 'USD') -> str:
+        return await _run(UseCases.show_portfolio, user_id, base_currency)
+
+    @staticmethod
+    async def buy(user_id: int, currency: str, amount: float,
+                  quote_id: Optional[str] = None) -> str:
+        async with _user_lock(user_id):
+            return await _run(UseCases.buy, user_id, currency, amount, quote_id)
+
+    @staticmethod
+    async def sell(user_id: int, currency: str, amount: float,
+                   quote_id: Optional[str] = None) -> str:
+        async with _user_lock(user_id):
+            return await _run(UseCases.sell, user_id, currency, amount, quote_id)
+
+    @staticmethod
+    async def quote(user_id: int, currency: str, amount: float,
+                    side: str = 'buy') -> str:
+        return await _run(UseCases.quote, user_id, currency, amount, side)
+
+    @staticmethod
+    async def get_rate(from_currency: str, to_currency: str) -> str:
+        return await _run(UseCases.get_rate, from_currency, to_currency)
+
+    @staticmethod
+    async def deposit(user_id: int, currency: str, amount: float) -> str:
+        async with _user_lock(user_id):
+            return await _run(UseCases.deposit, user_id, currency, amount)
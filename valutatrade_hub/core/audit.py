@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import ast
+import glob
+import hashlib
+import os
+import re
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..infra import codecs
+from ..infra.locks import FileLock
+from ..infra.settings import SettingsLoader
+
+INDEX_VERSION = 1
+# Порядок ключей задан log_action; строки другого вида разбираются целиком.
+_HEAD = re.compile(rb"\{'timestamp': '([^']*)', 'action': '([^']*)', "
+                   rb"'username': '([^'\\]*)'")
+
+def parse_line(raw: bytes) -> Optional[Dict[str, Any]]:
+    """Разбирает строку actions.log: префикс logging и repr словаря log_action."""
+    line = raw.decode('utf-8', errors='replace')
+    start = line.find('{')
+    if start < 0:
+        return None
+    try:
+        record = ast.literal_eval(line[start:].strip())
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    if not isinstance(record, dict):
+        return None
+    if not isinstance(record.get('timestamp'), str):
+        record['timestamp'] = line[:start].split(' ', 1)[0]
+    return record
+
+def index_fields(raw: bytes) -> Optional[Tuple[str, str, str]]:
+    """Время, имя пользователя и действие строки — без полного разбора repr."""
+    match = _HEAD.search(raw)
+    if match:
+        return tuple(group.decode('utf-8', errors='replace')
+                     for group in match.group(1, 3, 2))
+    record = parse_line(raw)
+    if record is None:
+        return None
+    return (record['timestamp'], str(record.get('username')),
+            str(record.get('action')))
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """Приводит границу периода к виду datetime.isoformat() (локальное время лога)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None).isoformat()
+    except ValueError:
+        raise ValueError(f"Некорректная дата '{value}': ожидается ISO 8601")
+
+def _matches(record: Dict[str, Any], username: Optional[str],
+             action: Optional[str], since: Optional[str],
+             until: Optional[str]) -> bool:
+    if username is not None and record.get('username') != username:
+        return False
+    if action is not None and record.get('action') != action:
+        return False
+    return not (since and record['timestamp'] < since) \
+        and not (until and record['timestamp'] > until)
+
+def _fingerprint(path: str) -> Optional[str]:
+    """Отпечаток файла по первой строке: не меняется при переименовании ротацией."""
+    try:
+        with open(path, 'rb') as f:
+            first = f.readline(4096)
+    except FileNotFoundError:
+        return None
+    if not first.endswith(b"\n"):
+        return None
+    return hashlib.sha1(first).hexdigest()[:20]
+
+class AuditIndex:
+    """Индекс-спутник для logs/actions.log и его ротированных копий.
+
+    Для каждого файла (по отпечатку первой строки, поэтому ротация не
+    требует переиндексации) хранятся блоки примерно по
+    audit_index_block_bytes байт с диапазоном времени и списки блоков
+    по имени пользователя и действию. Поиск читает только блоки, в которых
+    есть все условия запроса; индекс дополняется с места остановки.
+    """
+    def __init__(self, log_file: Optional[str] = None):
+        settings = SettingsLoader()
+        self.log_file = log_file or settings.get('log_file', 'logs/actions.log')
+        self.path = f"{self.log_file}.index"
+        self.block_bytes = settings.get('audit_index_block_bytes', 65536)
+        self._file_lock = FileLock(f"{self.log_file}.index.lock")
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    def _log_files(self) -> List[str]:
+        return [path for path in glob.glob(f"{glob.escape(self.log_file)}*")
+                if path == self.log_file
+                or path[len(self.log_file) + 1:].isdigit()]
+
+    def _load(self) -> None:
+        try:
+            index = codecs.read_file(self.path)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        if index.get('version') != INDEX_VERSION:
+            index = {'files': {}}
+        self.files = index['files']
+
+    def update(self) -> Dict[str, str]:
+        """Дополняет индекс новыми строками; возвращает {путь: отпечаток}."""
+        with self._file_lock:
+            self._load()
+            present = {}
+            changed = False
+            for path in self._log_files():
+                fingerprint = _fingerprint(path)
+                if fingerprint is None:
+                    continue
+                present[path] = fingerprint
+                entry = self.files.setdefault(fingerprint, {
+                    'size': 0, 'min_ts': None, 'max_ts': None, 'blocks': [],
+                    'users': {}, 'actions': {}})
+                if os.path.getsize(path) > entry['size']:
+                    self._index_file(path, entry)
+                    changed = True
+            for fingerprint in set(self.files) - set(present.values()):
+                # Файл удалён ротацией (вышел за backupCount).
+                del self.files[fingerprint]
+                changed = True
+            if changed:
+                codecs.write_file(self.path, {'version': INDEX_VERSION,
+                                              'files': self.files})
+        return present
+
+    @staticmethod
+    def _drop_last_block(entry: Dict[str, Any]) -> int:
+        block_id = len(entry['blocks']) - 1
+        offset = entry['blocks'].pop()[0]
+        for postings in (entry['users'], entry['actions']):
+            for key in list(postings):
+                if postings[key][-1] == block_id:
+                    postings[key].pop()
+                    if not postings[key]:
+                        del postings[key]
+        return offset
+
+    def _index_file(self, path: str, entry: Dict[str, Any]) -> None:
+        start = entry['size']
+        blocks = entry['blocks']
+        if blocks and blocks[-1][1] < self.block_bytes:
+            # Недобранный последний блок активного файла собирается заново.
+            start = self._drop_last_block(entry)
+        block: Optional[List[Any]] = None
+        users: Set[str] = set()
+        actions: Set[str] = set()
+
+        def close_block() -> None:
+            block_id = len(blocks)
+            blocks.append(block)
+            for key, postings in ((users, entry['users']),
+                                  (actions, entry['actions'])):
+                for value in key:
+                    postings.setdefault(value, []).append(block_id)
+            users.clear()
+            actions.clear()
+
+        offset = start
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                if block is None:
+                    block = [offset, 0, None, None]
+                fields = index_fields(raw)
+                offset += len(raw)
+                block[1] = offset - block[0]
+                if fields is not None:
+                    timestamp, username, action = fields
+                    if block[2] is None or timestamp < block[2]:
+                        block[2] = timestamp
+                    if block[3] is None or timestamp > block[3]:
+                        block[3] = timestamp
+                    users.add(username)
+                    actions.add(action)
+                if block[1] >= self.block_bytes:
+                    close_block()
+                    block = None
+        if block is not None:
+            close_block()
+        entry['size'] = offset
+        times = [b for b in blocks if b[2] is not None]
+        entry['min_ts'] = min((b[2] for b in times), default=None)
+        entry['max_ts'] = max((b[3] for b in times), default=None)
+
+    def search(self, username: Optional[str] = None, action: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None,
+               limit: int = 50) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Последние limit записей, подходящих под все условия, по времени.
+
+        Вместе с записями возвращается, сколько файлов и блоков пришлось
+        прочитать из общего числа.
+        """
+        since, until = normalize_time(since), normalize_time(until)
+        action = action.upper() if action else None
+        # Строки блока без нужных подстрок не разбираются вовсе.
+        needles = [f"{key!r}: {value!r}".encode() for key, value in
+                   (('username', username), ('action', action)) if value is not None]
+        present = self.update()
+        stats = {'files': len(present), 'files_read': 0,
+                 'blocks': 0, 'blocks_read': 0}
+        matches: deque = deque(maxlen=limit)
+        files = sorted(((self.files[fp], path) for path, fp in present.items()),
+                       key=lambda item: item[0]['min_ts'] or '')
+        for entry, path in files:
+            stats['blocks'] += len(entry['blocks'])
+            if entry['min_ts'] is None or (since and entry['max_ts'] < since) \
+                    or (until and entry['min_ts'] > until):
+                continue
+            candidates = set(range(len(entry['blocks'])))
+            if username is not None:
+                candidates &= set(entry['users'].get(username, ()))
+            if action is not None:
+                candidates &= set(entry['actions'].get(action, ()))
+            candidates = [entry['blocks'][i] for i in sorted(candidates)
+                          if entry['blocks'][i][2] is not None
+                          and not (since and entry['blocks'][i][3] < since)
+                          and not (until and entry['blocks'][i][2] > until)]
+            if not candidates:
+                continue
+            stats['files_read'] += 1
+            with open(path, 'rb') as f:
+                for offset, length, _, _ in candidates:
+                    stats['blocks_read'] += 1
+                    f.seek(offset)
+                    for raw in f.read(length).splitlines():
+                        if not all(needle in raw for needle in needles):
+                            continue
+                        record = parse_line(raw)
+                        if record is not None and _matches(record, username, action,
+                                                           since, until):
+                            matches.append(record)
+        return sorted(matches, key=lambda record: record['timestamp']), stats
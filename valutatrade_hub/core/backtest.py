@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+import math
+import os
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..infra.settings import SettingsLoader
+from ..parser_service.config import ParserConfig
+from ..parser_service.history_store import ColumnarHistory, to_epoch_ms
+from ..parser_service.retention import HistoryRollups
+from ..parser_service.storage import iter_json_array
+from .exceptions import CurrencyNotFoundError, InsufficientFundsError
+from .models import Portfolio, Wallet
+from .utils import validate_currency_code
+
+
+class RateTape:
+    """Упорядоченная по времени лента курсов к USD в компактных массивах.
+
+    Передаётся в процессы пула один раз (при инициализации воркера), а не
+    с каждым прогоном.
+    """
+    def __init__(self):
+        self.times = array('q')
+        self.rates = array('d')
+        self.codes = array('H')
+        self.currencies: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __iter__(self) -> Iterator[Tuple[int, str, float]]:
+        currencies = self.currencies
+        for time_ms, code, rate in zip(self.times, self.codes, self.rates):
+            yield time_ms, currencies[code], rate
+
+    @classmethod
+    def load(cls, currencies: List[str], since_ms: Optional[int] = None,
+             until_ms: Optional[int] = None,
+             config: Optional[ParserConfig] = None) -> 'RateTape':
+        """Собирает ленту из свёрнутой истории и сырых записей (колоночного
+        хранилища или exchange_rates.json) для пар <currency>_USD."""
+        config = config or ParserConfig()
+        rollups = HistoryRollups(config)
+        columnar = ColumnarHistory(config)
+        start_ms = since_ms or 0
+        end_ms = until_ms if until_ms is not None else 2 ** 62
+        events: List[Tuple[int, int, float]] = []
+        for index, currency in enumerate(currencies):
+            for time_ms, rate in rollups.rate_points(f"{currency}_USD", start_ms):
+                if time_ms <= end_ms:
+                    events.append((time_ms, index, rate))
+            if columnar.exists():
+                with columnar.open_pair(f"{currency}_USD") as columns:
+                    start, end = columns.window(start_ms, end_ms)
+                    events.extend((columns.ts[i], index, columns.rate[i])
+                                  for i in range(start, end))
+        if not columnar.exists():
+            indexes = {currency: index for index, currency in enumerate(currencies)}
+            try:
+                for entry in iter_json_array(config.HISTORY_FILE_PATH):
+                    index = indexes.get(entry.get("from_currency"))
+                    if index is None or entry.get("to_currency") != "USD":
+                        continue
+                    time_ms = to_epoch_ms(entry.get("timestamp"))
+                    if time_ms is not None and start_ms <= time_ms <= end_ms:
+                        events.append((time_ms, index, entry["rate"]))
+            except FileNotFoundError:
+                pass
+        # exchange_rates.json не упорядочен по времени: сортируем кортежи.
+        events.sort()
+        tape = cls()
+        tape.currencies = list(currencies)
+        for time_ms, index, rate in events:
+            tape.times.append(time_ms)
+            tape.codes.append(index)
+            tape.rates.append(rate)
+        return tape
+
+class SimBroker:
+    """Исполнение заявок в памяти по правилам UseCases.buy/sell.
+
+    Кошельки — те же Wallet внутри Portfolio, расчёты идут через USD по
+    последнему курсу ленты; ничего не пишется на диск.
+    """
+    def __init__(self, cash: float):
+        self.portfolio = Portfolio(0)
+        self.portfolio._wallets['USD'] = Wallet('USD', cash)
+        self.rates: Dict[str, float] = {'USD': 1.0}
+        self.trades = 0
+        self.rejected = 0
+
+    def _wallet(self, currency: str) -> Wallet:
+        wallet = self.portfolio._wallets.get(currency)
+        if wallet is None:
+            wallet = self.portfolio._wallets[currency] = Wallet(currency)
+        return wallet
+
+    @property
+    def cash(self) -> float:
+        return self.portfolio._wallets['USD'].balance
+
+    def balance(self, currency: str) -> float:
+        wallet = self.portfolio._wallets.get(currency)
+        return wallet.balance if wallet else 0.0
+
+    def rate(self, currency: str) -> Optional[float]:
+        return self.rates.get(currency)
+
+    def _check(self, currency: str, amount: float) -> Optional[float]:
+        if not isinstance(amount, (int, float)) or amount <= 0:
+            self.rejected += 1
+            return None
+        try:
+            validate_currency_code(currency)
+        except CurrencyNotFoundError:
+            self.rejected += 1
+            return None
+        rate = self.rates.get(currency)
+        if rate is None:
+            self.rejected += 1
+        return rate
+
+    def buy(self, currency: str, amount: float) -> bool:
+        rate = self._check(currency, amount)
+        if rate is None:
+            return False
+        try:
+            self._wallet('USD').withdraw(amount * rate)
+        except InsufficientFundsError:
+            self.rejected += 1
+            return False
+        self._wallet(currency).deposit(amount)
+        self.trades += 1
+        return True
+
+    def sell(self, currency: str, amount: float) -> bool:
+        rate = self._check(currency, amount)
+        if rate is None:
+            return False
+        try:
+            self._wallet(currency).withdraw(amount)
+        except InsufficientFundsError:
+            self.rejected += 1
+            return False
+        self._wallet('USD').deposit(amount * rate)
+        self.trades += 1
+        return True
+
+    def value(self) -> float:
+        """Стоимость портфеля в USD по последним курсам ленты."""
+        total = 0.0
+        for currency, wallet in self.portfolio._wallets.items():
+            rate = self.rates.get(currency)
+            if rate is not None:
+                total += wallet.balance * rate
+        return total
+
+class Strategy(ABC):
+    """Стратегия получает события ленты и выставляет заявки через брокера.
+
+    Параметры передаются именованными аргументами; допустимые имена и
+    значения по умолчанию — в defaults.
+    """
+    name = ""
+    defaults: Dict[str, float] = {}
+
+    def __init__(self, **params: float):
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Стратегия {self.name} не знает параметров: "
+                             f"{', '.join(sorted(unknown))}")
+        self.params = {**self.defaults, **params}
+
+    def on_start(self, broker: SimBroker) -> None:
+        pass
+
+    @abstractmethod
+    def on_rate(self, time_ms: int, currency: str, rate: float,
+                broker: SimBroker) -> None:
+        pass
+
+    def on_finish(self, broker: SimBroker) -> None:
+        pass
+
+    def _int_param(self, name: str, minimum: int) -> int:
+        """Целочисленный параметр (длина окна) не меньше minimum."""
+        value = self.params[name]
+        if not isinstance(value, (int, float)) or not float(value).is_integer() \
+                or value < minimum:
+            raise ValueError(f"Параметр {name} должен быть целым числом >= {minimum}, "
+                             f"получено {value}")
+        return int(value)
+
+    def _buy_for(self, broker: SimBroker, currency: str, usd: float) -> None:
+        if usd <= 0:
+            return
+        amount = usd / broker.rate(currency)
+        if amount * broker.rate(currency) > broker.cash:
+            # Округление не должно превращать «на все деньги» в отказ.
+            amount = math.nextafter(amount, 0.0)
+        broker.buy(currency, amount)
+
+    def _sell_all(self, broker: SimBroker, currency: str) -> None:
+        balance = broker.balance(currency)
+        if balance > 0:
+            broker.sell(currency, balance)
+
+class BuyAndHold(Strategy):
+    """Покупает на долю fraction свободных USD при первом курсе валюты."""
+    name = "buy_hold"
+    defaults = {'fraction': 1.0}
+
+    def on_start(self, broker: SimBroker) -> None:
+        self._seen = set()
+
+    def on_rate(self, time_ms: int, currency: str, rate: float,
+                broker: SimBroker) -> None:
+        if currency not in self._seen:
+            self._seen.add(currency)
+            self._buy_for(broker, currency, broker.cash * self.params['fraction'])
+
+class SmaCross(Strategy):
+    """Пересечение быстрой (fast) и медленной (slow) скользящих средних:
+    вверх — покупка на долю fraction свободных USD, вниз — продажа всего."""
+    name = "sma_cross"
+    defaults = {'fast': 5, 'slow': 20, 'fraction': 1.0}
+
+    def on_start(self, broker: SimBroker) -> None:
+        self._fast, self._slow = self._int_param('fast', 1), self._int_param('slow', 2)
+        if self._fast >= self._slow:
+            raise ValueError("Должно быть fast < slow")
+        self._windows: Dict[str, deque] = {}
+        self._sums: Dict[str, float] = {}
+        self._above: Dict[str, bool] = {}
+
+    def on_rate(self, time_ms: int, currency: str, rate: float,
+                broker: SimBroker) -> None:
+        fast, slow = self._fast, self._slow
+        window = self._windows.setdefault(currency, deque(maxlen=slow))
+        if len(window) == slow:
+            self._sums[currency] -= window[0]
+        window.append(rate)
+        self._sums[currency] = self._sums.get(currency, 0.0) + rate
+        if len(window) < slow:
+            return
+        fast_mean = sum(window[i] for i in range(slow - fast, slow)) / fast
+        above = fast_mean > self._sums[currency] / slow
+        previous = self._above.get(currency)
+        self._above[currency] = above
+        if previous is None or previous == above:
+            return
+        if above:
+            self._buy_for(broker, currency, broker.cash * self.params['fraction'])
+        else:
+            self._sell_all(broker, currency)
+
+class MeanReversion(Strategy):
+    """Покупка при отклонении курса вниз от среднего за window событий больше
+    чем на band (доля), продажа всего — при отклонении вверх."""
+    name = "mean_reversion"
+    defaults = {'window': 20, 'band': 0.02, 'fraction': 0.5}
+
+    def on_start(self, broker: SimBroker) -> None:
+        self._size = self._int_param('window', 2)
+        if self.params['band'] <= 0:
+            raise ValueError("Должно быть band > 0")
+        self._windows: Dict[str, deque] = {}
+
+    def on_rate(self, time_ms: int, currency: str, rate: float,
+                broker: SimBroker) -> None:
+        size = self._size
+        window = self._windows.setdefault(currency, deque(maxlen=size))
+        window.append(rate)
+        if len(window) < size:
+            return
+        mean = sum(window) / size
+        if rate < mean * (1 - self.params['band']):
+            self._buy_for(broker, currency, broker.cash * self.params['fraction'])
+        elif rate > mean * (1 + self.params['band']):
+            self._sell_all(broker, currency)
+
+STRATEGIES = {strategy.name: strategy
+              for strategy in (BuyAndHold, SmaCross, MeanReversion)}
+
+def get_strategy(name: str, params: Optional[Dict[str, float]] = None) -> Strategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия '{name}'. Доступны: {', '.join(STRATEGIES)}")#noqa: E501
+    return STRATEGIES[name](**(params or {}))
+
+def run_backtest(strategy_name: str, params: Dict[str, float], tape: RateTape,
+                 cash: float = 10000.0) -> Dict[str, Any]:
+    """Прогоняет ленту через стратегию; возвращает P&L и максимальную просадку."""
+    strategy = get_strategy(strategy_name, params)
+    broker = SimBroker(cash)
+    strategy.on_start(broker)
+    peak, max_drawdown = cash, 0.0
+    for time_ms, currency, rate in tape:
+        broker.rates[currency] = rate
+        strategy.on_rate(time_ms, currency, rate, broker)
+        value = broker.value()
+        if value > peak:
+            peak = value
+        elif peak > 0 and (peak - value) / peak > max_drawdown:
+            max_drawdown = (peak - value) / peak
+    strategy.on_finish(broker)
+    final_value = broker.value()
+    return {'strategy': strategy_name, 'params': strategy.params,
+            'final_value': round(final_value, 2),
+            'pnl': round(final_value - cash, 2),
+            'pnl_pct': round((final_value - cash) / cash * 100, 4) if cash else 0.0,
+            'max_drawdown_pct': round(max_drawdown * 100, 4),
+            'trades': broker.trades, 'rejected': broker.rejected}
+
+def parse_grid(specs: List[str]) -> Dict[str, List[float]]:
+    """Разбирает параметры вида fast=5,10,20 в сетку значений."""
+    grid: Dict[str, List[float]] = {}
+    for spec in specs:
+        key, sep, values = spec.partition('=')
+        if not sep or not key.strip() or not values.strip():
+            raise ValueError(f"Некорректный параметр '{spec}': ожидается имя=знач1,знач2")#noqa: E501
+        parsed = []
+        for value in values.split(','):
+            number = float(value)
+            parsed.append(int(number) if number.is_integer() and '.' not in value else number)#noqa: E501
+        grid[key.strip()] = parsed
+    return grid
+
+def expand_grid(grid: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in product(*(grid[k] for k in keys))]
+
+_worker: Dict[str, Any] = {}
+
+def _init_worker(strategy_name: str, tape: RateTape, cash: float) -> None:
+    _worker.update(strategy=strategy_name, tape=tape, cash=cash)
+
+def _run_one(params: Dict[str, float]) -> Dict[str, Any]:
+    try:
+        return run_backtest(_worker['strategy'], params, _worker['tape'],
+                            _worker['cash'])
+    except Exception as e:
+        # Ошибка одного сочетания параметров не должна прерывать всю сетку.
+        return {'strategy': _worker['strategy'], 'params': params,
+                'error': str(e) or type(e).__name__}
+
+def run_grid(strategy_name: str, grid: Dict[str, List[float]], tape: RateTape,
+             cash: float = 10000.0, workers: Optional[int] = None
+             ) -> List[Dict[str, Any]]:
+    """Прогоняет все сочетания параметров в пуле процессов.
+
+    Результаты упорядочены по P&L (лучшие первыми); прогоны с
+    недопустимыми параметрами возвращаются с ключом error.
+    """
+    get_strategy(strategy_name)
+    combinations = expand_grid(grid)
+    workers = workers or SettingsLoader().get('backtest_workers', None) or os.cpu_count() or 1#noqa: E501
+    workers = max(1, min(workers, len(combinations)))
+    if workers == 1:
+        _init_worker(strategy_name, tape, cash)
+        results = [_run_one(params) for params in combinations]
+    else:
+        chunksize = max(1, len(combinations) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(strategy_name, tape, cash)) as pool:
+            results = list(pool.map(_run_one, combinations, chunksize=chunksize))
+    results.sort(key=lambda result: result.get('pnl', float('-inf')), reverse=True)
+    return results
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 from abc import ABC, abstractmethod
+from importlib.metadata import entry_points
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional
 
+from ..infra.settings import SettingsLoader
 from .exceptions import CurrencyNotFoundError
 
 
@@ -49,12 +53,72 @@ class CryptoCurrency(Currency):
     def get_display_info(self) -> str:
         return f"[CRYPTO] {self.code} — {self.name} (Algo: {self._algorithm}, MCAP: {self._market_cap:.2e})"#noqa: E501
 
-_currency_registry = {
-    "USD": FiatCurrency("US Dollar", "USD", "United States"),
-    "EUR": FiatCurrency("Euro", "EUR", "Eurozone"),
-    "BTC": CryptoCurrency("Bitcoin", "BTC", "SHA-256", 1.12e12),
-    "ETH": CryptoCurrency("Ethereum", "ETH", "Ethash", 3.45e11)
-}
+_BUILTIN_CURRENCIES = [
+    {"code": "USD", "name": "US Dollar", "type": "fiat", "issuing_country": "United States"},#noqa: E501
+    {"code": "EUR", "name": "Euro", "type": "fiat", "issuing_country": "Eurozone"},
+    {"code": "GBP", "name": "British Pound", "type": "fiat", "issuing_country": "United Kingdom"},#noqa: E501
+    {"code": "RUB", "name": "Russian Ruble", "type": "fiat", "issuing_country": "Russia"},#noqa: E501
+    {"code": "BTC", "name": "Bitcoin", "type": "crypto", "algorithm": "SHA-256",
+     "market_cap": 1.12e12, "provider_ids": {"coingecko": "bitcoin"}},
+    {"code": "ETH", "name": "Ethereum", "type": "crypto", "algorithm": "Ethash",
+     "market_cap": 3.45e11, "provider_ids": {"coingecko": "ethereum"}},
+    {"code": "SOL", "name": "Solana", "type": "crypto", "algorithm": "Proof of History",#noqa: E501
+     "market_cap": 8.5e10, "provider_ids": {"coingecko": "solana"}},
+]
+
+_currency_registry: Dict[str, Currency] = {}
+_provider_ids: Dict[str, Dict[str, str]] = {}
+
+def currency_from_definition(definition: Dict[str, Any]) -> Currency:
+    """Создаёт валюту из описания (встроенного, из config.json или плагина)."""
+    kind = definition.get("type", "fiat").lower()
+    if kind == "fiat":
+        return FiatCurrency(definition["name"], definition["code"],
+                            definition.get("issuing_country", "Unknown"))
+    if kind == "crypto":
+        return CryptoCurrency(definition["name"], definition["code"],
+                              definition.get("algorithm", "Unknown"),
+                              definition.get("market_cap", 0.0))
+    raise ValueError(f"Неизвестный тип валюты '{kind}'")
+
+def register_currency(currency: Currency,
+                      provider_ids: Optional[Dict[str, str]] = None) -> None:
+    """Добавляет валюту в реестр (повторная регистрация заменяет описание)."""
+    _currency_registry[currency.code] = currency
+    for provider, provider_id in (provider_ids or {}).items():
+        _provider_ids.setdefault(provider.lower(), {})[currency.code] = provider_id
+
+def _iter_plugin_definitions() -> Iterable[Dict[str, Any]]:
+    for entry_point in entry_points(group="valutatrade_hub.currencies"):
+        try:
+            loaded = entry_point.load()
+            yield from (loaded() if callable(loaded) else loaded)
+        except Exception as e:
+            print(f"Предупреждение: Не удалось загрузить плагин валют '{entry_point.name}': {str(e)}")#noqa: E501
+
+def load_currencies() -> None:
+    """Строит таблицу валют: встроенные, затем config.json, затем плагины."""
+    _currency_registry.clear()
+    _provider_ids.clear()
+    definitions = chain(_BUILTIN_CURRENCIES,
+                        SettingsLoader().get('currencies', []),
+                        _iter_plugin_definitions())
+    for definition in definitions:
+        try:
+            register_currency(currency_from_definition(definition),
+                              definition.get("provider_ids"))
+        except (KeyError, ValueError) as e:
+            print(f"Предупреждение: Пропущено описание валюты {definition}: {str(e)}")#noqa: E501
+
+def list_currencies(kind: Optional[str] = None) -> List[Currency]:
+    """Возвращает зарегистрированные валюты, опционально только 'fiat' или 'crypto'."""#noqa: E501
+    classes = {"fiat": FiatCurrency, "crypto": CryptoCurrency}
+    return [currency for currency in _currency_registry.values()
+            if kind is None or isinstance(currency, classes[kind])]
+
+def get_provider_ids(provider: str) -> Dict[str, str]:
+    """Возвращает соответствие код валюты → идентификатор у провайдера."""
+    return dict(_provider_ids.get(provider.lower(), {}))
 
 def get_currency(code: str) -> Currency:
     if not isinstance(code, str) or not code.strip():
@@ -63,4 +127,6 @@ def get_currency(code: str) -> Currency:
     currency = _currency_registry.get(code)
     if currency is None:
         raise CurrencyNotFoundError(f"Неизвестная валюта '{code}'")
-    return currency
\ No newline at end of file
+    return currency
+
+load_currencies()
@@ -13,4 +13,9 @@ class CurrencyNotFoundError(Exception):
 class ApiRequestError(Exception):
     def __init__(self, reason: str):
         self.message = f"Ошибка при обращении к внешнему API: {reason}"
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class StaleRateError(Exception):
+    def __init__(self, pair: str, age: float):
+        self.message = f"Курс {pair} устарел ({age:.0f} с) и не обновился вовремя. Повторите позже"#noqa: E501
+        super().__init__(self.message)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+from typing import Any, Dict, Optional, Tuple
+
+from .rates_view import RatesView, get_rates_view
+from .utils import get_exposure
+
+_valuation: Optional[Tuple[RatesView, str, Dict[str, Optional[float]]]] = None
+
+def _rates_to(base: str) -> Dict[str, Optional[float]]:
+    """Курсы всех валют к base; пересчитываются один раз на снимок курсов."""
+    global _valuation
+    view = get_rates_view()
+    cached = _valuation
+    if cached is not None and cached[0] is view and cached[1] == base:
+        return cached[2]
+    rates: Dict[str, Optional[float]] = {base: 1.0}
+    for code, row in view.table(base).items():
+        if code != base:
+            rates[code] = row['rate'] if row else None
+    _valuation = (view, base, rates)
+    return rates
+
+def exposure_report(base: str = 'USD') -> Dict[str, Any]:
+    """Совокупная позиция по всем пользователям и её стоимость в base.
+
+    Балансы и число держателей берутся из агрегатов журнала, поэтому
+    время ответа не зависит от числа пользователей: оценка — по числу валют.
+    """
+    exposure = get_exposure()
+    rates = _rates_to(base)
+    rows, total, missing = [], 0.0, []
+    for code in sorted(exposure['totals']):
+        amount = exposure['totals'][code]
+        holders = exposure['holders'].get(code, 0)
+        if not holders and abs(amount) < 1e-12:
+            continue
+        rate = rates.get(code)
+        value = None if rate is None else amount * rate
+        if value is None:
+            missing.append(code)
+        else:
+            total += value
+        rows.append({'currency': code, 'amount': amount, 'holders': holders,
+                     'value': value})
+    rows.sort(key=lambda row: row['value'] or 0.0, reverse=True)
+    return {'base': base, 'users': exposure['users'], 'seq': exposure['seq'],
+            'rows': rows, 'total': total, 'missing': missing}
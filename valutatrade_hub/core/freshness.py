@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import logging
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from ..infra.settings import SettingsLoader
+from .exceptions import StaleRateError
+from .utils import get_rates_snapshot, parse_timestamp
+
+logger = logging.getLogger('ParserService')
+
+def pair_ttl(pair_data: Mapping[str, Any]) -> float:
+    """TTL пары: наименьший из TTL её провайдеров (source_ttl_seconds)."""
+    settings = SettingsLoader()
+    default = settings.get('rates_ttl_seconds', 300)
+    source_ttl = settings.get('source_ttl_seconds', {})
+    providers = pair_data.get('providers') or []
+    return min((source_ttl.get(provider, default) for provider in providers),
+               default=default)
+
+def pair_age(pair_data: Mapping[str, Any], now: Optional[datetime] = None) -> float:
+    """Возраст курса пары в секундах по его updated_at."""
+    updated_at = parse_timestamp(pair_data.get('updated_at'))
+    if updated_at is None:
+        return float('inf')
+    return max(((now or datetime.utcnow()) - updated_at).total_seconds(), 0.0)
+
+def max_stale_age(pair: str) -> Optional[float]:
+    """Предельный возраст курса, по которому ещё исполняются сделки:
+    stale_max_age_per_pair, иначе stale_max_age_seconds (None — без предела)."""
+    settings = SettingsLoader()
+    return settings.get('stale_max_age_per_pair', {}).get(
+        pair, settings.get('stale_max_age_seconds', None))
+
+def is_pair_fresh(pair_data: Mapping[str, Any], now: Optional[datetime] = None) -> bool:#noqa: E501
+    return pair_age(pair_data, now) < pair_ttl(pair_data)
+
+class SingleFlight:
+    """Объединяет одновременные запросы одной и той же работы по ключу.
+
+    Первый вызов запускает работу в фоновом потоке, остальные получают
+    то же событие завершения. Ждать его можно сколько угодно меньше
+    времени работы: она продолжится и пригодится следующим запросам.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._inflight: Dict[str, Event] = {}
+
+    def submit(self, key: str, func: Callable[[], Any]) -> Event:
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = Event()
+        if leader:
+            def target():
+                try:
+                    func()
+                except Exception as e:
+                    logger.error(f"Targeted refresh {key} failed: {str(e)}")
+                finally:
+                    with self._lock:
+                        self._inflight.pop(key, None)
+                    event.set()
+            Thread(target=target, daemon=True).start()
+        return event
+
+_refresh_flight = SingleFlight()
+_refresh_updater = None
+
+def _refresh(pair: str, provider: Optional[str]) -> None:
+    global _refresh_updater
+    # Курс мог уже обновить планировщик или другой процесс.
+    pair_data = get_rates_snapshot().pairs.get(pair)
+    if pair_data is not None and is_pair_fresh(pair_data):
+        return
+    if _refresh_updater is None:
+        from ..parser_service.updater import get_updater
+        _refresh_updater = get_updater()
+    logger.info(f"Refreshing stale {pair} from {provider or 'all sources'}")
+    _refresh_updater.run_update(provider)
+
+def fresh_pair(pair: str) -> Tuple[Optional[Mapping[str, Any]], int]:
+    """Данные пары и версия снимка; устаревшую пару сначала пытается обновить.
+
+    Обновляется только источник этой пары, одновременные запросы
+    объединяются. Если за stale_refresh_max_wait_seconds курс не
+    обновился, stale_policy решает: 'use' — взять прежний курс (если он
+    не старше max_stale_age), 'reject' — StaleRateError.
+    """
+    snapshot = get_rates_snapshot()
+    pair_data = snapshot.pairs.get(pair)
+    if pair_data is None or is_pair_fresh(pair_data):
+        return pair_data, snapshot.version
+
+    settings = SettingsLoader()
+    max_wait = settings.get('stale_refresh_max_wait_seconds', 3)
+    events = [_refresh_flight.submit(provider or '*',
+                                     lambda p=provider: _refresh(pair, p))
+              for provider in pair_data.get('providers') or [None]]
+    deadline = time.monotonic() + max_wait
+    for event in events:
+        event.wait(max(deadline - time.monotonic(), 0))
+    snapshot = get_rates_snapshot()
+    pair_data = snapshot.pairs.get(pair, pair_data)
+    if is_pair_fresh(pair_data):
+        return pair_data, snapshot.version
+
+    age = pair_age(pair_data)
+    max_age = max_stale_age(pair)
+    if settings.get('stale_policy', 'use') == 'reject' \
+            or (max_age is not None and age > max_age):
+        raise StaleRateError(pair, age)
+    logger.warning(f"Using stale rate {pair} ({age:.0f}s old)")
+    print(f"Предупреждение: курс {pair} устарел ({age:.0f} с), используется последний известный.")#noqa: E501
+    return pair_data, snapshot.version
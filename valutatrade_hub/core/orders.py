@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..infra.database import DatabaseManager, _file_signature
+from ..infra.locks import FileLock
+from .exceptions import CurrencyNotFoundError
+from .utils import get_portfolio_by_user_id, validate_currency_code
+
+logger = logging.getLogger('ParserService')
+
+ORDERS_FILE = 'orders.json'
+ORDER_SIDES = ('BUY', 'SELL')
+ORDER_TYPES = ('LIMIT', 'STOP')
+FILLED_PREFIXES = ("Покупка выполнена", "Продажа выполнена")
+
+def trigger_direction(side: str, order_type: str) -> str:
+    """'below' — срабатывает при курсе не выше цены, 'above' — не ниже.
+
+    Лимитная покупка и стоп на продажу ждут падения курса,
+    лимитная продажа и стоп на покупку — роста.
+    """
+    if (side, order_type) in (('BUY', 'LIMIT'), ('SELL', 'STOP')):
+        return 'below'
+    return 'above'
+
+class OrderBook:
+    """Лимитные и стоп-заявки, проиндексированные по цене срабатывания.
+
+    Для каждой пары две кучи: 'above' (min-куча по цене) и 'below'
+    (max-куча). После обновления курса из куч извлекаются только
+    сработавшие заявки — O(log n + k). Отменённые заявки остаются в куче
+    и пропускаются при извлечении.
+    """
+    def __init__(self):
+        self.db = DatabaseManager()
+        self.path = os.path.join(self.db._data_dir, ORDERS_FILE)
+        self._file_lock = FileLock(os.path.join(self.db._data_dir, 'orders.lock'))
+        self._lock = threading.RLock()
+        self._orders: Dict[int, Dict[str, Any]] = {}
+        self._books: Dict[str, Dict[str, List[Tuple[float, int]]]] = {}
+        self._signature = None
+
+    def _reload_if_changed(self) -> None:
+        """Перечитывает заявки, если файл изменил другой процесс."""
+        signature = _file_signature(self.path)
+        if signature is not None and signature == self._signature:
+            return
+        self._orders = {order['order_id']: order
+                        for order in self.db._read_json(ORDERS_FILE)}
+        self._books = {}
+        for order in self._orders.values():
+            if order['status'] == 'OPEN':
+                self._book(order['pair'])[order['trigger']].append(
+                    self._heap_key(order))
+        for book in self._books.values():
+            for heap in book.values():
+                heapq.heapify(heap)
+        self._signature = _file_signature(self.path)
+
+    def _save(self) -> None:
+        self.db._write_json(ORDERS_FILE, sorted(self._orders.values(),
+                                                key=lambda o: o['order_id']))
+        self._signature = _file_signature(self.path)
+
+    def _book(self, pair: str) -> Dict[str, List[Tuple[float, int]]]:
+        return self._books.setdefault(pair, {'above': [], 'below': []})
+
+    @staticmethod
+    def _heap_key(order: Dict[str, Any]) -> Tuple[float, int]:
+        price = order['price']
+        return (price if order['trigger'] == 'above' else -price, order['order_id'])
+
+    def place(self, user_id: int, currency: str, side: str, order_type: str,
+              price: float, amount: float) -> Dict[str, Any]:
+        """Создаёт заявку; средства резервируются только в момент исполнения."""
+        side, order_type = side.upper(), order_type.upper()
+        if side not in ORDER_SIDES or order_type not in ORDER_TYPES:
+            raise ValueError("Тип заявки: limit|stop, направление: buy|sell")
+        if price <= 0 or amount <= 0:
+            raise ValueError("Цена и сумма должны быть положительными числами")
+        validate_currency_code(currency)
+        if currency == 'USD':
+            raise CurrencyNotFoundError("Заявки выставляются на валюту против USD")
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            order = {
+                'order_id': max(self._orders, default=0) + 1,
+                'user_id': user_id,
+                'pair': f"{currency}_USD",
+                'currency': currency,
+                'side': side,
+                'type': order_type,
+                'trigger': trigger_direction(side, order_type),
+                'price': price,
+                'amount': amount,
+                'status': 'OPEN',
+                'created_at': datetime.now().isoformat(),
+            }
+            self._orders[order['order_id']] = order
+            heapq.heappush(self._book(order['pair'])[order['trigger']],
+                           self._heap_key(order))
+            self._save()
+        return order
+
+    def cancel(self, user_id: int, order_id: int) -> Optional[Dict[str, Any]]:
+        """Отменяет открытую заявку пользователя (из кучи она уйдёт лениво)."""
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            order = self._orders.get(order_id)
+            if order is None or order['user_id'] != user_id \
+                    or order['status'] != 'OPEN':
+                return None
+            order['status'] = 'CANCELLED'
+            order['closed_at'] = datetime.now().isoformat()
+            self._save()
+        return order
+
+    def list_orders(self, user_id: int,
+                    include_closed: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._reload_if_changed()
+            return [order for order in self._orders.values()
+                    if order['user_id'] == user_id
+                    and (include_closed or order['status'] in ('OPEN', 'EXECUTING'))]
+
+    def _pop_triggered(self, pair: str, rate: float) -> List[Dict[str, Any]]:
+        book = self._books.get(pair)
+        if book is None:
+            return []
+        triggered = []
+        above, below = book['above'], book['below']
+        while above and above[0][0] <= rate:
+            triggered.append(self._orders[heapq.heappop(above)[1]])
+        while below and -below[0][0] >= rate:
+            triggered.append(self._orders[heapq.heappop(below)[1]])
+        return [order for order in triggered if order['status'] == 'OPEN']
+
+    def process(self, rates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Исполняет заявки, чьи цены пересёк новый курс. Слушатель RatesUpdater.
+
+        Сработавшие заявки извлекаются и помечаются EXECUTING под
+        блокировками, сделки выполняются без них (покупка может ждать
+        обновления устаревшего курса, которое само вызывает process), а
+        итоги записываются под блокировками снова. Заявка, оставшаяся в
+        EXECUTING после сбоя процесса, не повторяется: сделка могла пройти.
+        """
+        from .usecases import UseCases
+        claimed = []
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            for pair, info in rates.items():
+                rate = info.get('rate')
+                if rate is None:
+                    continue
+                for order in sorted(self._pop_triggered(pair, rate),
+                                    key=lambda o: o['order_id']):
+                    order['status'] = 'EXECUTING'
+                    order['trigger_rate'] = rate
+                    claimed.append(dict(order))
+            if claimed:
+                self._save()
+        if not claimed:
+            return []
+
+        for order in claimed:
+            operation = UseCases.buy if order['side'] == 'BUY' else UseCases.sell
+            result = "Портфель не найден"
+            if get_portfolio_by_user_id(order['user_id']):
+                result = operation(order['user_id'], order['currency'],
+                                   order['amount'])
+            filled = result.startswith(FILLED_PREFIXES)
+            order['status'] = 'FILLED' if filled else 'REJECTED'
+            order['result'] = result.splitlines()[0]
+            order['closed_at'] = datetime.now().isoformat()
+            logger.info(f"Order {order['order_id']} {order['status']} "
+                        f"at {order['trigger_rate']}")
+
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            for order in claimed:
+                self._orders[order['order_id']] = order
+            self._save()
+        return claimed
+
+_order_book: Optional[OrderBook] = None
+
+def get_order_book() -> OrderBook:
+    """Общая для процесса книга заявок (CLI и планировщик обновлений)."""
+    global _order_book
+    if _order_book is None:
+        _order_book = OrderBook()
+    return _order_book
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import heapq
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..infra.database import DatabaseManager
+from ..parser_service.config import ParserConfig
+from ..parser_service.history_store import ColumnarHistory, from_epoch_ms, to_epoch_ms
+from ..parser_service.retention import HistoryRollups
+from ..parser_service.storage import iter_json_array
+
+DAY_MS = 24 * 3600 * 1000
+STEP_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_step(step: str) -> int:
+    """Разбирает шаг вида 30m, 1h, 1d (или число секунд) в секунды."""
+    match = re.fullmatch(r"(\d+)([smhd]?)", step.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Некорректный шаг '{step}': ожидается, например, 15m, 1h или 1d")#noqa: E501
+    return int(match.group(1)) * STEP_UNITS[match.group(2) or "s"]
+
+class PortfolioState:
+    """Балансы, последние курсы к USD и себестоимость позиций пользователя."""
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.balances: Dict[str, float] = dict(data.get("balances", {}))
+        self.rates: Dict[str, float] = dict(data.get("rates", {"USD": 1.0}))
+        self.cost: Dict[str, float] = dict(data.get("cost", {}))
+        self.realised: float = data.get("realised", 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"balances": self.balances, "rates": self.rates,
+                "cost": self.cost, "realised": self.realised}
+
+    def apply_record(self, record: Dict[str, Any]) -> None:
+        action = record.get("action")
+        currency = record.get("currency")
+        amount = record.get("amount") or 0.0
+        rate = record.get("rate")
+        if rate is not None and currency:
+            self.rates[currency] = rate
+        if currency and currency != "USD":
+            held = self.balances.get(currency, 0.0)
+            if action == "BUY":
+                self.cost[currency] = self.cost.get(currency, 0.0) + amount * rate
+            elif action == "SELL" and held > 0:
+                average = self.cost.get(currency, 0.0) / held
+                self.realised += (rate - average) * amount
+                self.cost[currency] = self.cost.get(currency, 0.0) - average * amount
+            elif action == "DEPOSIT":
+                market = self.rates.get(currency, 0.0)
+                self.cost[currency] = self.cost.get(currency, 0.0) + amount * market
+        self.balances.update(record.get("balances", {}))
+
+    def point(self, time_ms: int, base: str) -> Dict[str, Any]:
+        value_usd, unrealised_usd, missing = 0.0, 0.0, []
+        for currency, balance in self.balances.items():
+            rate = self.rates.get(currency)
+            if rate is None:
+                if balance:
+                    missing.append(currency)
+                continue
+            value_usd += balance * rate
+            if currency != "USD":
+                unrealised_usd += balance * rate - self.cost.get(currency, 0.0)
+        base_rate = self.rates.get(base)
+        if base_rate is None:
+            return {"time": from_epoch_ms(time_ms), "value": None,
+                    "realised": None, "unrealised": None, "missing": [base]}
+        return {"time": from_epoch_ms(time_ms),
+                "value": round(value_usd / base_rate, 8),
+                "realised": round(self.realised / base_rate, 8),
+                "unrealised": round(unrealised_usd / base_rate, 8),
+                "missing": missing}
+
+class PortfolioHistory:
+    """Временной ряд стоимости портфеля и P&L за один проход слияния журнала и истории."""#noqa: E501
+    def __init__(self, config: Optional[ParserConfig] = None):
+        self.config = config or ParserConfig()
+        self.db = DatabaseManager()
+        self.cache_dir = os.path.join(self.db._data_dir, "cache", "portfolio_history")
+
+    def _ledger_events(self, user_id: int, start_ms: int) -> Iterator[Tuple[int, int, Dict]]:#noqa: E501
+        for record in self.db.iter_ledger(user_id):
+            time_ms = to_epoch_ms(record.get("timestamp"))
+            if time_ms is not None and time_ms >= start_ms:
+                yield time_ms, 1, record
+
+    def _rate_events(self, start_ms: int) -> Iterator[Tuple[int, int, Dict]]:
+        # Свёрнутая часть истории (курсы закрытия свечей) предшествует сырой.
+        rollups = HistoryRollups(self.config)
+        pairs = set(rollups.pairs("1h")) | set(rollups.pairs("1d"))
+        for time_ms, currency, rate in heapq.merge(
+                *(self._rollup_events(rollups, pair, start_ms) for pair in pairs)):
+            yield time_ms, 0, {"currency": currency, "rate": rate}
+        columnar = ColumnarHistory(self.config)
+        if columnar.exists():
+            yield from heapq.merge(*(self._pair_events(columnar, pair, start_ms)
+                                     for pair in columnar.pairs()),
+                                   key=lambda event: event[0])
+            return
+        # exchange_rates.json не упорядочен по времени: сортируем компактные
+        # кортежи, а не сами записи; колоночное хранилище уже отсортировано.
+        quotes = []
+        try:
+            for entry in iter_json_array(self.config.HISTORY_FILE_PATH):
+                time_ms = to_epoch_ms(entry.get("timestamp"))
+                if time_ms is not None and time_ms >= start_ms \
+                        and entry.get("to_currency") == "USD":
+                    quotes.append((time_ms, entry["from_currency"], entry["rate"]))
+        except FileNotFoundError:
+            return
+        quotes.sort()
+        for time_ms, currency, rate in quotes:
+            yield time_ms, 0, {"currency": currency, "rate": rate}
+
+    @staticmethod
+    def _rollup_events(rollups: HistoryRollups, pair: str,
+                       start_ms: int) -> Iterator[Tuple[int, str, float]]:
+        currency, quote = pair.split("_", 1)
+        if quote != "USD":
+            return
+        for time_ms, rate in rollups.rate_points(pair, start_ms):
+            yield time_ms, currency, rate
+
+    @staticmethod
+    def _pair_events(columnar: ColumnarHistory, pair: str,
+                     start_ms: int) -> Iterator[Tuple[int, int, Dict]]:
+        currency, quote = pair.split("_", 1)
+        if quote != "USD":
+            return
+        with columnar.open_pair(pair) as columns:
+            start, end = columns.window(start_ms)
+            for i in range(start, end):
+                yield columns.ts[i], 0, {"currency": currency, "rate": columns.rate[i]}
+
+    def _cache_path(self, user_id: int, base: str, step: int, day_ms: int) -> str:
+        day = from_epoch_ms(day_ms)[:10]
+        return os.path.join(self.cache_dir, f"{user_id}_{base}_{step}", f"{day}.json")#noqa: E501
+
+    def _load_cached_day(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_cached_day(self, path: str, points: List[Dict[str, Any]],
+                         state: PortfolioState) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump({"points": points, "state": state.to_dict()}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def series(self, user_id: int, base: str = "USD", since: Optional[str] = None,
+               step: str = "1h", use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Точки (время, стоимость, реализованный и нереализованный P&L) с шагом step."""#noqa: E501
+        step_ms = parse_step(step) * 1000
+        now_ms = to_epoch_ms(datetime.utcnow().isoformat())
+        since_ms = to_epoch_ms(since) if since else now_ms - DAY_MS
+        if since_ms is None:
+            raise ValueError(f"Некорректная дата '{since}'")
+        today_ms = now_ms - now_ms % DAY_MS
+
+        points: List[Dict[str, Any]] = []
+        state = PortfolioState()
+        resume_ms = 0
+        day_ms = since_ms - since_ms % DAY_MS
+        while use_cache and day_ms < today_ms:
+            cached = self._load_cached_day(self._cache_path(user_id, base, step_ms,
+                                                            day_ms))
+            if cached is None:
+                break
+            points.extend(cached["points"])
+            state = PortfolioState(cached["state"])
+            day_ms += DAY_MS
+            resume_ms = day_ms
+
+        day_ms = max(since_ms - since_ms % DAY_MS, resume_ms)
+        tick = day_ms + (-day_ms % step_ms)
+        day_end = day_ms + DAY_MS
+        day_points: List[Dict[str, Any]] = []
+
+        def emit_until(limit_ms: int) -> None:
+            """Выдаёт точки и закрывает сутки, наступившие не позже limit_ms."""
+            nonlocal tick, day_end, day_points
+            while min(tick, day_end) <= limit_ms:
+                if day_end <= tick:
+                    if use_cache and day_end <= today_ms:
+                        self._save_cached_day(self._cache_path(
+                            user_id, base, step_ms, day_end - DAY_MS), day_points, state)#noqa: E501
+                    day_end += DAY_MS
+                    day_points = []
+                    continue
+                point = state.point(tick, base)
+                day_points.append(point)
+                points.append(point)
+                tick += step_ms
+
+        events = heapq.merge(self._rate_events(resume_ms),
+                             self._ledger_events(user_id, resume_ms),
+                             key=lambda event: (event[0], event[1]))
+        for time_ms, kind, payload in events:
+            if time_ms > now_ms:
+                break
+            emit_until(time_ms)
+            if kind == 0:
+                state.rates[payload["currency"]] = payload["rate"]
+            else:
+                state.apply_record(payload)
+        emit_until(now_ms)
+        return [point for point in points if to_epoch_ms(point["time"]) >= since_ms]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..infra.database import DatabaseManager
+from ..infra.settings import SettingsLoader
+from .models import User
+from .transfer import Progress, RowCounter
+
+
+def validate_registration(row: Dict[str, Any]) -> Tuple[str, str]:
+    """Имя и пароль по тем же правилам, что у UseCases.register."""
+    username = str(row.get('username') or '').strip()
+    password = row.get('password')
+    if not username:
+        raise ValueError("Имя пользователя не может быть пустым")
+    if not isinstance(password, str) or len(password) < 4:
+        raise ValueError("Пароль должен быть не короче 4 символов")
+    return username, password
+
+def make_user(item: Tuple[int, str, str]) -> Dict[str, Any]:
+    """Запись users.json: соль и хеш пароля считает модель User."""
+    user_id, username, password = item
+    return User(user_id, username, password).to_json()
+
+class BulkRegistrar:
+    """Массовая регистрация пачками.
+
+    Каждая пачка проверяется по индексу имён, получает id из постоянной
+    последовательности одним обращением, хешируется (в пуле процессов,
+    если workers > 1) и фиксируется одной дозаписью в users.json и одной
+    записью журнала с пустыми портфелями.
+    """
+    def __init__(self, batch_size: int = 1000, workers: Optional[int] = None):
+        self.batch_size = batch_size
+        self.workers = workers or SettingsLoader().get('password_hash_workers', None) \
+            or os.cpu_count() or 1
+        self.db = DatabaseManager()
+        self.registered = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self._usernames: Set[str] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _reject(self, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < 20:
+            self.errors.append(message)
+
+    def _validated(self, rows: Iterable[Any]) -> Iterator[Tuple[str, str]]:
+        for line, row in enumerate(rows, 1):
+            try:
+                if isinstance(row, str):
+                    if not row.strip():
+                        continue
+                    row = json.loads(row)
+                username, password = validate_registration(row)
+            except (ValueError, TypeError, AttributeError) as e:
+                self._reject(f"строка {line}: {str(e)}")
+                continue
+            if username in self._usernames:
+                self._reject(f"строка {line}: имя '{username}' повторяется в файле")
+                continue
+            self._usernames.add(username)
+            yield username, password
+
+    def _hash(self, items: List[Tuple[int, str, str]]) -> List[Dict[str, Any]]:
+        if self.workers <= 1 or len(items) < 2 * self.workers:
+            return [make_user(item) for item in items]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        chunksize = max(1, len(items) // self.workers)
+        return list(self._pool.map(make_user, items, chunksize=chunksize))
+
+    def _commit(self, batch: Tuple[Tuple[str, str], ...]) -> None:
+        taken = self.db.get_users_index().by_username
+        fresh = []
+        for username, password in batch:
+            if username in taken:
+                self._reject(f"имя '{username}' уже занято")
+            else:
+                fresh.append((username, password))
+        if not fresh:
+            return
+        first_id = self.db.allocate_user_ids(len(fresh))
+        users = self._hash([(first_id + i, username, password)
+                            for i, (username, password) in enumerate(fresh)])
+        # Имя могли занять между проверкой и записью: add_users проверит снова.
+        added = self.db.add_users(users)
+        added_ids = {user['user_id'] for user in added}
+        for user in users:
+            if user['user_id'] not in added_ids:
+                self._reject(f"имя '{user['username']}' уже занято")
+        if added:
+            self.db.append_ledger([{'user_id': user['user_id'], 'action': 'OPEN',
+                                    'balances': {}} for user in added],
+                                  snapshot=False)
+        self.registered += len(added)
+
+    def run(self, rows: Iterable[Any], progress: Optional[Progress] = None,
+            progress_every: int = 10000) -> int:
+        """Регистрирует пользователей из строк {'username', 'password'}."""
+        counter = RowCounter(progress, progress_every)
+        try:
+            for batch in batched(self._validated(counter.wrap(rows)), self.batch_size):
+                self._commit(batch)
+        finally:
+            self.db.flush_ledger()
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        counter.finish()
+        return self.registered
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import os
+import time
+import uuid
+from typing import Any, Dict, List
+
+from ..infra.database import DatabaseManager
+from ..infra.locks import FileLock
+
+QUOTES_FILE = 'quotes.json'
+
+class QuoteError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class QuoteBook:
+    """Котировки с фиксированным курсом: действуют ttl секунд и исполняются один раз.
+
+    Хранятся в data/quotes.json, чтобы котировку, выданную одним процессом
+    (например, воркером API), мог исполнить другой.
+    """
+    def __init__(self):
+        self.db = DatabaseManager()
+        self._file_lock = FileLock(os.path.join(self.db._data_dir, 'quotes.lock'))
+        self.ttl = self.db._settings.get('quote_ttl_seconds', 30)
+
+    def _active(self, now: float) -> List[Dict[str, Any]]:
+        return [quote for quote in self.db._read_json(QUOTES_FILE)
+                if quote['expires_at'] > now and not quote.get('used')]
+
+    def create(self, user_id: int, currency: str, side: str, amount: float,
+               rate: float, version: int) -> Dict[str, Any]:
+        now = time.time()
+        quote = {'quote_id': uuid.uuid4().hex[:12], 'user_id': user_id,
+                 'currency': currency, 'side': side, 'amount': amount,
+                 'rate': rate, 'version': version,
+                 'created_at': now, 'expires_at': now + self.ttl}
+        with self._file_lock:
+            quotes = self._active(now)
+            quotes.append(quote)
+            self.db._write_json(QUOTES_FILE, quotes)
+        return quote
+
+    def get(self, quote_id: str, user_id: int, currency: str, side: str,
+            amount: float) -> Dict[str, Any]:
+        """Проверяет, что котировка действует для этой операции."""
+        with self._file_lock:
+            quotes = {quote['quote_id']: quote
+                      for quote in self._active(time.time())}
+        quote = quotes.get(quote_id)
+        if quote is None or quote['user_id'] != user_id:
+            raise QuoteError(f"Котировка '{quote_id}' не найдена, истекла или уже исполнена")#noqa: E501
+        if quote['currency'] != currency or quote['side'] != side:
+            raise QuoteError(f"Котировка '{quote_id}' выдана на {quote['side']} {quote['currency']}")#noqa: E501
+        if amount > quote['amount']:
+            raise QuoteError(f"Сумма превышает котировку: не больше {quote['amount']:.4f} {currency}")#noqa: E501
+        return quote
+
+    def consume(self, quote_id: str) -> bool:
+        """Помечает котировку исполненной; False, если её уже исполнили или она истекла."""#noqa: E501
+        with self._file_lock:
+            quotes = self._active(time.time())
+            for quote in quotes:
+                if quote['quote_id'] == quote_id:
+                    quote['used'] = True
+                    self.db._write_json(QUOTES_FILE, quotes)
+                    return True
+        return False
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import csv
+import heapq
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from prettytable import PrettyTable
+
+from ..infra.database import RateSnapshot
+from ..infra.settings import SettingsLoader
+from .utils import get_rates_snapshot, parse_timestamp
+
+OUTPUT_FORMATS = ('table', 'json', 'csv')
+COLUMNS = ('pair', 'rate', 'updated_at', 'source')
+
+class RatesView:
+    """Индекс курсов одного снимка: по валюте котировки и по исходной валюте.
+
+    Курс к любой базе выводится напрямую, через обратную пару или кросс-курсом
+    через опорную валюту (USD). Строится один раз на версию снимка.
+    """
+    def __init__(self, snapshot: RateSnapshot, pivot: str = 'USD'):
+        self.snapshot = snapshot
+        self.pivot = pivot
+        self.by_quote: Dict[str, Dict[str, Mapping[str, Any]]] = defaultdict(dict)
+        self.by_base: Dict[str, Dict[str, Mapping[str, Any]]] = defaultdict(dict)
+        for key, pair_data in snapshot.pairs.items():
+            from_currency, to_currency = key.split('_', 1)
+            self.by_base[from_currency][to_currency] = pair_data
+            self.by_quote[to_currency][from_currency] = pair_data
+        self.currencies = sorted(set(self.by_base) | set(self.by_quote))
+        self.tables: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+
+    def _leg(self, from_currency: str, to_currency: str
+             ) -> Optional[Tuple[float, Optional[str], str]]:
+        """Прямой или обратный курс: (курс, updated_at, источник)."""
+        direct = self.by_base.get(from_currency, {}).get(to_currency)
+        if direct is not None:
+            return direct['rate'], direct.get('updated_at'), direct.get('source', '')
+        reverse = self.by_quote.get(from_currency, {}).get(to_currency)
+        if reverse is not None and reverse['rate']:
+            return (1 / reverse['rate'], reverse.get('updated_at'),
+                    f"1/{reverse.get('source', '')}")
+        return None
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[Dict[str, Any]]:
+        """Строка курса from→to; None, если его не вывести."""
+        if from_currency == to_currency:
+            return None
+        leg = self._leg(from_currency, to_currency)
+        if leg is None and self.pivot not in (from_currency, to_currency):
+            first = self._leg(from_currency, self.pivot)
+            second = self._leg(self.pivot, to_currency)
+            if first is not None and second is not None:
+                updated = [value for value in (first[1], second[1]) if value]
+                # Кросс-курс не свежее старшей из ног; форматы времени у
+                # провайдеров разные, поэтому сравниваем разобранные значения.
+                oldest = min(updated, key=lambda value: parse_timestamp(value)
+                             or datetime.max) if updated else None
+                leg = (first[0] * second[0], oldest, f"cross:{self.pivot}")
+        if leg is None:
+            return None
+        rate, updated_at, source = leg
+        return {'pair': f"{from_currency}_{to_currency}", 'rate': rate,
+                'updated_at': updated_at, 'source': source}
+
+    def table(self, base: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Курсы всех валют к base (включая кросс-курсы); считаются один раз."""
+        table = self.tables.get(base)
+        if table is None:
+            table = self.tables[base] = {code: self.rate(code, base)
+                                         for code in self.currencies}
+        return table
+
+    def select(self, base: str, currency: Optional[str] = None,
+               top: Optional[int] = None, page: int = 1,
+               per_page: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Курсы к базе base по убыванию; top и страницы — через heapq.nlargest.
+
+        Возвращает строки страницы и общее число строк.
+        """
+        if currency:
+            rows = [self.rate(currency, base)]
+        else:
+            rows = list(self.table(base).values())
+        rows = [row for row in rows if row is not None]
+        total = len(rows) if not top else min(top, len(rows))
+        if per_page:
+            limit = min(page * per_page, total)
+            start = (page - 1) * per_page
+        else:
+            limit, start = total, 0
+        best = heapq.nlargest(limit, rows, key=lambda row: row['rate'])
+        return best[start:limit], total
+
+def render(rows: List[Dict[str, Any]], output_format: str = 'table') -> str:
+    """Форматирует строки курсов как таблицу, JSON или CSV."""
+    if output_format == 'json':
+        return json.dumps(rows, ensure_ascii=False, indent=2)
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().rstrip("\n")
+    table = PrettyTable(["Пара", "Курс", "Обновлено", "Источник"])
+    table.align = "l"
+    for row in rows:
+        table.add_row([row['pair'], f"{row['rate']:.8g}",
+                       (row['updated_at'] or '')[:19], row['source']])
+    return table.get_string()
+
+_view: Optional[RatesView] = None
+
+def get_rates_view() -> RatesView:
+    """Представление текущего снимка курсов (перестраивается при смене снимка)."""
+    global _view
+    snapshot = get_rates_snapshot()
+    view = _view
+    if view is None or view.snapshot is not snapshot:
+        pivot = SettingsLoader().get('default_base_currency', 'USD')
+        view = _view = RatesView(snapshot, pivot)
+    return view
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+import csv
+import json
+import os
+from datetime import datetime
+from itertools import batched
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+from ..infra import codecs
+from ..infra.database import DatabaseManager
+from ..infra.locks import FileLock
+from ..parser_service.config import ParserConfig
+from ..parser_service.history_store import ColumnarHistory, to_epoch_ms
+from ..parser_service.reindex import HistoryReindexer
+from ..parser_service.storage import Storage, append_json_array, iter_json_array
+from .currencies import get_currency
+from .exceptions import CurrencyNotFoundError
+from .models import Wallet
+from .utils import parse_timestamp
+
+DATASETS = {
+    'users': ('user_id', 'username', 'hashed_password', 'salt', 'registration_date'),
+    'portfolios': ('user_id', 'currency', 'balance'),
+    'history': ('id', 'from_currency', 'to_currency', 'rate', 'timestamp', 'source'),
+}
+FORMATS = ('jsonl', 'csv')
+
+Progress = Callable[[int], None]
+
+def detect_format(path: str, explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+class RowCounter:
+    """Считает проходящие через конвейер строки и сообщает о ходе каждые every."""
+    def __init__(self, progress: Optional[Progress] = None, every: int = 100000):
+        self.progress = progress
+        self.every = every
+        self.count = 0
+
+    def wrap(self, rows: Iterable[Any]) -> Iterator[Any]:
+        for row in rows:
+            self.count += 1
+            yield row
+            if self.progress and self.count % self.every == 0:
+                self.progress(self.count)
+
+    def finish(self) -> int:
+        if self.progress and self.count % self.every:
+            self.progress(self.count)
+        return self.count
+
+def _users(db: DatabaseManager) -> Iterator[Dict[str, Any]]:
+    path = os.path.join(db._data_dir, 'users.json')
+    if not codecs.is_json_file(path):
+        # Двоичный формат потоково не читается — загружаем целиком.
+        yield from db._read_json('users.json')
+        return
+    try:
+        yield from iter_json_array(path)
+    except FileNotFoundError:
+        return
+
+def _portfolios(db: DatabaseManager) -> Iterator[Dict[str, Any]]:
+    for portfolio in db.iter_portfolios():
+        for code, wallet in portfolio['wallets'].items():
+            yield {'user_id': portfolio['user_id'], 'currency': code,
+                   'balance': wallet['balance']}
+
+def _history(config: ParserConfig) -> Iterator[Dict[str, Any]]:
+    try:
+        yield from iter_json_array(config.HISTORY_FILE_PATH)
+    except FileNotFoundError:
+        return
+
+def iter_dataset(dataset: str, config: Optional[ParserConfig] = None
+                 ) -> Iterator[Dict[str, Any]]:
+    """Потоково отдаёт записи набора users, portfolios или history."""
+    db = DatabaseManager()
+    if dataset == 'users':
+        return _users(db)
+    if dataset == 'portfolios':
+        return _portfolios(db)
+    return _history(config or ParserConfig())
+
+def write_rows(rows: Iterable[Dict[str, Any]], f: TextIO, output_format: str,
+               columns: Tuple[str, ...]) -> None:
+    if output_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore',
+                                lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+def export_dataset(dataset: str, path: str, output_format: Optional[str] = None,
+                   progress: Optional[Progress] = None,
+                   progress_every: int = 100000) -> int:
+    """Выгружает набор в JSON Lines или CSV, не загружая его в память целиком."""
+    output_format = detect_format(path, output_format)
+    counter = RowCounter(progress, progress_every)
+    with open(f"{path}.tmp", 'w', newline='') as f:
+        write_rows(counter.wrap(iter_dataset(dataset)), f, output_format,
+                   DATASETS[dataset])
+    os.replace(f"{path}.tmp", path)
+    return counter.finish()
+
+def read_rows(f: TextIO, input_format: str) -> Iterator[Any]:
+    """Строки файла: словари для CSV, сырые строки JSON Lines (разбираются при
+    проверке, чтобы одна испорченная строка не прерывала импорт)."""
+    if input_format == 'csv':
+        yield from csv.DictReader(f)
+        return
+    yield from f
+
+def _number(value: Any, field: str) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: ожидается число, получено {value!r}")
+    if number != number or number in (float('inf'), float('-inf')):
+        raise ValueError(f"{field}: ожидается конечное число")
+    return number
+
+def _user_id(value: Any) -> int:
+    number = _number(value, 'user_id')
+    if not number.is_integer():
+        raise ValueError(f"user_id: ожидается целое число, получено {value!r}")
+    return int(number)
+
+def _history_keys(entry: Dict[str, Any]) -> Tuple[Any, Tuple[str, Optional[int]]]:
+    """id записи и (пара, время в мс): по ним импорт отбрасывает повторы."""
+    pair = f"{entry.get('from_currency')}_{entry.get('to_currency')}"
+    return entry.get('id'), (pair, to_epoch_ms(entry.get('timestamp')))
+
+def _currency_code(value: Any) -> str:
+    try:
+        return get_currency(value).code
+    except CurrencyNotFoundError as e:
+        raise ValueError(e.message)
+
+def validate_user(row: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = _user_id(row.get('user_id'))
+    username = (row.get('username') or '').strip()
+    if user_id <= 0 or not username:
+        raise ValueError("user_id должен быть положительным, username — непустым")
+    if not row.get('hashed_password') or not row.get('salt'):
+        raise ValueError("Нет hashed_password или salt")
+    registration_date = row.get('registration_date') or ''
+    datetime.fromisoformat(registration_date)
+    return {'user_id': user_id, 'username': username,
+            'hashed_password': row['hashed_password'], 'salt': row['salt'],
+            'registration_date': registration_date}
+
+def validate_wallet(row: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = _user_id(row.get('user_id'))
+    balance = _number(row.get('balance'), 'balance')
+    if balance < 0:
+        raise ValueError("Баланс не может быть отрицательным")
+    wallet = Wallet(_currency_code(row.get('currency')), balance)
+    return {'user_id': user_id, 'currency': wallet.currency_code,
+            'balance': wallet.balance}
+
+def validate_history(row: Dict[str, Any]) -> Dict[str, Any]:
+    from_currency = _currency_code(row.get('from_currency'))
+    to_currency = _currency_code(row.get('to_currency'))
+    rate = _number(row.get('rate'), 'rate')
+    if rate <= 0:
+        raise ValueError("Курс должен быть положительным")
+    timestamp = row.get('timestamp')
+    if parse_timestamp(timestamp) is None:
+        raise ValueError(f"Некорректная метка времени {timestamp!r}")
+    entry = {'id': row.get('id') or f"{from_currency}_{to_currency}_{timestamp}",
+             'from_currency': from_currency, 'to_currency': to_currency,
+             'rate': rate, 'timestamp': timestamp, 'source': row.get('source') or ''}
+    meta = row.get('meta')
+    if isinstance(meta, dict) and meta:
+        entry['meta'] = meta
+    return entry
+
+class Importer:
+    """Импорт набора пачками: каждая пачка фиксируется одной записью в файл.
+
+    Строки читаются и проверяются по одной; в памяти держится только
+    текущая пачка (и множества занятых имён и id пользователей или ключей
+    истории). Если записи истории пришли не по возрастанию времени, после
+    импорта колоночное хранилище пересобирается целиком.
+    """
+    def __init__(self, dataset: str, batch_size: int = 1000,
+                 config: Optional[ParserConfig] = None):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.config = config or ParserConfig()
+        self.db = DatabaseManager()
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self._user_ids: Optional[Set[int]] = None
+        self._usernames: Set[str] = set()
+        self._history_ids: Optional[Set[Any]] = None
+        self._history_times: Set[Tuple[str, Optional[int]]] = set()
+        self.reindexed = False
+        self._reindex = False
+
+    def _reject(self, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < 20:
+            self.errors.append(message)
+
+    def _load_users(self) -> Set[int]:
+        if self._user_ids is None:
+            self._user_ids = set()
+            for user in _users(self.db):
+                self._user_ids.add(user['user_id'])
+                self._usernames.add(user['username'])
+        return self._user_ids
+
+    def _load_history(self) -> Set[Any]:
+        if self._history_ids is None:
+            self._history_ids = set()
+            for entry in _history(self.config):
+                entry_id, entry_time = _history_keys(entry)
+                self._history_ids.add(entry_id)
+                self._history_times.add(entry_time)
+        return self._history_ids
+
+    def _validated(self, rows: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        validate = {'users': validate_user, 'portfolios': validate_wallet,
+                    'history': validate_history}[self.dataset]
+        for line, row in enumerate(rows, 1):
+            try:
+                if isinstance(row, str):
+                    if not row.strip():
+                        continue
+                    row = json.loads(row)
+                yield validate(row)
+            except (ValueError, TypeError, AttributeError) as e:
+                self._reject(f"строка {line}: {str(e)}")
+
+    def run(self, path: str, input_format: Optional[str] = None,
+            progress: Optional[Progress] = None,
+            progress_every: int = 100000) -> int:
+        input_format = detect_format(path, input_format)
+        commit = {'users': self._commit_users, 'portfolios': self._commit_wallets,
+                  'history': self._commit_history}[self.dataset]
+        counter = RowCounter(progress, progress_every)
+        with open(path, 'r', newline='') as f:
+            rows = counter.wrap(read_rows(f, input_format))
+            for batch in batched(self._validated(rows), self.batch_size):
+                commit(batch)
+        if self.dataset == 'portfolios':
+            self.db.flush_ledger()
+        if self._reindex:
+            HistoryReindexer(self.config).run()
+            self.reindexed = True
+        counter.finish()
+        return self.imported
+
+    def _commit_users(self, batch: Tuple[Dict[str, Any], ...]) -> None:
+        user_ids = self._load_users()
+        fresh = []
+        for user in batch:
+            if user['user_id'] in user_ids or user['username'] in self._usernames:
+                self._reject(f"пользователь {user['username']} "
+                             f"(id={user['user_id']}) уже существует")
+                continue
+            user_ids.add(user['user_id'])
+            self._usernames.add(user['username'])
+            fresh.append(user)
+        if not fresh:
+            return
+        path = os.path.join(self.db._data_dir, 'users.json')
+        with FileLock(os.path.join(self.db._data_dir, 'users.lock')):
+            if codecs.is_json_file(path):
+                append_json_array(path, fresh)
+            else:
+                self.db._write_json('users.json', self.db._read_json('users.json') + fresh)#noqa: E501
+        self.imported += len(fresh)
+
+    def _commit_wallets(self, batch: Tuple[Dict[str, Any], ...]) -> None:
+        user_ids = self._load_users()
+        records: Dict[int, Dict[str, Any]] = {}
+        for wallet in batch:
+            if wallet['user_id'] not in user_ids:
+                self._reject(f"пользователь id={wallet['user_id']} не найден")
+                continue
+            record = records.setdefault(wallet['user_id'], {
+                'user_id': wallet['user_id'], 'action': 'IMPORT', 'balances': {}})
+            record['balances'][wallet['currency']] = wallet['balance']
+        if records:
+            self.db.append_ledger(list(records.values()), snapshot=False)
+        self.imported += sum(len(record['balances']) for record in records.values())
+
+    def _commit_history(self, batch: Tuple[Dict[str, Any], ...]) -> None:
+        storage = Storage(self.config)
+        with storage.history_file_lock(), Storage._history_lock:
+            history_ids = self._load_history()
+            fresh = []
+            for entry in batch:
+                entry_id, entry_time = _history_keys(entry)
+                if entry_id in history_ids or entry_time in self._history_times:
+                    self._reject(f"запись истории {entry_id} уже существует")
+                    continue
+                history_ids.add(entry_id)
+                self._history_times.add(entry_time)
+                fresh.append(entry)
+            if not fresh:
+                return
+            append_json_array(self.config.HISTORY_FILE_PATH, fresh)
+            columnar = ColumnarHistory(self.config)
+            if columnar.exists() and not self._reindex \
+                    and columnar.append(fresh) < len(fresh):
+                # Колонки дописываются только по возрастанию времени.
+                self._reindex = True
+        self.imported += len(fresh)
@@ -1,20 +1,48 @@
 #!/usr/bin/env python3
 from datetime import datetime
-from typing import Optional
-
-from ..decorators import log_action
-from .exceptions import ApiRequestError, CurrencyNotFoundError, InsufficientFundsError
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from ..decorators import log_action, record_executed_rate
+from ..infra.settings import SettingsLoader
+from .alerts import get_alert_engine
+from .audit import AuditIndex
+from .exceptions import (
+    ApiRequestError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+    StaleRateError,
+)
+from .exposure import exposure_report
+from .freshness import fresh_pair
 from .models import Portfolio, User
+from .orders import get_order_book
+from .provisioning import BulkRegistrar
+from .quotes import QuoteBook, QuoteError
 from .utils import (
     get_portfolio_by_user_id,
     get_rates,
+    get_user_by_id,
     get_user_by_username,
+    portfolio_transaction,
     save_portfolio,
-    save_user,
     validate_currency_code,
 )
 
 
+def _execution_rate(user_id: int, currency: str, side: str, amount: float,
+                    quote_id: Optional[str] = None) -> Tuple[Optional[float], int]:
+    """Курс и версия снимка, по которым исполняется операция.
+
+    Курс берётся из одного снимка (или из котировки) и дальше не
+    перечитывается — ни при расчёте, ни при записи в лог.
+    """
+    if quote_id:
+        quote = QuoteBook().get(quote_id, user_id, currency, side, amount)
+        return quote['rate'], quote['version']
+    pair_data, version = fresh_pair(f"{currency}_USD")
+    return (pair_data or {}).get('rate', None), version
+
+
 class UseCases:
     @staticmethod
     @log_action(verbose=True)
@@ -29,14 +57,14 @@ class UseCases:
 
         from ..infra.database import DatabaseManager
         db = DatabaseManager()
-        users = db._read_json('users.json')
-        user_id = max([u['user_id'] for u in users], default=0) + 1
+        user_id = db.allocate_user_ids(1)
 
         user = User(user_id, username, password)
-        save_user(user.to_json())
+        if not db.add_users([user.to_json()]):
+            return f"Имя пользователя '{username}' уже занято"
 
         portfolio = Portfolio(user_id)
-        save_portfolio(portfolio.to_json())
+        save_portfolio(portfolio.to_json(), {'action': 'OPEN'})
 
         return f"Пользователь '{username}' зарегистрирован (id={user_id}). Войдите: login --username {username} --password ****"#noqa: E501
 
@@ -105,8 +133,9 @@ class UseCases:
 
     @staticmethod
     @log_action(verbose=True)
-    def buy(user_id: int, currency: str, amount: float) -> str:
-        """Покупает валюту для пользователя."""
+    def buy(user_id: int, currency: str, amount: float,
+            quote_id: Optional[str] = None) -> str:
+        """Покупает валюту для пользователя (по рынку или по котировке quote_id)."""
         if not isinstance(amount, (int, float)) or amount <= 0:
             return "Сумма должна быть положительным числом."
         try:
@@ -114,51 +143,61 @@ class UseCases:
         except CurrencyNotFoundError as e:
             return f"Ошибка: {e.message}."
 
-        portfolio_data = get_portfolio_by_user_id(user_id)
-        if not portfolio_data:
-            return "Портфель не найден"
-
-        portfolio = Portfolio(user_id)
-        for currency_code, wallet_data in portfolio_data['wallets'].items():
-            portfolio.add_currency(currency_code)
-            wallet = portfolio.get_wallet(currency_code)
-            if wallet:
-                wallet.balance = wallet_data['balance']
-
-        rates = get_rates()
-        rate_key = f"{currency}_USD"
-        rate = rates.get(rate_key, {}).get('rate', None)
+        # Курс берётся до блокировки: его обновление может ждать источник.
+        try:
+            rate, version = _execution_rate(user_id, currency, 'BUY', amount, quote_id)
+        except (QuoteError, StaleRateError) as e:
+            return f"Ошибка: {e.message}."
         if rate is None:
             return f"Не удалось получить курс для {currency}→USD. Повторите позже."
 
-        usd_wallet = portfolio.get_wallet('USD')
-        if not usd_wallet:
-            portfolio.add_currency('USD')
+        with portfolio_transaction():
+            portfolio_data = get_portfolio_by_user_id(user_id)
+            if not portfolio_data:
+                return "Портфель не найден"
+
+            portfolio = Portfolio(user_id)
+            for currency_code, wallet_data in portfolio_data['wallets'].items():
+                portfolio.add_currency(currency_code)
+                wallet = portfolio.get_wallet(currency_code)
+                if wallet:
+                    wallet.balance = wallet_data['balance']
+
             usd_wallet = portfolio.get_wallet('USD')
-        cost = amount * rate
-        try:
-            usd_wallet.withdraw(cost)
-        except InsufficientFundsError as e:
-            return f"Ошибка: {e.message}"
-
-        portfolio.add_currency(currency)
-        wallet = portfolio.get_wallet(currency)
-        if not wallet:
-            return f"Не удалось создать кошелек для валюты '{currency}.'"
-
-        if wallet.deposit(amount):
-            save_portfolio(portfolio.to_json())
-            return (f"Покупка выполнена: {amount:.4f} {currency} по курсу {rate:.2f} USD/{currency}\n"#noqa: E501
-                    f"Изменения в портфеле:\n"
-                    f"- USD: было {usd_wallet.balance + cost:.2f} → стало {usd_wallet.balance:.2f}\n"#noqa: E501
-                    f"- {currency}: было {wallet.balance - amount:.4f} → стало {wallet.balance:.4f}\n"#noqa: E501
-                    f"Оценочная стоимость покупки: {cost:.2f} USD")
-        return "Не удалось выполнить покупку."
+            if not usd_wallet:
+                portfolio.add_currency('USD')
+                usd_wallet = portfolio.get_wallet('USD')
+            cost = amount * rate
+            try:
+                usd_wallet.withdraw(cost)
+            except InsufficientFundsError as e:
+                return f"Ошибка: {e.message}"
+
+            portfolio.add_currency(currency)
+            wallet = portfolio.get_wallet(currency)
+            if not wallet:
+                return f"Не удалось создать кошелек для валюты '{currency}.'"
+
+            if wallet.deposit(amount):
+                if quote_id and not QuoteBook().consume(quote_id):
+                    return f"Ошибка: котировка '{quote_id}' уже исполнена или истекла."
+                record_executed_rate(rate, version)
+                save_portfolio(portfolio.to_json(), {'action': 'BUY',
+                                                     'currency': currency,
+                                                     'amount': amount, 'rate': rate,
+                                                     'base': 'USD'})
+                return (f"Покупка выполнена: {amount:.4f} {currency} по курсу {rate:.2f} USD/{currency}\n"#noqa: E501
+                        f"Изменения в портфеле:\n"
+                        f"- USD: было {usd_wallet.balance + cost:.2f} → стало {usd_wallet.balance:.2f}\n"#noqa: E501
+                        f"- {currency}: было {wallet.balance - amount:.4f} → стало {wallet.balance:.4f}\n"#noqa: E501
+                        f"Оценочная стоимость покупки: {cost:.2f} USD")
+            return "Не удалось выполнить покупку."
 
     @staticmethod
     @log_action(verbose=True)
-    def sell(user_id: int, currency: str, amount: float) -> str:
-        """Продаёт валюту пользователя."""
+    def sell(user_id: int, currency: str, amount: float,
+             quote_id: Optional[str] = None) -> str:
+        """Продаёт валюту пользователя (по рынку или по котировке quote_id)."""
         if not isinstance(amount, (int, float)) or amount <= 0:
             return "Сумма должна быть положительным числом"
         try:
@@ -166,45 +205,85 @@ class UseCases:
         except CurrencyNotFoundError as e:
             return f"Ошибка: {e.message}."
 
-        portfolio_data = get_portfolio_by_user_id(user_id)
-        if not portfolio_data:
-            return "Портфель не найден."
+        # Курс берётся до блокировки: его обновление может ждать источник.
+        try:
+            rate, version = _execution_rate(user_id, currency, 'SELL', amount,
+                                            quote_id)
+        except (QuoteError, StaleRateError) as e:
+            return f"Ошибка: {e.message}."
+        if rate is None:
+            return f"Не удалось получить курс для {currency}→USD. Повторите позже."
 
-        portfolio = Portfolio(user_id)
-        for currency_code, wallet_data in portfolio_data['wallets'].items():
-            portfolio.add_currency(currency_code)
-            wallet = portfolio.get_wallet(currency_code)
-            if wallet:
-                wallet.balance = wallet_data['balance']
+        with portfolio_transaction():
+            portfolio_data = get_portfolio_by_user_id(user_id)
+            if not portfolio_data:
+                return "Портфель не найден."
 
-        wallet = portfolio.get_wallet(currency)
-        if not wallet:
-            return f"У вас нет кошелька '{currency}'. Добавьте валюту: она создаётся автоматически при первой покупке."#noqa: E501
+            portfolio = Portfolio(user_id)
+            for currency_code, wallet_data in portfolio_data['wallets'].items():
+                portfolio.add_currency(currency_code)
+                wallet = portfolio.get_wallet(currency_code)
+                if wallet:
+                    wallet.balance = wallet_data['balance']
 
-        try:
-            wallet.withdraw(amount)
-        except InsufficientFundsError as e:
-            return f"Ошибка: {e.message}"
+            wallet = portfolio.get_wallet(currency)
+            if not wallet:
+                return f"У вас нет кошелька '{currency}'. Добавьте валюту: она создаётся автоматически при первой покупке."#noqa: E501
 
-        rates = get_rates()
-        rate_key = f"{currency}_USD"
-        rate = rates.get(rate_key, {}).get('rate', None)
-        if rate is None:
-            return f"Не удалось получить курс для {currency}→USD. Повторите позже."
+            try:
+                wallet.withdraw(amount)
+            except InsufficientFundsError as e:
+                return f"Ошибка: {e.message}"
 
-        usd_wallet = portfolio.get_wallet('USD')
-        if not usd_wallet:
-            portfolio.add_currency('USD')
             usd_wallet = portfolio.get_wallet('USD')
-        usd_wallet.deposit(amount * rate)
+            if not usd_wallet:
+                portfolio.add_currency('USD')
+                usd_wallet = portfolio.get_wallet('USD')
+            usd_wallet.deposit(amount * rate)
+
+            if quote_id and not QuoteBook().consume(quote_id):
+                return f"Ошибка: котировка '{quote_id}' уже исполнена или истекла."
+            record_executed_rate(rate, version)
+
+            save_portfolio(portfolio.to_json(), {'action': 'SELL', 'currency': currency,
+                                                 'amount': amount, 'rate': rate,
+                                                 'base': 'USD'})
+            revenue = amount * rate
+            return (f"Продажа выполнена: {amount:.4f} {currency} по курсу {rate:.2f} USD/{currency}\n"#noqa: E501
+                    f"Изменения в портфеле:\n"
+                    f"- {currency}: было {wallet.balance + amount:.4f} → стало {wallet.balance:.4f}\n"#noqa: E501
+                    f"- USD: было {usd_wallet.balance - revenue:.4f} → стало {usd_wallet.balance:.2f}\n"#noqa: E501
+                    f"Оценочная выручка: {revenue:.2f} USD")
 
-        save_portfolio(portfolio.to_json())
-        revenue = amount * rate
-        return (f"Продажа выполнена: {amount:.4f} {currency} по курсу {rate:.2f} USD/{currency}\n"#noqa: E501
-                f"Изменения в портфеле:\n"
-                f"- {currency}: было {wallet.balance + amount:.4f} → стало {wallet.balance:.4f}\n"#noqa: E501
-                f"- USD: было {usd_wallet.balance - revenue:.4f} → стало {usd_wallet.balance:.2f}\n"#noqa: E501
-                f"Оценочная выручка: {revenue:.2f} USD")
+    @staticmethod
+    @log_action()
+    def quote(user_id: int, currency: str, amount: float, side: str = 'buy') -> str:
+        """Фиксирует курс для покупки или продажи на quote_ttl_seconds секунд."""
+        side = side.upper()
+        if side not in ('BUY', 'SELL'):
+            return "Направление должно быть buy или sell."
+        if not isinstance(amount, (int, float)) or amount <= 0:
+            return "Сумма должна быть положительным числом."
+        try:
+            validate_currency_code(currency)
+        except CurrencyNotFoundError as e:
+            return f"Ошибка: {e.message}."
+        if currency == 'USD':
+            return "Котировка выдаётся на валюту против USD."
+        try:
+            rate, version = _execution_rate(user_id, currency, side, amount)
+        except StaleRateError as e:
+            return f"Ошибка: {e.message}."
+        if rate is None:
+            return f"Не удалось получить курс для {currency}→USD. Повторите позже."
+        book = QuoteBook()
+        quote = book.create(user_id, currency, side, amount, rate, version)
+        command = side.lower()
+        return (f"Котировка {quote['quote_id']}: {command} {amount:.4f} {currency} "
+                f"по курсу {rate:.2f} USD/{currency} (версия курсов {version}), "
+                f"действует {book.ttl} с.\n"
+                f"Исполните: {command} --currency {currency} --amount {amount} "
+                f"--quote-id {quote['quote_id']}")
 
     @staticmethod
     @log_action()
@@ -251,23 +330,195 @@ class UseCases:
         except CurrencyNotFoundError as e:
             return f"Ошибка: {e.message}."
 
-        portfolio_data = get_portfolio_by_user_id(user_id)
-        if not portfolio_data:
+        with portfolio_transaction():
+            portfolio_data = get_portfolio_by_user_id(user_id)
+            if not portfolio_data:
+                return "Портфель не найден"
+
+            portfolio = Portfolio(user_id)
+            for currency_code, wallet_data in portfolio_data['wallets'].items():
+                portfolio.add_currency(currency_code)
+                wallet = portfolio.get_wallet(currency_code)
+                if wallet:
+                    wallet.balance = wallet_data['balance']
+
+            portfolio.add_currency(currency)
+            wallet = portfolio.get_wallet(currency)
+            if not wallet:
+                return f"Не удалось создать кошелек для валюты '{currency}'."
+
+            if wallet.deposit(amount):
+                save_portfolio(portfolio.to_json(), {'action': 'DEPOSIT',
+                                                     'currency': currency,
+                                                     'amount': amount})
+                return f"Пополнение выполнено: {amount:.2f} {currency} добавлено к кошельку."#noqa: E501
+            return "Не удалось выполнить пополнение."
+
+    @staticmethod
+    @log_action()
+    def place_order(user_id: int, currency: str, amount: float, side: str,
+                    order_type: str, price: float) -> str:
+        """Выставляет лимитную или стоп-заявку на покупку/продажу валюты за USD."""
+        if not get_portfolio_by_user_id(user_id):
             return "Портфель не найден"
+        try:
+            order = get_order_book().place(user_id, currency, side, order_type,
+                                           price, amount)
+        except CurrencyNotFoundError as e:
+            return f"Ошибка: {e.message}."
+        except ValueError as e:
+            return f"Ошибка: {str(e)}."
+        condition = "≤" if order['trigger'] == 'below' else "≥"
+        return (f"Заявка #{order['order_id']} выставлена: {order['type']} "
+                f"{order['side']} {amount:.4f} {currency}, исполнится при курсе "
+                f"{currency}→USD {condition} {price:.4f}")
 
-        portfolio = Portfolio(user_id)
-        for currency_code, wallet_data in portfolio_data['wallets'].items():
-            portfolio.add_currency(currency_code)
-            wallet = portfolio.get_wallet(currency_code)
-            if wallet:
-                wallet.balance = wallet_data['balance']
+    @staticmethod
+    def list_orders(user_id: int, include_closed: bool = False) -> str:
+        """Список заявок пользователя."""
+        orders = get_order_book().list_orders(user_id, include_closed)
+        if not orders:
+            return "Заявок нет."
+        result = ["Заявки:"]
+        for order in orders:
+            condition = "≤" if order['trigger'] == 'below' else "≥"
+            line = (f"- #{order['order_id']} {order['type']} {order['side']} "
+                    f"{order['amount']:.4f} {order['currency']} при курсе "
+                    f"{condition} {order['price']:.4f} [{order['status']}]")
+            if order.get('result'):
+                line += f": {order['result']}"
+            result.append(line)
+        return "\n".join(result)
+
+    @staticmethod
+    @log_action()
+    def cancel_order(user_id: int, order_id: int) -> str:
+        """Отменяет открытую заявку пользователя."""
+        if get_order_book().cancel(user_id, order_id) is None:
+            return f"Открытая заявка #{order_id} не найдена."
+        return f"Заявка #{order_id} отменена."
 
-        portfolio.add_currency(currency)
-        wallet = portfolio.get_wallet(currency)
-        if not wallet:
-            return f"Не удалось создать кошелек для валюты '{currency}'."
+    @staticmethod
+    @log_action()
+    def add_alert(user_id: int, pair: str, direction: str = 'any',
+                  level: Optional[float] = None, pct: Optional[float] = None,
+                  window: str = '1h') -> str:
+        """Подписывает пользователя на пересечение уровня или изменение курса."""
+        pair = pair.upper()
+        try:
+            if '_' not in pair:
+                raise ValueError("Пара задаётся в виде BTC_USD")
+            for code in pair.split('_', 1):
+                validate_currency_code(code)
+            alert = get_alert_engine().add(user_id, pair, direction, level, pct,
+                                           window)
+        except CurrencyNotFoundError as e:
+            return f"Ошибка: {e.message}."
+        except ValueError as e:
+            return f"Ошибка: {str(e)}."
+        return f"Подписка #{alert['alert_id']} создана: {_describe_alert(alert)}"
+
+    @staticmethod
+    def list_alerts(user_id: int, include_closed: bool = False) -> str:
+        """Список подписок пользователя и последние уведомления."""
+        engine = get_alert_engine()
+        alerts = engine.list_alerts(user_id, include_closed)
+        result = ["Подписки:"] if alerts else ["Подписок нет."]
+        for alert in alerts:
+            result.append(f"- #{alert['alert_id']} {_describe_alert(alert)} "
+                          f"[{alert['status']}]")
+        notifications = engine.outbox(user_id)
+        if notifications:
+            result.append("Последние уведомления:")
+            for notification in notifications:
+                result.append(f"- {notification['fired_at'][:19]} "
+                              f"#{notification['alert_id']}: {notification['message']}")#noqa: E501
+        return "\n".join(result)
+
+    @staticmethod
+    @log_action()
+    def remove_alert(user_id: int, alert_id: int) -> str:
+        """Удаляет активную подписку пользователя."""
+        if get_alert_engine().remove(user_id, alert_id) is None:
+            return f"Активная подписка #{alert_id} не найдена."
+        return f"Подписка #{alert_id} удалена."
+
+    @staticmethod
+    @log_action()
+    def exposure(user_id: int, base_currency: str = 'USD') -> str:
+        """Совокупная позиция всех пользователей по валютам (только admin_users)."""
+        user = get_user_by_id(user_id)
+        if user is None or user.username not in SettingsLoader().get('admin_users', []):#noqa: E501
+            return "Команда доступна только администраторам (admin_users в config.json)."#noqa: E501
+        try:
+            validate_currency_code(base_currency)
+        except CurrencyNotFoundError as e:
+            return f"Ошибка: {e.message}."
+        report = exposure_report(base_currency)
+        result = [f"Совокупная позиция ({report['users']} пользователей, "
+                  f"база: {base_currency}):"]
+        for row in report['rows']:
+            value = "нет курса" if row['value'] is None \
+                else f"{row['value']:.2f} {base_currency}"
+            result.append(f"- {row['currency']}: {row['amount']:.8g} "
+                          f"у {row['holders']} польз. → {value}")
+        result.append("-" * 35)
+        result.append(f"ИТОГО: {report['total']:.2f} {base_currency}")
+        if report['missing']:
+            result.append(f"Без учёта (нет курса): {', '.join(report['missing'])}")
+        return "\n".join(result)
+
+    @staticmethod
+    def bulk_register(user_id: int, rows: Iterable[Any], batch_size: int = 1000,
+                      progress: Optional[Callable[[int], None]] = None) -> str:
+        """Массовая регистрация пользователей (только admin_users)."""
+        user = get_user_by_id(user_id)
+        if user is None or user.username not in SettingsLoader().get('admin_users', []):#noqa: E501
+            return "Команда доступна только администраторам (admin_users в config.json)."#noqa: E501
+        if batch_size < 1:
+            return "Размер пачки должен быть положительным."
+        registrar = BulkRegistrar(batch_size)
+        registered = registrar.run(rows, progress)
+        result = [f"Зарегистрировано: {registered}, отклонено: {registrar.rejected}."]
+        result.extend(f"- {error}" for error in registrar.errors)
+        return "\n".join(result)
+
+    @staticmethod
+    def audit_search(user_id: int, username: Optional[str] = None,
+                     action: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, limit: int = 50) -> str:
+        """Поиск по журналу действий (чужие записи — только для admin_users)."""
+        user = get_user_by_id(user_id)
+        if user is None:
+            return "Пользователь не найден"
+        is_admin = user.username in SettingsLoader().get('admin_users', [])
+        username = username or (None if is_admin else user.username)
+        if not is_admin and username != user.username:
+            return "Искать действия других пользователей могут только администраторы."#noqa: E501
+        if limit < 1:
+            return "Лимит должен быть положительным."
+        records, stats = AuditIndex().search(username, action, since, until, limit)
+        result = [f"Найдено записей: {len(records)} (прочитано блоков "
+                  f"{stats['blocks_read']} из {stats['blocks']}, файлов "
+                  f"{stats['files_read']} из {stats['files']})"]
+        for record in records:
+            line = (f"- {record['timestamp'][:19]} {record.get('action')} "
+                    f"{record.get('username')}")
+            # Для остальных действий log_action пишет в эти поля аргументы
+            # вызова (например, пароль при login) — их не показываем.
+            if record.get('action') in ('BUY', 'SELL', 'DEPOSIT'):
+                line += f" {record.get('amount')} {record.get('currency_code')}"
+            if record.get('rate') is not None:
+                line += f" по курсу {record['rate']}"
+            line += f" [{record.get('result')}]"
+            if record.get('error_message'):
+                line += f": {record['error_message']}"
+            result.append(line)
+        return "\n".join(result)
 
-        if wallet.deposit(amount):
-            save_portfolio(portfolio.to_json())
-            return f"Пополнение выполнено: {amount:.2f} {currency} добавлено к кошельку."#noqa: E501
-        return "Не удалось выполнить пополнение."
\ No newline at end of file
+def _describe_alert(alert: dict) -> str:
+    direction = {'up': 'вверх', 'down': 'вниз', 'any': 'в любую сторону'}[alert['direction']]#noqa: E501
+    if alert['kind'] == 'CROSS':
+        return f"{alert['pair']} пересекает {alert['level']:g} {direction}"
+    return (f"{alert['pair']} меняется на {alert['pct']:g}% {direction} "
+            f"за {alert['window_seconds']} с")
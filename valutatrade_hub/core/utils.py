@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Optional
 
 from ..infra.database import DatabaseManager
@@ -35,14 +36,27 @@ def get_portfolio_by_user_id(user_id: int) -> Optional[Dict[str, Any]]:
     db = DatabaseManager()
     return db.get_portfolio_by_user_id(user_id)
 
-def save_portfolio(portfolio_data: Dict[str, Any]) -> None:
+def save_portfolio(portfolio_data: Dict[str, Any],
+                   operation: Optional[Dict[str, Any]] = None) -> None:
     db = DatabaseManager()
-    db.save_portfolio(portfolio_data)
+    db.save_portfolio(portfolio_data, operation)
+
+def portfolio_transaction():
+    db = DatabaseManager()
+    return db.portfolio_transaction()
+
+def get_exposure() -> Dict[str, Any]:
+    db = DatabaseManager()
+    return db.get_exposure()
 
 def get_rates() -> Dict[str, Any]:
     db = DatabaseManager()
     return db.get_rates()
 
+def get_rates_snapshot():
+    db = DatabaseManager()
+    return db.get_rates_snapshot()
+
 def update_rates_cache() -> Dict[str, Any]:
     db = DatabaseManager()
     return db.update_rates_cache()
@@ -56,4 +70,19 @@ def validate_currency_code(code: str) -> str:
         currency = get_currency(code)
         return currency.code
     except CurrencyNotFoundError as e:
-        raise CurrencyNotFoundError(e.message)
\ No newline at end of file
+        raise CurrencyNotFoundError(e.message)
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Разбирает ISO 8601 или RFC 2822 (формат ExchangeRate-API) в наивное UTC-время."""#noqa: E501
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
\ No newline at end of file
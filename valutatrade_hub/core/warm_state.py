@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import logging
+import os
+import sys
+import zlib
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional
+
+from ..infra import codecs
+from ..infra.database import (
+    DatabaseManager,
+    RateSnapshot,
+    UsersIndex,
+    _file_signature,
+)
+from ..infra.settings import SettingsLoader
+from ..parser_service.config import ParserConfig
+from . import rates_view
+from .rates_view import RatesView
+
+logger = logging.getLogger('ParserService')
+
+WARM_STATE_VERSION = 1
+
+def _warm_path() -> str:
+    return os.path.join(SettingsLoader().get('data_dir', 'data'), 'warm_state.bin')
+
+def _checksum(path: str) -> int:
+    checksum = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            checksum = zlib.crc32(chunk, checksum)
+    return checksum
+
+def _fingerprint(path: str) -> Optional[Dict[str, Any]]:
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    return {'signature': signature, 'crc': _checksum(path)}
+
+def _unchanged(path: str, fingerprint: Optional[Dict[str, Any]]) -> bool:
+    """Файл тот же, что при сохранении: совпали размер и время изменения или,
+    если изменилось только время (копирование, touch), — CRC32 содержимого."""
+    signature = _file_signature(path)
+    if signature is None or fingerprint is None:
+        return signature is None and fingerprint is None
+    saved = fingerprint['signature']
+    if signature == saved:
+        return True
+    return signature[1] == saved[1] and _checksum(path) == fingerprint['crc']
+
+def _rates_paths() -> List[str]:
+    config = ParserConfig()
+    return [config.RATES_FILE_PATH, config.RATES_PATCH_FILE_PATH]
+
+def save_warm_state() -> None:
+    """Сохраняет прогретое состояние при штатном завершении.
+
+    В снимок попадают курсы, индекс пользователей и посчитанные таблицы
+    кросс-курсов; портфели сохраняются снимком журнала операций.
+    """
+    db = DatabaseManager()
+    db.flush_ledger()
+    snapshot = db.get_rates_snapshot()
+    users = db.get_users_index()
+    view = rates_view.get_rates_view()
+    state = {
+        'version': WARM_STATE_VERSION,
+        'python': list(sys.version_info[:2]),
+        'saved_at': datetime.now().isoformat(),
+        'rates': {'files': [_fingerprint(path) for path in _rates_paths()],
+                  'version': snapshot.version,
+                  'last_refresh': snapshot.last_refresh,
+                  'pairs': {key: dict(value) for key, value in snapshot.pairs.items()}},#noqa: E501
+        'users': {'file': _fingerprint(os.path.join(db._data_dir, 'users.json')),
+                  'columns': users.columns},
+        'cross': {'pivot': view.pivot, 'tables': view.tables},
+    }
+    # Частный кэш одного интерпретатора: marshal читается быстрее всего.
+    codecs.write_file(_warm_path(), state, codecs.MarshalCodec())
+
+def load_warm_state() -> List[str]:
+    """Восстанавливает части состояния, чьи файлы не изменились после снимка.
+
+    Возвращает названия восстановленных частей; устаревшие части просто
+    пропускаются и будут прочитаны из файлов при первом обращении.
+    """
+    try:
+        state = codecs.read_file(_warm_path())
+    except (FileNotFoundError, ValueError):
+        return []
+    if not isinstance(state, dict) or state.get('version') != WARM_STATE_VERSION \
+            or state.get('python') != list(sys.version_info[:2]):
+        return []
+    db = DatabaseManager()
+    restored = []
+    rates = state['rates']
+    paths = _rates_paths()
+    if all(map(_unchanged, paths, rates['files'])):
+        pairs = {key: MappingProxyType(value) for key, value in rates['pairs'].items()}#noqa: E501
+        snapshot = RateSnapshot(rates['version'], rates['last_refresh'],
+                                MappingProxyType(pairs),
+                                tuple(_file_signature(path) for path in paths))
+        db._rates_snapshot = snapshot
+        restored.append('rates')
+        cross = state['cross']
+        pivot = SettingsLoader().get('default_base_currency', 'USD')
+        if cross['pivot'] == pivot:
+            view = RatesView(snapshot, pivot)
+            view.tables.update(cross['tables'])
+            rates_view._view = view
+            restored.append('cross')
+    users = state['users']
+    users_path = os.path.join(db._data_dir, 'users.json')
+    if _unchanged(users_path, users['file']):
+        db._users_index = UsersIndex.from_columns(_file_signature(users_path),
+                                                  users['columns'])
+        restored.append('users')
+    if restored:
+        logger.info(f"Warm state restored: {', '.join(restored)} "
+                    f"(saved {state['saved_at']})")
+    return restored
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
+from contextvars import ContextVar
 from datetime import datetime
 from functools import wraps
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
-from .core.utils import get_portfolio_by_user_id, get_rates, get_user_by_id
+from .core.utils import get_portfolio_by_user_id, get_user_by_id
 from .logging_config import setup_logging
 
 logger = setup_logging()
 
+_executed_rate: ContextVar[Optional[Tuple[float, int]]] = ContextVar(
+    'executed_rate', default=None)
+
+def record_executed_rate(rate: float, version: int) -> None:
+    """Запоминает курс, по которому выполнена операция, для записи в лог."""
+    _executed_rate.set((rate, version))
+
 def log_action(verbose: bool = False) -> Callable:
     def decorator(func: Callable) -> Callable:
         @wraps(func)
@@ -21,13 +29,13 @@ def log_action(verbose: bool = False) -> Callable:
             amount = kwargs.get('amount', args[2] if len(args) > 2 else None)
             base = kwargs.get('base', 'USD')
             rate = None
+            version = None
+            token = _executed_rate.set(None)
             
             try:
                 result = func(*args, **kwargs)
-                if action in ['BUY', 'SELL']:
-                    rates = get_rates()
-                    rate_key = f"{currency}_{base}"
-                    rate = rates.get(rate_key, {}).get('rate', None)
+                if action in ['BUY', 'SELL'] and _executed_rate.get():
+                    rate, version = _executed_rate.get()
                 
                 log_data = {
                     'timestamp': datetime.now().isoformat(),
@@ -36,6 +44,7 @@ def log_action(verbose: bool = False) -> Callable:
                     'currency_code': currency,
                     'amount': amount,
                     'rate': rate,
+                    'rate_version': version,
                     'base': base,
                     'result': 'OK'
                 }
@@ -61,5 +70,7 @@ def log_action(verbose: bool = False) -> Callable:
                 }
                 logger.error(f"{log_data}")
                 raise
+            finally:
+                _executed_rate.reset(token)
         return wrapper
     return decorator
\ No newline at end of file
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import json
+import logging
+import marshal
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+from .settings import SettingsLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger('ParserService')
+
+MARSHAL_MAGIC = b"\x00VTM"
+MSGPACK_MAGIC = b"\x00VTP"
+
+class CodecUnavailableError(RuntimeError):
+    """Файл записан кодеком, библиотека которого не установлена."""
+
+class Codec(ABC):
+    """Кодек файлов данных: объект ↔ байты."""
+    name = ""
+    binary = False
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        pass
+
+class JsonCodec(Codec):
+    """Стандартный json: с отступами (как раньше) или компактный."""
+    def __init__(self, name: str, indent: Optional[int]):
+        self.name = name
+        self.indent = indent
+        self.separators = None if indent else (",", ":")
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, indent=self.indent,
+                          separators=self.separators).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class OrjsonCodec(Codec):
+    """orjson (если установлен): тот же JSON, но в разы быстрее."""
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+class MarshalCodec(Codec):
+    """Двоичный marshal из стандартной библиотеки.
+
+    Только для собственных файлов данных: формат привязан к версии Python,
+    а разбор непроверенных данных небезопасен.
+    """
+    name = "marshal"
+    binary = True
+
+    def dumps(self, obj: Any) -> bytes:
+        return MARSHAL_MAGIC + marshal.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return marshal.loads(memoryview(data)[len(MARSHAL_MAGIC):])
+
+class MsgpackCodec(Codec):
+    """MessagePack (если установлен msgpack): компактный переносимый формат."""
+    name = "msgpack"
+    binary = True
+
+    def dumps(self, obj: Any) -> bytes:
+        return MSGPACK_MAGIC + msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data[len(MSGPACK_MAGIC):], raw=False,
+                               strict_map_key=False)
+
+_CODECS: Dict[str, Callable[[], Codec]] = {
+    "json": lambda: JsonCodec("json", 2),
+    "compact": lambda: JsonCodec("compact", None),
+    "orjson": OrjsonCodec,
+    "marshal": MarshalCodec,
+    "msgpack": MsgpackCodec,
+}
+_REQUIRES = {"orjson": lambda: orjson, "msgpack": lambda: msgpack}
+_warned = set()
+
+def available_codecs() -> Dict[str, Codec]:
+    """Кодеки, которые можно использовать в этом окружении."""
+    return {name: factory() for name, factory in _CODECS.items()
+            if name not in _REQUIRES or _REQUIRES[name]() is not None}
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Кодек по имени или из настройки data_codec (по умолчанию json).
+
+    Если библиотека выбранного кодека не установлена, используется
+    компактный JSON.
+    """
+    name = (name or SettingsLoader().get('data_codec', 'json')).lower()
+    if name not in _CODECS:
+        raise ValueError(f"Неизвестный кодек '{name}'. Доступны: {', '.join(_CODECS)}")#noqa: E501
+    if name in _REQUIRES and _REQUIRES[name]() is None:
+        if name not in _warned:
+            _warned.add(name)
+            logger.warning(f"Codec {name} is not installed, falling back to compact JSON")#noqa: E501
+        name = "compact"
+    return _CODECS[name]()
+
+def decode(data: bytes) -> Any:
+    """Разбирает содержимое файла, определяя формат по сигнатуре."""
+    if data.startswith(MARSHAL_MAGIC):
+        codec: Codec = MarshalCodec()
+    elif data.startswith(MSGPACK_MAGIC):
+        if msgpack is None:
+            raise CodecUnavailableError("Файл записан в формате msgpack: установите пакет msgpack")#noqa: E501
+        codec = MsgpackCodec()
+    else:
+        codec = OrjsonCodec() if orjson is not None else JsonCodec("json", None)
+    try:
+        return codec.loads(data)
+    except (EOFError, TypeError) as e:
+        raise ValueError(f"Повреждённые данные ({codec.name}): {str(e)}")
+
+def is_json_file(path: str) -> bool:
+    """True, если файл — текстовый JSON (его можно читать и дописывать потоково)."""
+    try:
+        with open(path, 'rb') as f:
+            return not f.read(len(MARSHAL_MAGIC)).startswith(b"\x00")
+    except FileNotFoundError:
+        return True
+
+def read_file(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+def write_file(path: str, obj: Any, codec: Optional[Codec] = None) -> None:
+    """Атомарно записывает объект выбранным кодеком."""
+    data = (codec or get_codec()).dumps(obj)
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(data)
+    os.replace(f"{path}.tmp", path)
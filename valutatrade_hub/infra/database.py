@@ -1,12 +1,93 @@
 #!/usr/bin/env python3
-import json
 import os
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
+from . import codecs
+from .ledger import Ledger
+from .locks import FileLock
 from .settings import SettingsLoader
 
 
+def _file_signature(path: str) -> Optional[tuple]:
+    """Размер и время изменения файла — признак того, что его надо перечитать."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class RateSnapshot(NamedTuple):
+    """Неизменяемый снимок курсов одной версии: читатели не видят полузаписанных данных."""#noqa: E501
+    version: int
+    last_refresh: Optional[str]
+    pairs: Mapping[str, Mapping[str, Any]]
+    signature: Optional[tuple] = None
+
+EMPTY_SNAPSHOT = RateSnapshot(0, None, MappingProxyType({}))
+
+USER_FIELDS = ('user_id', 'username', 'hashed_password', 'salt', 'registration_date')
+
+class UsersIndex(NamedTuple):
+    """Пользователи одной версии users.json по колонкам USER_FIELDS с
+    поиском позиции по id и по имени."""
+    signature: Optional[tuple]
+    columns: Tuple[List[Any], ...]
+    by_id: Dict[int, int]
+    by_username: Dict[str, int]
+    max_id: int = 0
+
+    @classmethod
+    def from_columns(cls, signature: Optional[tuple],
+                     columns: Tuple[List[Any], ...]) -> 'UsersIndex':
+        # При повторах, как и прежний линейный поиск, побеждает первая запись.
+        positions = range(len(columns[0]) - 1, -1, -1)
+        return cls(signature, columns, dict(zip(reversed(columns[0]), positions)),
+                   dict(zip(reversed(columns[1]), positions)),
+                   max(columns[0], default=0))
+
+    @classmethod
+    def build(cls, signature: Optional[tuple],
+              users: List[Dict[str, Any]]) -> 'UsersIndex':
+        return cls.from_columns(signature, tuple([user.get(field) for user in users]
+                                                 for field in USER_FIELDS))
+
+    def extended(self, users: List[Dict[str, Any]],
+                 signature: Optional[tuple]) -> 'UsersIndex':
+        """Индекс с пользователями, дописанными в конец users.json.
+
+        Колонки и словари дополняются на месте (только дозапись: позиции,
+        которые видят читатели прежнего индекса, не меняются), поэтому
+        пачка обходится в O(размера пачки).
+        """
+        for user in users:
+            position = len(self.columns[0])
+            for field, column in zip(USER_FIELDS, self.columns):
+                column.append(user.get(field))
+            self.by_id.setdefault(user['user_id'], position)
+            self.by_username.setdefault(user['username'], position)
+        return self._replace(signature=signature, max_id=max(
+            [self.max_id] + [user['user_id'] for user in users]))
+
+    def row(self, position: Optional[int]) -> Optional[Dict[str, Any]]:
+        if position is None:
+            return None
+        return {field: column[position]
+                for field, column in zip(USER_FIELDS, self.columns)}
+
+EMPTY_USERS = UsersIndex.from_columns(None, tuple([] for _ in USER_FIELDS))
+
 class DatabaseManager:
     """Управляет хранением данных в JSON-файлах."""
     _instance = None
@@ -17,81 +98,176 @@ class DatabaseManager:
             cls._instance._settings = SettingsLoader()
             cls._instance._data_dir = cls._instance._settings.get('data_dir', 'data')
             os.makedirs(cls._instance._data_dir, exist_ok=True)
+            cls._instance._ledger = Ledger(
+                cls._instance._data_dir,
+                cls._instance._settings.get('ledger_snapshot_interval', 100),
+                cls._instance._settings.get('ledger_fsync', False))
+            cls._instance._rates_snapshot = EMPTY_SNAPSHOT
+            cls._instance._users_index = EMPTY_USERS
         return cls._instance
 
     def _read_json(self, filename: str) -> list:
-        """Читает данные из JSON-файла."""
+        """Читает данные из файла (формат определяется автоматически)."""
         file_path = os.path.join(self._data_dir, filename)
         try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            with open(file_path, 'w') as f:
-                json.dump([], f)
+            return codecs.read_file(file_path)
+        except (FileNotFoundError, ValueError):
+            codecs.write_file(file_path, [])
             return []
 
     def _write_json(self, filename: str, data: list) -> None:
-        """Записывает данные в JSON-файл."""
+        """Записывает данные в файл кодеком из настройки data_codec."""
         file_path = os.path.join(self._data_dir, filename)
         try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            codecs.write_file(file_path, data)
         except Exception as e:
             print(f"Предупреждение: Не удалось сохранить данные в {filename}: {str(e)}")
 
+    def get_users_index(self) -> UsersIndex:
+        """Индекс пользователей; users.json перечитывается, только когда изменился."""#noqa: E501
+        path = os.path.join(self._data_dir, 'users.json')
+        index = self._users_index
+        signature = _file_signature(path)
+        if signature is None or signature != index.signature:
+            users = self._read_json('users.json')
+            index = self._users_index = UsersIndex.build(_file_signature(path), users)
+        return index
+
     def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получает данные пользователя по ID."""
-        users = self._read_json('users.json')
-        for user_data in users:
-            if user_data['user_id'] == user_id:
-                return user_data
-        return None
+        index = self.get_users_index()
+        return index.row(index.by_id.get(user_id))
 
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Получает данные пользователя по имени."""
-        users = self._read_json('users.json')
-        for user_data in users:
-            if user_data['username'] == username:
-                return user_data
-        return None
+        index = self.get_users_index()
+        return index.row(index.by_username.get(username))
 
     def save_user(self, user_data: Dict[str, Any]) -> None:
         """Сохраняет данные пользователя."""
-        users = self._read_json('users.json')
-        users.append(user_data)
-        self._write_json('users.json', users)
+        self.add_users([user_data])
+
+    def allocate_user_ids(self, count: int) -> int:
+        """Выделяет count подряд идущих id и возвращает первый.
+
+        Счётчик хранится в data/user_seq.json и не опускается ниже
+        наибольшего id в users.json (например, после импорта), поэтому
+        id не пересчитываются по всем пользователям на каждую регистрацию.
+        """
+        path = os.path.join(self._data_dir, 'user_seq.json')
+        with FileLock(os.path.join(self._data_dir, 'users.lock')):
+            try:
+                next_id = int(codecs.read_file(path)['next'])
+            except (FileNotFoundError, ValueError, KeyError, TypeError):
+                next_id = 1
+            first = max(next_id, self.get_users_index().max_id + 1)
+            codecs.write_file(path, {'next': first + count}, codecs.get_codec('json'))
+        return first
+
+    def add_users(self, users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Дописывает пользователей одной записью в users.json.
+
+        Имена и id проверяются по индексу под блокировкой файла; занятые
+        пропускаются. Возвращает добавленных пользователей.
+        """
+        from ..parser_service.storage import append_json_array
+        path = os.path.join(self._data_dir, 'users.json')
+        with FileLock(os.path.join(self._data_dir, 'users.lock')):
+            index = self.get_users_index()
+            accepted, usernames, user_ids = [], set(), set()
+            for user in users:
+                username, user_id = user['username'], user['user_id']
+                if username in index.by_username or username in usernames \
+                        or user_id in index.by_id or user_id in user_ids:
+                    continue
+                usernames.add(username)
+                user_ids.add(user_id)
+                accepted.append(user)
+            if not accepted:
+                return []
+            if codecs.is_json_file(path):
+                append_json_array(path, accepted)
+            else:
+                self._write_json('users.json', self._read_json('users.json') + accepted)#noqa: E501
+            self._users_index = index.extended(accepted, _file_signature(path))
+        return accepted
 
     def get_portfolio_by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Получает портфель пользователя по ID."""
-        portfolios = self._read_json('portfolios.json')
-        for portfolio in portfolios:
-            if portfolio['user_id'] == user_id:
-                return portfolio
-        return None
+        """Получает портфель пользователя по ID (из журнала операций)."""
+        return self._ledger.get_portfolio(user_id)
+
+    def portfolio_transaction(self) -> ContextManager[None]:
+        """Блокировка журнала на чтение, проверку и запись портфеля: операции
+        из разных процессов и потоков не перезаписывают балансы друг друга."""
+        return self._ledger.transaction()
+
+    def save_portfolio(self, portfolio_data: Dict[str, Any],
+                       operation: Optional[Dict[str, Any]] = None) -> None:
+        """Дописывает в журнал операцию и изменившиеся балансы портфеля."""
+        current = self._ledger.get_portfolio(portfolio_data['user_id'])
+        current_wallets = current['wallets'] if current else {}
+        balances = {code: wallet['balance'] for code, wallet
+                    in portfolio_data['wallets'].items()
+                    if current_wallets.get(code) != wallet}
+        record = {'user_id': portfolio_data['user_id'], 'action': 'SET'}
+        record.update(operation or {})
+        record['balances'] = balances
+        self._ledger.append([record])
+
+    def append_ledger(self, records: List[Dict[str, Any]],
+                      snapshot: bool = True) -> None:
+        """Дописывает пачку операций в журнал одной записью (массовый импорт).
 
-    def save_portfolio(self, portfolio_data: Dict[str, Any]) -> None:
-        """Сохраняет данные портфеля."""
-        portfolios = self._read_json('portfolios.json')
-        for i, portfolio in enumerate(portfolios):
-            if portfolio['user_id'] == portfolio_data['user_id']:
-                portfolios[i] = portfolio_data
-                break
-        else:
-            portfolios.append(portfolio_data)
-        self._write_json('portfolios.json', portfolios)
+        snapshot=False откладывает снимок: массовая операция пишет его один
+        раз в конце через flush_ledger.
+        """
+        self._ledger.append(records, snapshot)
+
+    def flush_ledger(self) -> bool:
+        """Сохраняет снимок журнала, если после последнего были операции."""
+        return self._ledger.flush_snapshot()
+
+    def iter_portfolios(self) -> Iterator[Dict[str, Any]]:
+        """Перебирает портфели всех пользователей."""
+        return self._ledger.iter_portfolios()
+
+    def get_exposure(self) -> Dict[str, Any]:
+        """Суммарные балансы и число держателей по валютам (из журнала)."""
+        return self._ledger.exposure()
+
+    def iter_ledger(self, user_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Потоково читает журнал операций."""
+        return self._ledger.iter_records(user_id)
+
+    def get_rates_snapshot(self) -> RateSnapshot:
+        """Текущий снимок курсов (rates.json и журнал правок).
+
+        Новый снимок строится, только когда файлы изменились, и подменяет
+        прежний одной операцией присваивания: читатели не блокируются и
+        до конца операции работают с тем снимком, который получили.
+        """
+        from ..parser_service.config import ParserConfig
+        from ..parser_service.storage import Storage
+        config = ParserConfig()
+        signature = (_file_signature(config.RATES_FILE_PATH),
+                     _file_signature(config.RATES_PATCH_FILE_PATH))
+        snapshot = self._rates_snapshot
+        if signature != snapshot.signature:
+            data = Storage(config).load_rates()
+            pairs = {key: MappingProxyType(dict(value))
+                     for key, value in data.get("pairs", {}).items()}
+            snapshot = RateSnapshot(data.get("version", 0), data.get("last_refresh"),
+                                    MappingProxyType(pairs), signature)
+            self._rates_snapshot = snapshot
+        return snapshot
 
     def get_rates(self) -> Dict[str, Any]:
-        """Получает курсы валют из кэша."""
-        file_path = os.path.join(self._data_dir, 'rates.json')
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            if not self._is_rate_fresh(data.get('last_refresh')):
-                print("Курс устарел. Примените команду 'update-rates'.")
-            return data.get("pairs", {})
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Файл с курсами валют не найден. римените команду 'update-rates'.")
+        """Получает курсы валют из кэша (копия текущего снимка)."""
+        snapshot = self.get_rates_snapshot()
+        if not snapshot.pairs:
+            print("Файл с курсами валют не найден. Примените команду 'update-rates'.")
             return {}
+        return {key: dict(value) for key, value in snapshot.pairs.items()}
 
     def update_rates_cache(self) -> Dict[str, Any]:
         """Обновляет кэш курсов валют."""
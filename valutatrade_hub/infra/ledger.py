@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import codecs
+from .locks import FileLock
+
+
+class Ledger:
+    """Журнал операций (только дозапись) и выведенное из него состояние портфелей.
+
+    Состояние восстанавливается как последний снимок плюс хвост журнала
+    после него; снимок пишется каждые snapshot_interval записей. Вместе с
+    портфелями поддерживаются агрегаты по валютам (сумма балансов и число
+    держателей): каждая запись меняет их за O(числа изменённых кошельков).
+    """
+    def __init__(self, data_dir: str, snapshot_interval: int = 100,
+                 fsync: bool = False):
+        self.path = os.path.join(data_dir, 'ledger.jsonl')
+        self.snapshot_path = os.path.join(data_dir, 'ledger_snapshot.json')
+        self.legacy_path = os.path.join(data_dir, 'portfolios.json')
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self._file_lock = FileLock(os.path.join(data_dir, 'ledger.lock'))
+        self._lock = threading.RLock()
+        self._file_lock_held = False
+        self._portfolios: Dict[int, Dict[str, float]] = {}
+        self._totals: Dict[str, float] = {}
+        self._holders: Dict[str, int] = {}
+        self._seq = 0
+        self._offset = 0
+        self._snapshot_seq = 0
+        self._loaded = False
+
+    def _load_snapshot(self) -> None:
+        try:
+            snapshot = codecs.read_file(self.snapshot_path)
+            self._portfolios = {int(user_id): wallets for user_id, wallets
+                                in snapshot['portfolios'].items()}
+            self._seq = snapshot['seq']
+            self._offset = snapshot['offset']
+            self._snapshot_seq = self._seq
+            exposure = snapshot.get('exposure')
+            if exposure is None:
+                self._rebuild_exposure()
+            else:
+                self._totals, self._holders = exposure['totals'], exposure['holders']
+        except (FileNotFoundError, ValueError, KeyError):
+            self._portfolios, self._seq, self._offset = {}, 0, 0
+            self._totals, self._holders = {}, {}
+            if not os.path.exists(self.path):
+                self._migrate_legacy()
+                self._rebuild_exposure()
+                if self._portfolios:
+                    self._write_snapshot()
+        self._loaded = True
+
+    def _rebuild_exposure(self) -> None:
+        """Пересчитывает агрегаты по всем портфелям (снимки старого формата)."""
+        self._totals, self._holders = {}, {}
+        for wallets in self._portfolios.values():
+            for code, balance in wallets.items():
+                self._totals[code] = self._totals.get(code, 0.0) + balance
+                if balance > 0:
+                    self._holders[code] = self._holders.get(code, 0) + 1
+
+    def _migrate_legacy(self) -> None:
+        """Переносит портфели из portfolios.json в первый снимок."""
+        try:
+            with open(self.legacy_path, 'r') as f:
+                legacy = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for portfolio in legacy:
+            self._portfolios[portfolio['user_id']] = {
+                code: wallet['balance'] for code, wallet in portfolio['wallets'].items()}#noqa: E501
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        wallets = self._portfolios.setdefault(record['user_id'], {})
+        for code, balance in record.get('balances', {}).items():
+            previous = wallets.get(code, 0.0)
+            self._totals[code] = self._totals.get(code, 0.0) + balance - previous
+            held = (balance > 0) - (previous > 0)
+            if held:
+                self._holders[code] = self._holders.get(code, 0) + held
+            wallets[code] = balance
+        self._seq = record['seq']
+
+    def _catch_up(self) -> None:
+        """Дочитывает записи, добавленные в журнал после последнего чтения."""
+        if not self._loaded:
+            self._load_snapshot()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self._offset:
+            self._load_snapshot()
+            self._offset = min(self._offset, size)
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                if record['seq'] > self._seq:
+                    self._apply(record)
+                self._offset += len(line)
+
+    def _write_snapshot(self) -> None:
+        snapshot = {
+            'seq': self._seq,
+            'offset': self._offset,
+            'created_at': datetime.now().isoformat(),
+            'portfolios': {str(user_id): wallets for user_id, wallets
+                           in self._portfolios.items()},
+            'exposure': {'totals': self._totals, 'holders': self._holders}
+        }
+        codecs.write_file(self.snapshot_path, snapshot)
+        self._snapshot_seq = self._seq
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Держит блокировки журнала (в процессе и между процессами) на всё
+        чтение-проверку-запись операции; вложенные вызовы не блокируются.
+
+        flock не реентерабелен для нового дескриптора, поэтому межпроцессная
+        блокировка берётся только на внешнем уровне.
+        """
+        with self._lock:
+            if self._file_lock_held:
+                yield
+                return
+            with self._file_lock:
+                self._file_lock_held = True
+                try:
+                    yield
+                finally:
+                    self._file_lock_held = False
+
+    def flush_snapshot(self) -> bool:
+        """Пишет снимок, если после последнего есть операции (при выходе),
+        чтобы следующий запуск не применял хвост журнала."""
+        with self.transaction():
+            self._catch_up()
+            if self._seq == self._snapshot_seq:
+                return False
+            self._write_snapshot()
+            return True
+
+    def append(self, records: List[Dict[str, Any]],
+               snapshot: bool = True) -> List[Dict[str, Any]]:
+        """Дописывает операции в журнал и применяет их к состоянию."""
+        with self.transaction():
+            self._catch_up()
+            written = []
+            for record in records:
+                record = {'seq': self._seq + 1,
+                          'timestamp': datetime.utcnow().isoformat() + "Z", **record}
+                self._apply(record)
+                written.append(record)
+            data = "".join(json.dumps(record) + "\n" for record in written).encode()
+            with open(self.path, 'ab') as f:
+                if f.tell() > self._offset:
+                    f.truncate(self._offset)
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._offset += len(data)
+            if snapshot and self._seq // self.snapshot_interval > \
+                    (self._seq - len(records)) // self.snapshot_interval:
+                self._write_snapshot()
+        return written
+
+    def get_portfolio(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает портфель в прежнем формате portfolios.json."""
+        with self._lock:
+            self._catch_up()
+            wallets = self._portfolios.get(user_id)
+            if wallets is None:
+                return None
+            return {'user_id': user_id,
+                    'wallets': {code: {'balance': balance}
+                                for code, balance in wallets.items()}}
+
+    def exposure(self) -> Dict[str, Any]:
+        """Агрегаты по валютам: суммарные балансы, число держателей, пользователи."""
+        with self._lock:
+            self._catch_up()
+            return {'seq': self._seq, 'users': len(self._portfolios),
+                    'totals': dict(self._totals), 'holders': dict(self._holders)}
+
+    def iter_portfolios(self) -> Iterator[Dict[str, Any]]:
+        """Перебирает все портфели."""
+        with self._lock:
+            self._catch_up()
+            user_ids = list(self._portfolios)
+        for user_id in user_ids:
+            yield self.get_portfolio(user_id)
+
+    def iter_records(self, user_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Потоково читает журнал (опционально только записи пользователя)."""
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    record = json.loads(line)
+                    if user_id is None or record['user_id'] == user_id:
+                        yield record
+        except FileNotFoundError:
+            return
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import json
+import os
+import socket
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Межпроцессная блокировка через lock-файл (fcntl.flock; без fcntl — no-op)."""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Берёт блокировку; с blocking=False — False, если она занята
+        (в том числе другим дескриптором этого же процесса)."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a+')
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(self._file.fileno(), flags)
+            except BlockingIOError:
+                self._file.close()
+                self._file = None
+                return False
+        return True
+
+    def release(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class LeaderLease:
+    """Аренда лидерства между процессами: файл с владельцем и сроком истечения.
+
+    Лидер продлевает аренду раньше, чем она истекает; если он завершился
+    или завис, аренду после истечения срока забирает другой процесс.
+    """
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = FileLock(f"{path}.lock")
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def acquire(self) -> bool:
+        """Берёт или продлевает аренду; False, если лидер — другой процесс."""
+        with self._lock:
+            lease = self._read()
+            now = time.time()
+            if lease.get('owner') not in (None, self.owner) \
+                    and lease.get('expires_at', 0) > now:
+                return False
+            with open(f"{self.path}.tmp", 'w') as f:
+                json.dump({'owner': self.owner, 'expires_at': now + self.ttl}, f)
+            os.replace(f"{self.path}.tmp", self.path)
+        return True
+
+    def held(self) -> bool:
+        lease = self._read()
+        return lease.get('owner') == self.owner and lease.get('expires_at', 0) > time.time()#noqa: E501
+
+    def release(self) -> None:
+        with self._lock:
+            if self._read().get('owner') == self.owner:
+                os.remove(self.path)
+
+    def holder(self) -> dict:
+        """Текущий владелец аренды и срок её истечения."""
+        return self._read()
@@ -14,6 +14,10 @@ class SettingsLoader:
             cls._instance._config = {
                 'data_dir': 'data',
                 'rates_ttl_seconds': 300,
+                # ExchangeRate-API обновляет курсы раз в сутки.
+                'source_ttl_seconds': {'exchangerate': 26 * 3600},
+                'stale_refresh_max_wait_seconds': 3,
+                'stale_policy': 'use',
                 'default_base_currency': 'USD',
                 'log_file': 'logs/actions.log'
             }
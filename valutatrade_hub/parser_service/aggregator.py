@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import logging
+from collections import defaultdict
+from datetime import datetime
+from statistics import median
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from ..core.utils import parse_timestamp
+from .config import ParserConfig
+
+logger = logging.getLogger('ParserService')
+
+Quote = Tuple[float, str, Optional[str], str]
+
+def weighted_median(values: List[Tuple[float, float]]) -> float:
+    """Взвешенная медиана по списку пар (значение, вес)."""
+    ordered = sorted(values)
+    half = sum(weight for _, weight in ordered) / 2
+    cumulative = 0.0
+    for value, weight in ordered:
+        cumulative += weight
+        if cumulative >= half:
+            return value
+    return ordered[-1][0]
+
+class RateAggregator:
+    """Сводит котировки нескольких провайдеров в консенсусный курс по каждой паре."""
+    def __init__(self, config: ParserConfig):
+        self.max_deviation = config.AGGREGATION_MAX_DEVIATION
+        self.half_life = config.AGGREGATION_HALF_LIFE_SECONDS
+        self.quorum = config.AGGREGATION_QUORUM
+        self._quotes: Dict[str, List[Quote]] = defaultdict(list)
+
+    def add(self, rates: Dict[str, Dict[str, any]], source: str,
+            provider: str = "") -> None:
+        """Добавляет котировки одного провайдера (provider — имя в реестре)."""
+        for key, rate_data in rates.items():
+            rate = rate_data.get("rate")
+            if not isinstance(rate, (int, float)) or rate <= 0:
+                logger.warning(f"Dropping non-positive quote {key}={rate} from {source}")#noqa: E501
+                continue
+            self._quotes[key].append((float(rate), rate_data.get("source", source),
+                                      rate_data.get("updated_at"), provider))
+
+    def _staleness_weight(self, updated_at: Optional[str], now: datetime) -> float:
+        updated_time = parse_timestamp(updated_at)
+        if updated_time is None:
+            return 0.5
+        age = max((now - updated_time).total_seconds(), 0.0)
+        return max(0.5 ** (age / self.half_life), 1e-6)
+
+    def _split(self, quotes: List[Quote], center: float, now: datetime
+               ) -> Tuple[List[Tuple[float, float, str, Optional[str], str]], List[str]]:#noqa: E501
+        accepted, rejected = [], []
+        for rate, source, updated_at, provider in quotes:
+            if abs(rate - center) / center <= self.max_deviation:
+                weight = self._staleness_weight(updated_at, now)
+                accepted.append((rate, weight, source, updated_at, provider))
+            else:
+                rejected.append(source)
+        return accepted, rejected
+
+    def aggregate(self, now: Optional[datetime] = None,
+                  previous: Optional[Callable[[], Mapping[str, Mapping[str, any]]]] = None#noqa: E501
+                  ) -> Dict[str, Dict[str, any]]:
+        """Возвращает консенсусные курсы; пары без кворума пропускаются.
+
+        Медиана двух котировок — их середина, и при сильном расхождении
+        обе выходят за допуск. Поэтому при менее чем трёх котировках
+        отклонение считается от прежнего курса пары (previous — чтение
+        сохранённых курсов, вызывается только при расхождении), а если и
+        так ни одна не подходит — берётся самая свежая (при равенстве —
+        первого провайдера из rate_providers) с пометкой disputed.
+        """
+        now = now or datetime.utcnow()
+        result = {}
+        stored: Optional[Mapping[str, Mapping[str, any]]] = None
+        for key, quotes in self._quotes.items():
+            center = median(rate for rate, *_ in quotes)
+            accepted, rejected = self._split(quotes, center, now)
+            disputed = False
+            if rejected and len(quotes) < 3:
+                if stored is None:
+                    stored = previous() if previous else {}
+                reference = (stored.get(key) or {}).get("rate")
+                if isinstance(reference, (int, float)) and reference > 0:
+                    accepted, rejected = self._split(quotes, reference, now)
+                if not accepted:
+                    candidates = [(rate, self._staleness_weight(updated_at, now),
+                                   source, updated_at, provider)
+                                  for rate, source, updated_at, provider in quotes]
+                    accepted = [max(candidates, key=lambda quote: quote[1])]
+                    rejected = [quote[2] for quote in candidates
+                                if quote is not accepted[0]]
+                    disputed = True
+                    logger.warning(f"Quotes for {key} disagree "
+                                   f"({', '.join(f'{q[2]}={q[0]}' for q in candidates)}), "#noqa: E501
+                                   f"using the freshest from {accepted[0][2]}")
+            if len(accepted) < self.quorum:
+                logger.warning(f"No quorum for {key}: {len(accepted)} of "
+                               f"{self.quorum} quotes agree, rejected {rejected}")
+                continue
+            sources = sorted({quote[2] for quote in accepted})
+            freshest = max(accepted, key=lambda quote: quote[1])
+            result[key] = {
+                "rate": weighted_median([(rate, weight) for rate, weight, *_ in accepted]),#noqa: E501
+                "updated_at": freshest[3],
+                "source": "+".join(sources),
+                "sources": sources,
+                "providers": sorted({quote[4] for quote in accepted if quote[4]}),
+                "rejected": sorted(set(rejected))
+            }
+            if disputed:
+                result[key]["disputed"] = True
+        self._quotes.clear()
+        return result
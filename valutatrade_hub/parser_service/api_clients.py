@@ -1,87 +1,157 @@
 #!/usr/bin/env python3
+import os
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, Tuple
 
 import requests
 
 from ..core.exceptions import ApiRequestError
+from ..infra import codecs
+from ..infra.settings import SettingsLoader
 from .config import ParserConfig
+from .quota import QuotaManager, retry_after
+from .registry import register_provider
 
 
 class BaseApiClient(ABC):
     """Абстрактный клиент для получения курсов валют."""
+    provider_name: str = ""
+
     @abstractmethod
     def fetch_rates(self) -> Dict[str, Dict[str, any]]:
         pass
 
+    def check_status(self, status: int, headers: Dict[str, str]) -> None:
+        """При 429 приостанавливает запросы к провайдеру во всех процессах."""
+        if status == 429:
+            QuotaManager().block(self.provider_name, retry_after(headers))
+
+@register_provider("coingecko")
 class CoinGeckoClient(BaseApiClient):
     """Клиент для API CoinGecko."""
     def __init__(self, config: ParserConfig):
         self.config = config
         self.config.validate()
 
-    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+    def build_request(self) -> Tuple[str, Dict[str, str]]:
         ids = ",".join(self.config.CRYPTO_ID_MAP.values())
         params = {
             "ids": ids,
             "vs_currencies": self.config.BASE_CURRENCY.lower()
         }
+        return self.config.COINGECKO_URL, params
+
+    def parse_response(self, data: Dict[str, any]) -> Dict[str, Dict[str, any]]:
+        rates = {}
+        current_time = datetime.utcnow().isoformat() + "Z"
+        for code, id_ in self.config.CRYPTO_ID_MAP.items():
+            if id_ in data and self.config.BASE_CURRENCY.lower() in data[id_]:
+                rate = data[id_][self.config.BASE_CURRENCY.lower()]
+                key = f"{code}_{self.config.BASE_CURRENCY}"
+                rates[key] = {
+                    "rate": rate,
+                    "updated_at": current_time,
+                    "source": "CoinGecko"
+                }
+        return rates
+
+    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        url, params = self.build_request()
         try:
             response = requests.get(
-                self.config.COINGECKO_URL,
+                url,
                 params=params,
                 timeout=self.config.REQUEST_TIMEOUT
             )
+            self.check_status(response.status_code, response.headers)
             response.raise_for_status()
-            data = response.json()
-            rates = {}
-            current_time = datetime.utcnow().isoformat() + "Z"
-            for code, id_ in self.config.CRYPTO_ID_MAP.items():
-                if id_ in data and self.config.BASE_CURRENCY.lower() in data[id_]:
-                    rate = data[id_][self.config.BASE_CURRENCY.lower()]
-                    key = f"{code}_{self.config.BASE_CURRENCY}"
-                    rates[key] = {
-                        "rate": rate,
-                        "updated_at": current_time,
-                        "source": "CoinGecko"
-                    }
-            return rates
+            return self.parse_response(response.json())
         except requests.RequestException as e:
             raise ApiRequestError(f"Неудачный запрос CoinGecko: {str(e)}")
 
+@register_provider("exchangerate")
 class ExchangeRateApiClient(BaseApiClient):
     """Клиент для API ExchangeRate."""
     def __init__(self, config: ParserConfig):
         self.config = config
         self.config.validate()
 
-    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+    def build_request(self) -> Tuple[str, Dict[str, str]]:
         url = f"{self.config.EXCHANGERATE_API_URL}/{self.config.EXCHANGERATE_API_KEY}/latest/{self.config.BASE_CURRENCY}"#noqa: E501
+        return url, {}
+
+    def parse_response(self, data: Dict[str, any]) -> Dict[str, Dict[str, any]]:
+        if data.get("result") != "success":
+            raise ApiRequestError(f"Ошибка ExchangeRate-API: {data.get('error-type', 'Unknown')}")#noqa: E501
+        rates = {}
+        current_time = data.get("time_last_update_utc", datetime.utcnow().isoformat() + "Z")#noqa: E501
+        for fiat in self.config.FIAT_CURRENCIES:
+            if fiat in data["conversion_rates"]:
+                rate = data["conversion_rates"][fiat]
+                key = f"{fiat}_{self.config.BASE_CURRENCY}"
+                rates[key] = {
+                    "rate": rate,
+                    "updated_at": current_time,
+                    "source": "ExchangeRate-API"
+                }
+
+                reverse_key = f"{self.config.BASE_CURRENCY}_{fiat}"
+                rates[reverse_key] = {
+                    "rate": 1 / rate if rate != 0 else 0,
+                    "updated_at": current_time,
+                    "source": "ExchangeRate-API"
+                }
+        return rates
+
+    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        url, params = self.build_request()
         try:
             response = requests.get(url, timeout=self.config.REQUEST_TIMEOUT)
+            self.check_status(response.status_code, response.headers)
             response.raise_for_status()
-            data = response.json()
-            if data.get("result") != "success":
-                raise ApiRequestError(f"Ошибка ExchangeRate-API: {data.get('error-type', 'Unknown')}")#noqa: E501
-            rates = {}
-            current_time = data.get("time_last_update_utc", datetime.utcnow().isoformat() + "Z")#noqa: E501
-            for fiat in self.config.FIAT_CURRENCIES:
-                if fiat in data["conversion_rates"]:
-                    rate = data["conversion_rates"][fiat]
-                    key = f"{fiat}_{self.config.BASE_CURRENCY}"
-                    rates[key] = {
-                        "rate": rate,
-                        "updated_at": current_time,
-                        "source": "ExchangeRate-API"
-                    }
-
-                    reverse_key = f"{self.config.BASE_CURRENCY}_{fiat}"
-                    rates[reverse_key] = {
-                        "rate": 1 / rate if rate != 0 else 0,
-                        "updated_at": current_time,
-                        "source": "ExchangeRate-API"
-                    }
-            return rates
+            return self.parse_response(response.json())
         except requests.RequestException as e:
-            raise ApiRequestError(f"Ошибка ExchangeRate-API: {str(e)}")
\ No newline at end of file
+            raise ApiRequestError(f"Ошибка ExchangeRate-API: {str(e)}")
+
+@register_provider("offline")
+class OfflineProviderClient(BaseApiClient):
+    """Курсы из локального файла offline_rates_file (data/offline_rates.json).
+
+    Для изолированных сред и тестов: сеть и ключ API не нужны. Файл —
+    снимок в формате rates.json ({"pairs": {...}}, например скопированный
+    с другой машины) или словарь {"BTC_USD": 59000.0} / {"BTC_USD":
+    {"rate": ..., "updated_at": ...}}; без updated_at временем курса
+    считается время изменения файла.
+    """
+    def __init__(self, config: ParserConfig):
+        self.config = config
+        self.path = SettingsLoader().get('offline_rates_file', 'data/offline_rates.json')#noqa: E501
+
+    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        try:
+            data = codecs.read_file(self.path)
+            modified = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            raise ApiRequestError(f"файл курсов {self.path} не найден")
+        except ValueError as e:
+            raise ApiRequestError(f"файл курсов {self.path} повреждён: {str(e)}")
+        if isinstance(data, dict) and isinstance(data.get("pairs"), dict):
+            data = data["pairs"]
+        if not isinstance(data, dict):
+            raise ApiRequestError(f"файл курсов {self.path}: ожидается словарь пар")
+        file_time = datetime.fromtimestamp(modified, timezone.utc).replace(tzinfo=None)
+        default_time = file_time.isoformat() + "Z"
+        rates = {}
+        for key, value in data.items():
+            entry = value if isinstance(value, dict) else {"rate": value}
+            rate = entry.get("rate")
+            if "_" not in key or isinstance(rate, bool) \
+                    or not isinstance(rate, (int, float)):
+                continue
+            rates[key.upper()] = {
+                "rate": rate,
+                "updated_at": entry.get("updated_at") or default_time,
+                "source": "Offline"
+            }
+        return rates
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from ..core.exceptions import ApiRequestError
+from .api_clients import BaseApiClient
+from .config import ParserConfig
+from .registry import build_clients
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncBaseApiClient(ABC):
+    """Абстрактный асинхронный клиент для получения курсов валют."""
+    provider_name: str = ""
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__.replace("Client", "")
+
+    @abstractmethod
+    async def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+class AsyncApiClient(AsyncBaseApiClient):
+    """Асинхронная обёртка над синхронным клиентом.
+
+    Если установлен aiohttp и клиент умеет build_request/parse_response,
+    запрос выполняется без блокировки цикла событий; иначе fetch_rates
+    уходит в пул потоков.
+    """
+    def __init__(self, client: BaseApiClient,
+                 session: Optional["aiohttp.ClientSession"] = None):
+        self.client = client
+        self.provider_name = client.provider_name
+        self._session = session
+        self._own_session = session is None
+
+    @property
+    def name(self) -> str:
+        return type(self.client).__name__.replace("Client", "")
+
+    def _native(self) -> bool:
+        return aiohttp is not None and hasattr(self.client, "build_request") \
+            and hasattr(self.client, "parse_response")
+
+    async def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        if not self._native():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.client.fetch_rates)
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        url, params = self.client.build_request()
+        timeout = aiohttp.ClientTimeout(total=self.client.config.REQUEST_TIMEOUT)
+        try:
+            async with self._session.get(url, params=params or None,
+                                         timeout=timeout) as response:
+                if hasattr(self.client, "check_status"):
+                    self.client.check_status(response.status, response.headers)
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ApiRequestError(f"Неудачный запрос {self.name}: {str(e)}")
+        except ValueError as e:
+            raise ApiRequestError(f"Некорректный ответ {self.name}: {str(e)}")
+        try:
+            return self.client.parse_response(data)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ApiRequestError(f"Некорректный ответ {self.name}: {e!r}")
+
+    async def close(self) -> None:
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+def build_async_clients(config: ParserConfig,
+                        names: Optional[List[str]] = None) -> List[AsyncApiClient]:
+    """Создаёт асинхронных клиентов для провайдеров из реестра."""
+    return [AsyncApiClient(client) for client in build_clients(config, names)]
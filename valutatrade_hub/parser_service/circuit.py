@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from ..infra.locks import FileLock
+from ..infra.settings import SettingsLoader
+
+logger = logging.getLogger('ParserService')
+
+class CircuitBreaker:
+    """Общие для всех процессов автоматы отключения недоступных провайдеров.
+
+    После circuit_failure_threshold (3) неудачных запросов подряд провайдер
+    не опрашивается circuit_open_seconds (300 с), и цикл обновления не
+    тратит на него тайм-аут. По истечении паузы один процесс получает
+    пробный запрос (остальные ждут следующей паузы): успех сбрасывает
+    счётчик, неудача снова отключает провайдера. Состояние хранится в
+    data/circuit_state.json под межпроцессной блокировкой, как квоты.
+    """
+    def __init__(self, data_dir: Optional[str] = None):
+        settings = SettingsLoader()
+        data_dir = data_dir or settings.get('data_dir', 'data')
+        self.path = os.path.join(data_dir, 'circuit_state.json')
+        self._file_lock = FileLock(os.path.join(data_dir, 'circuit.lock'))
+        self.threshold = settings.get('circuit_failure_threshold', 3)
+        self.open_seconds = settings.get('circuit_open_seconds', 300)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, state: Dict[str, Dict[str, Any]]) -> None:
+        with open(f"{self.path}.tmp", 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def allow(self, provider: str) -> float:
+        """0, если к провайдеру можно обращаться, иначе — секунд до пробы."""
+        now = time.time()
+        with self._file_lock:
+            state = self._load()
+            circuit = state.get(provider)
+            if not circuit or not circuit.get('open_until'):
+                return 0.0
+            if circuit['open_until'] > now:
+                return circuit['open_until'] - now
+            # Полуоткрытое состояние: пробу получает только этот вызов.
+            circuit['open_until'] = now + self.open_seconds
+            self._save(state)
+        logger.info(f"Circuit for {provider} half-open, probing")
+        return 0.0
+
+    def record_success(self, provider: str) -> None:
+        with self._file_lock:
+            state = self._load()
+            if state.pop(provider, None) is None:
+                return
+            self._save(state)
+        logger.info(f"Circuit for {provider} closed")
+
+    def record_failure(self, provider: str, error: str) -> None:
+        with self._file_lock:
+            state = self._load()
+            circuit = state.setdefault(provider, {'failures': 0, 'open_until': 0.0})
+            circuit['failures'] += 1
+            circuit['last_error'] = error
+            opened = circuit['failures'] >= self.threshold
+            if opened:
+                circuit['open_until'] = time.time() + self.open_seconds
+            self._save(state)
+        if opened:
+            logger.warning(f"Circuit for {provider} open for {self.open_seconds:.0f}s "
+                           f"after {circuit['failures']} failures")
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Число неудач подряд, остаток паузы и последняя ошибка по провайдерам."""
+        now = time.time()
+        with self._file_lock:
+            state = self._load()
+        return {provider: {'failures': circuit['failures'],
+                           'open_for': max(circuit.get('open_until', 0.0) - now, 0.0),
+                           'last_error': circuit.get('last_error')}
+                for provider, circuit in state.items()}
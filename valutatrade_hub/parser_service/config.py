@@ -5,8 +5,17 @@ from typing import Dict, Tuple
 
 from dotenv import load_dotenv
 
+from ..core.currencies import get_provider_ids, list_currencies
+
 load_dotenv()
 
+def _fiat_codes() -> Tuple[str, ...]:
+    return tuple(currency.code for currency in list_currencies("fiat")
+                 if currency.code != ParserConfig.BASE_CURRENCY)
+
+def _crypto_codes() -> Tuple[str, ...]:
+    return tuple(currency.code for currency in list_currencies("crypto"))
+
 @dataclass
 class ParserConfig:
     EXCHANGERATE_API_KEY: str = os.getenv("EXCHANGERATE_API_KEY", "KEY")
@@ -15,19 +24,32 @@ class ParserConfig:
     EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6/"
 
     BASE_CURRENCY: str = "USD"
-    FIAT_CURRENCIES: Tuple[str, ...] = ("EUR", "GBP", "RUB")
-    CRYPTO_CURRENCIES: Tuple[str, ...] = ("BTC", "ETH", "SOL")
-    CRYPTO_ID_MAP: Dict[str, str] = field(default_factory=lambda: {
-        "BTC": "bitcoin",
-        "ETH": "ethereum",
-        "SOL": "solana",
-    })
+    FIAT_CURRENCIES: Tuple[str, ...] = field(default_factory=_fiat_codes)
+    CRYPTO_CURRENCIES: Tuple[str, ...] = field(default_factory=_crypto_codes)
+    CRYPTO_ID_MAP: Dict[str, str] = field(
+        default_factory=lambda: get_provider_ids("coingecko"))
 
     RATES_FILE_PATH: str = "data/rates.json"
     HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    RATES_PATCH_FILE_PATH: str = "data/rates.patch.jsonl"
+    RATES_LKG_FILE_PATH: str = "data/rates.lkg.json"
+    HISTORY_COLUMNAR_DIR: str = "data/history_columnar"
+    HISTORY_ROLLUPS_DIR: str = "data/history_rollups"
+
+    RATES_COMPACT_EVERY: int = 100
+    RATE_CHANGE_THRESHOLD: float = 0.0
+    HISTORY_MIN_CHANGE: float = 0.0005
 
     REQUEST_TIMEOUT: int = 10
 
+    AGGREGATION_MAX_DEVIATION: float = 0.05
+    AGGREGATION_HALF_LIFE_SECONDS: float = 300.0
+    AGGREGATION_QUORUM: int = 1
+
+    STREAM_URL: str = os.getenv("PRICE_STREAM_URL", "")
+    STREAM_FLUSH_INTERVAL: float = 1.0
+    STREAM_RECONNECT_DELAY: float = 5.0
+
     def validate(self) -> None:
         if self.EXCHANGERATE_API_KEY == "KEY":
             raise ValueError("EXCHANGERATE_API_KEY не задан в переменных окружения")
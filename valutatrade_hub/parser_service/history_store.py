@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..core.utils import parse_timestamp
+from .config import ParserConfig
+from .storage import Storage, iter_json_array
+
+logger = logging.getLogger('ParserService')
+
+COLUMNS = {"ts": "q", "rate": "d", "src": "H"}
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+def to_epoch_ms(value: str) -> Optional[int]:
+    """Переводит метку времени истории в миллисекунды Unix (UTC)."""
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        return None
+    return (parsed - _EPOCH) // _MILLISECOND
+
+def from_epoch_ms(value: int) -> str:
+    moment = datetime.fromtimestamp(value / 1000, timezone.utc).replace(tzinfo=None)
+    return moment.isoformat() + "Z"
+
+class PairColumns:
+    """Отображённые в память колонки одной пары: ts (int64), rate (float64), src."""
+    def __init__(self, directory: str, pair: str):
+        self._maps: List[mmap.mmap] = []
+        self._views: List[memoryview] = []
+        ts = self._map(directory, pair, "ts")
+        rate = self._map(directory, pair, "rate")
+        src = self._map(directory, pair, "src")
+        # Колонки прерванной дозаписи могут разойтись по длине: лишний хвост
+        # не читается, а ColumnarHistory.append обрежет его при записи.
+        rows = min(len(ts), len(rate), len(src))
+        self.ts, self.rate, self.src = ts[:rows], rate[:rows], src[:rows]
+
+    def _map(self, directory: str, pair: str, column: str):
+        path = os.path.join(directory, f"{pair}.{column}")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return memoryview(array(COLUMNS[column]))
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        view = memoryview(mapped).cast(COLUMNS[column])
+        self._views.append(view)
+        return view
+
+    def window(self, since_ms: Optional[int] = None,
+               until_ms: Optional[int] = None) -> Tuple[int, int]:
+        """Границы строк [start, end) для интервала времени (бинарный поиск)."""
+        start = 0 if since_ms is None else bisect_left(self.ts, since_ms)
+        end = len(self.ts) if until_ms is None else bisect_right(self.ts, until_ms)
+        return start, end
+
+    def close(self) -> None:
+        for view in (self.ts, self.rate, self.src, *self._views):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ColumnarHistory:
+    """Колоночное хранилище истории курсов: по файлу на колонку каждой пары."""
+    def __init__(self, config: ParserConfig):
+        self.config = config
+        self.directory = config.HISTORY_COLUMNAR_DIR
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(self.directory) \
+                and os.path.exists(f"{self.directory}.old"):
+            self._restore_previous()
+
+    def _restore_previous(self) -> None:
+        """Возвращает прежний каталог, если пересборка прервалась между двумя
+        переименованиями подмены (reindex-history).
+
+        Подмена идёт под блокировкой истории; если блокировка занята, подмена
+        ещё выполняется (или её держит этот же процесс), и каталог не трогается.
+        """
+        lock = Storage(self.config).history_file_lock()
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            old_dir = f"{self.directory}.old"
+            if not os.path.exists(self.directory) and os.path.exists(old_dir):
+                os.replace(old_dir, self.directory)
+                logger.warning(f"Restored {self.directory} after an interrupted reindex")#noqa: E501
+        finally:
+            lock.release()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def _load_meta(self) -> Dict[str, any]:
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"pairs": {}, "sources": []}
+
+    def _save_meta(self, meta: Dict[str, any], directory: Optional[str] = None) -> None:#noqa: E501
+        path = os.path.join(directory or self.directory, "meta.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def pairs(self) -> List[str]:
+        return sorted(self._load_meta()["pairs"])
+
+    def sources(self) -> List[str]:
+        return self._load_meta()["sources"]
+
+    def open_pair(self, pair: str) -> PairColumns:
+        """Открывает колонки пары; закрывайте через with."""
+        return PairColumns(self.directory, pair.upper())
+
+    def convert_from_json(self, json_path: Optional[str] = None) -> int:
+        """Строит хранилище из exchange_rates.json, читая его потоково."""
+        json_path = json_path or self.config.HISTORY_FILE_PATH
+        columns: Dict[str, Dict[str, array]] = {}
+        sources: Dict[str, int] = {}
+        rows = 0
+        for entry in iter_json_array(json_path):
+            timestamp = to_epoch_ms(entry.get("timestamp"))
+            if timestamp is None:
+                continue
+            pair = f"{entry['from_currency']}_{entry['to_currency']}"
+            source = sources.setdefault(entry.get("source", ""), len(sources))
+            pair_columns = columns.setdefault(pair, {name: array(code) for
+                                                     name, code in COLUMNS.items()})
+            pair_columns["ts"].append(timestamp)
+            pair_columns["rate"].append(float(entry["rate"]))
+            pair_columns["src"].append(source)
+            rows += 1
+
+        tmp_dir = f"{self.directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        meta = {"pairs": {}, "sources": list(sources)}
+        for pair, pair_columns in columns.items():
+            order = sorted(range(len(pair_columns["ts"])),
+                           key=pair_columns["ts"].__getitem__)
+            deduplicated = [i for n, i in enumerate(order) if n == 0 or
+                            pair_columns["ts"][i] != pair_columns["ts"][order[n - 1]]]
+            for name, values in pair_columns.items():
+                with open(os.path.join(tmp_dir, f"{pair}.{name}"), 'wb') as f:
+                    array(COLUMNS[name], (values[i] for i in deduplicated)).tofile(f)
+            meta["pairs"][pair] = {"rows": len(deduplicated)}
+        self._save_meta(meta, tmp_dir)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp_dir, self.directory)
+        logger.info(f"Converted {rows} history rows into {self.directory}")
+        return rows
+
+    def append(self, entries: Iterable[Dict[str, any]]) -> int:
+        """Дописывает новые записи истории в конец колонок (только по возрастанию времени).
+
+        Записи группируются по парам, и каждая колонка пары дописывается
+        одним блоком за пакет.
+        """#noqa: E501
+        meta = self._load_meta()
+        sources = {name: i for i, name in enumerate(meta["sources"])}
+        batches: Dict[str, Dict[str, array]] = {}
+        last_timestamps: Dict[str, Optional[int]] = {}
+        for entry in entries:
+            timestamp = to_epoch_ms(entry.get("timestamp"))
+            pair = f"{entry['from_currency']}_{entry['to_currency']}"
+            if timestamp is None:
+                continue
+            if pair not in last_timestamps:
+                meta["pairs"].setdefault(pair, {"rows": 0})["rows"] = \
+                    self._repair_pair(pair)
+                last_timestamps[pair] = self._last_timestamp(pair)
+            last = last_timestamps[pair]
+            if last is not None and timestamp <= last:
+                logger.debug(f"Skipping out-of-order history row for {pair}")
+                continue
+            source = sources.setdefault(entry.get("source", ""), len(sources))
+            batch = batches.setdefault(pair, {name: array(code) for
+                                              name, code in COLUMNS.items()})
+            batch["ts"].append(timestamp)
+            batch["rate"].append(float(entry["rate"]))
+            batch["src"].append(source)
+            last_timestamps[pair] = timestamp
+        appended = 0
+        for pair, batch in batches.items():
+            for name, values in batch.items():
+                with open(os.path.join(self.directory, f"{pair}.{name}"), 'ab') as f:
+                    values.tofile(f)
+            meta["pairs"][pair]["rows"] += len(batch["ts"])
+            appended += len(batch["ts"])
+        if last_timestamps:
+            meta["sources"] = list(sources)
+            self._save_meta(meta)
+        return appended
+
+    def _repair_pair(self, pair: str) -> int:
+        """Обрезает колонки пары до самой короткой и возвращает число строк.
+
+        Сбой между дозаписью колонок оставляет у части из них лишний хвост;
+        без обрезки следующие строки сместились бы относительно ts.
+        """
+        sizes = {}
+        for name, code in COLUMNS.items():
+            path = os.path.join(self.directory, f"{pair}.{name}")
+            try:
+                sizes[name] = os.path.getsize(path) // array(code).itemsize
+            except FileNotFoundError:
+                sizes[name] = 0
+        rows = min(sizes.values())
+        for name, code in COLUMNS.items():
+            path = os.path.join(self.directory, f"{pair}.{name}")
+            if os.path.exists(path) and \
+                    os.path.getsize(path) != rows * array(code).itemsize:
+                os.truncate(path, rows * array(code).itemsize)
+                logger.warning(f"Truncated {path} to {rows} rows after an interrupted append")#noqa: E501
+        return rows
+
+    def trim_before(self, since_ms: int) -> int:
+        """Удаляет записи старше since_ms, копируя хвосты колонок потоково."""
+        meta = self._load_meta()
+        removed = 0
+        for pair in meta["pairs"]:
+            with self.open_pair(pair) as columns:
+                start = columns.window(since_ms)[0]
+            if start == 0:
+                continue
+            for name, code in COLUMNS.items():
+                path = os.path.join(self.directory, f"{pair}.{name}")
+                with open(path, 'rb') as f, open(f"{path}.tmp", 'wb') as out:
+                    f.seek(start * array(code).itemsize)
+                    shutil.copyfileobj(f, out)
+                os.replace(f"{path}.tmp", path)
+            meta["pairs"][pair]["rows"] -= start
+            removed += start
+        if removed:
+            self._save_meta(meta)
+        return removed
+
+    def _last_timestamp(self, pair: str) -> Optional[int]:
+        path = os.path.join(self.directory, f"{pair}.ts")
+        try:
+            with open(path, 'rb') as f:
+                if f.seek(0, os.SEEK_END) < 8:
+                    return None
+                f.seek(-8, os.SEEK_END)
+                return array(COLUMNS["ts"], f.read(8))[0]
+        except FileNotFoundError:
+            return None
+
+    def ohlc(self, pair: str, interval_seconds: int, since_ms: Optional[int] = None,
+             until_ms: Optional[int] = None) -> List[Dict[str, any]]:
+        """Свечи OHLC за интервалы заданной длины (first/last — время первой
+        и последней записи свечи)."""
+        bucket_ms = interval_seconds * 1000
+        candles = []
+        with self.open_pair(pair) as columns:
+            start, end = columns.window(since_ms, until_ms)
+            ts, rate = columns.ts, columns.rate
+            current = None
+            for i in range(start, end):
+                bucket = ts[i] - ts[i] % bucket_ms
+                value = rate[i]
+                if current is None or current["bucket"] != bucket:
+                    current = {"bucket": bucket, "open": value, "high": value,
+                               "low": value, "close": value, "count": 0,
+                               "first": ts[i]}
+                    candles.append(current)
+                current["high"] = max(current["high"], value)
+                current["low"] = min(current["low"], value)
+                current["close"] = value
+                current["last"] = ts[i]
+                current["count"] += 1
+        return candles
+
+    def volatility(self, pair: str, since_ms: Optional[int] = None,
+                   until_ms: Optional[int] = None) -> Optional[float]:
+        """Стандартное отклонение логарифмических доходностей."""
+        with self.open_pair(pair) as columns:
+            start, end = columns.window(since_ms, until_ms)
+            rate = columns.rate
+            count, mean, m2 = 0, 0.0, 0.0
+            for i in range(start + 1, end):
+                if rate[i - 1] <= 0 or rate[i] <= 0:
+                    continue
+                value = math.log(rate[i] / rate[i - 1])
+                count += 1
+                delta = value - mean
+                mean += delta / count
+                m2 += delta * (value - mean)
+        if count < 2:
+            return None
+        return math.sqrt(m2 / (count - 1))
+
+    def moving_average(self, pair: str, window: int, since_ms: Optional[int] = None,
+                       until_ms: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Скользящее среднее по окну из window последних точек."""
+        result = []
+        with self.open_pair(pair) as columns:
+            start, end = columns.window(since_ms, until_ms)
+            ts, rate = columns.ts, columns.rate
+            total = 0.0
+            for i in range(start, end):
+                total += rate[i]
+                if i - start >= window:
+                    total -= rate[i - window]
+                if i - start + 1 >= window:
+                    result.append((ts[i], total / window))
+        return result
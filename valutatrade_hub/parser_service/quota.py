@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from ..core.exceptions import ApiRequestError
+from ..infra.locks import FileLock
+from ..infra.settings import SettingsLoader
+
+logger = logging.getLogger('ParserService')
+
+# Бесплатные тарифы: CoinGecko — около 30 запросов в минуту,
+# ExchangeRate-API — 1500 запросов в месяц (≈ 50 в сутки).
+DEFAULT_QUOTAS = {
+    'coingecko': {'capacity': 10, 'per_seconds': 60},
+    'exchangerate': {'capacity': 5, 'refill': 50, 'per_seconds': 86400},
+}
+
+class QuotaManager:
+    """Общие для всех процессов token bucket'ы исходящих запросов к провайдерам.
+
+    Состояние (токены, время пополнения, блокировка после 429) хранится в
+    data/quota_state.json и меняется под межпроцессной блокировкой, поэтому
+    несколько CLI-процессов и API-воркеров расходуют одну квоту. Лимиты
+    задаются настройкой provider_quotas: capacity — размер корзины,
+    refill — сколько токенов добавляется за per_seconds (по умолчанию
+    capacity).
+    """
+    def __init__(self, data_dir: Optional[str] = None):
+        data_dir = data_dir or SettingsLoader().get('data_dir', 'data')
+        self.path = os.path.join(data_dir, 'quota_state.json')
+        self._file_lock = FileLock(os.path.join(data_dir, 'quota.lock'))
+
+    @staticmethod
+    def limits(provider: str) -> Optional[Dict[str, float]]:
+        quotas = dict(DEFAULT_QUOTAS)
+        quotas.update(SettingsLoader().get('provider_quotas', {}))
+        return quotas.get(provider)
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, state: Dict[str, Dict[str, float]]) -> None:
+        with open(f"{self.path}.tmp", 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    @staticmethod
+    def _refill(bucket: Dict[str, float], limits: Dict[str, float],
+                now: float) -> None:
+        capacity = limits['capacity']
+        rate = limits.get('refill', capacity) / limits['per_seconds']
+        elapsed = max(now - bucket.get('updated', now), 0.0)
+        bucket['tokens'] = min(capacity, bucket.get('tokens', capacity) + elapsed * rate)#noqa: E501
+        bucket['updated'] = now
+
+    def acquire(self, provider: str, tokens: float = 1.0) -> float:
+        """Берёт токены из корзины провайдера.
+
+        Возвращает 0, если запрос можно выполнять, иначе — сколько секунд
+        ждать до появления токенов (или до конца блокировки после 429).
+        """
+        limits = self.limits(provider)
+        if not limits:
+            return 0.0
+        now = time.time()
+        with self._file_lock:
+            state = self._load()
+            bucket = state.setdefault(provider, {})
+            blocked_until = bucket.get('blocked_until', 0.0)
+            if blocked_until > now:
+                return blocked_until - now
+            self._refill(bucket, limits, now)
+            if bucket['tokens'] < tokens:
+                rate = limits.get('refill', limits['capacity']) / limits['per_seconds']
+                return (tokens - bucket['tokens']) / rate
+            bucket['tokens'] -= tokens
+            self._save(state)
+        return 0.0
+
+    def block(self, provider: str, retry_after: float) -> None:
+        """Приостанавливает запросы к провайдеру во всех процессах (ответ 429)."""
+        with self._file_lock:
+            state = self._load()
+            bucket = state.setdefault(provider, {})
+            bucket['blocked_until'] = max(bucket.get('blocked_until', 0.0),
+                                          time.time() + retry_after)
+            bucket['tokens'] = 0.0
+            bucket['updated'] = time.time()
+            self._save(state)
+        logger.warning(f"Provider {provider} rate-limited, pausing {retry_after:.0f}s")
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Текущие токены и блокировки по провайдерам (с учётом пополнения)."""
+        now = time.time()
+        with self._file_lock:
+            state = self._load()
+        result = {}
+        for provider, bucket in state.items():
+            limits = self.limits(provider)
+            if limits:
+                self._refill(bucket, limits, now)
+            result[provider] = {'tokens': bucket.get('tokens'),
+                                'blocked_for': max(bucket.get('blocked_until', 0.0) - now, 0.0)}#noqa: E501
+        return result
+
+def take_quota(provider: str, name: str) -> None:
+    """Расходует токен провайдера или бросает ApiRequestError без запроса."""
+    wait = QuotaManager().acquire(provider)
+    if wait > 0:
+        raise ApiRequestError(f"{name}: исчерпана квота запросов, "
+                              f"следующий через {wait:.0f} с")
+
+def retry_after(headers: Any, default: float = 60.0) -> float:
+    """Пауза из заголовка Retry-After (секунды) или default."""
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import importlib
+import logging
+from importlib.metadata import entry_points
+from typing import Callable, Dict, List, Optional
+
+from ..infra.settings import SettingsLoader
+from .config import ParserConfig
+
+logger = logging.getLogger('ParserService')
+
+DEFAULT_PROVIDERS = ("coingecko", "exchangerate")
+# Подключаются только явно: через rate_providers или PRICE_STREAM_URL.
+OPT_IN_PROVIDERS = ("stream", "offline")
+
+_provider_registry: Dict[str, Callable] = {}
+
+def register_provider(name: str) -> Callable:
+    """Декоратор: регистрирует класс или фабрику клиента курсов под именем."""
+    def decorator(factory: Callable) -> Callable:
+        if isinstance(factory, type):
+            factory.provider_name = name.lower()
+        _provider_registry[name.lower()] = factory
+        return factory
+    return decorator
+
+def _load_plugins() -> None:
+    for entry_point in entry_points(group="valutatrade_hub.rate_providers"):
+        if entry_point.name.lower() in _provider_registry:
+            continue
+        try:
+            register_provider(entry_point.name)(entry_point.load())
+        except Exception as e:
+            logger.error(f"Failed to load rate provider plugin {entry_point.name}: {str(e)}")#noqa: E501
+
+def _resolve(name: str) -> Callable:
+    if ":" in name:
+        module_name, attr = name.split(":", 1)
+        factory = getattr(importlib.import_module(module_name), attr)
+        return register_provider(attr)(factory)
+    factory = _provider_registry.get(name.lower())
+    if factory is None:
+        raise ValueError(f"Неизвестный провайдер курсов '{name}'")
+    return factory
+
+def available_providers() -> List[str]:
+    """Возвращает имена всех известных провайдеров."""
+    from . import api_clients, streaming  # noqa: F401
+    _load_plugins()
+    return sorted(_provider_registry)
+
+def build_clients(config: ParserConfig,
+                  names: Optional[List[str]] = None) -> List:
+    """Создаёт клиентов по списку имён (по умолчанию — rate_providers из config.json)."""#noqa: E501
+    plugin_names = [name for name in available_providers()
+                    if name not in DEFAULT_PROVIDERS + OPT_IN_PROVIDERS]
+    if names is None:
+        names = SettingsLoader().get('rate_providers',
+                                     list(DEFAULT_PROVIDERS) + plugin_names)
+        if config.STREAM_URL and "stream" not in names:
+            names = list(names) + ["stream"]
+    return [_resolve(name)(config) for name in names]
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import heapq
+import logging
+import os
+import shutil
+import struct
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..infra.settings import SettingsLoader
+from .config import ParserConfig
+from .history_store import COLUMNS, ColumnarHistory, to_epoch_ms
+from .storage import Storage, iter_json_array
+
+logger = logging.getLogger('ParserService')
+
+# Запись отсортированного прогона: время, порядковый номер строки, курс, источник.
+_RUN_RECORD = struct.Struct('<qqdH')
+_FLUSH_ROWS = 65536
+
+def _write_run(path: str, rows: List[Tuple[int, int, float, int]]) -> str:
+    with open(path, 'wb') as f:
+        for chunk in batched(rows, _FLUSH_ROWS):
+            f.write(b"".join(_RUN_RECORD.pack(*row) for row in chunk))
+    return path
+
+def _read_run(path: str) -> Iterator[Tuple[int, int, float, int]]:
+    with open(path, 'rb') as f:
+        while block := f.read(_RUN_RECORD.size * _FLUSH_ROWS):
+            yield from _RUN_RECORD.iter_unpack(block)
+
+def _parse_spill(lines: Tuple[str, ...], first_seq: int,
+                 ) -> Tuple[List[Tuple[int, int, float, int]], int]:
+    rows, invalid = [], 0
+    for seq, line in enumerate(lines, first_seq):
+        timestamp, rate, source = line.rstrip("\n").split("\t")
+        time_ms = to_epoch_ms(timestamp)
+        if time_ms is None:
+            invalid += 1
+            continue
+        rows.append((time_ms, seq, float(rate), int(source)))
+    rows.sort()
+    return rows, invalid
+
+def sort_partition(task: Tuple[str, str, str, int]) -> Dict[str, Any]:
+    """Сортирует и очищает от дубликатов записи одной пары (выполняется в пуле).
+
+    Строки читаются кусками по chunk_rows; если кусок не один, каждый
+    сортируется в отдельный прогон на диске, а прогоны сливаются через
+    heapq.merge, так что память ограничена размером куска. Из записей с
+    одинаковым временем (тот же id) остаётся первая по файлу, как в
+    convert_from_json.
+    """
+    pair, spill_path, out_dir, chunk_rows = task
+    runs: List[str] = []
+    last: List[Tuple[int, int, float, int]] = []
+    rows = invalid = 0
+    with open(spill_path, 'r') as f:
+        for lines in batched(f, chunk_rows):
+            if last:
+                runs.append(_write_run(f"{spill_path}.run{len(runs)}", last))
+            last, bad = _parse_spill(lines, rows)
+            rows += len(lines)
+            invalid += bad
+    if runs:
+        runs.append(_write_run(f"{spill_path}.run{len(runs)}", last))
+        last = []
+        merged = heapq.merge(*map(_read_run, runs))
+    else:
+        merged = iter(last)
+
+    buffers = {name: array(code) for name, code in COLUMNS.items()}
+    files = {name: open(os.path.join(out_dir, f"{pair}.{name}"), 'wb')
+             for name in COLUMNS}
+    kept, previous = 0, None
+    try:
+        for time_ms, _, rate, source in merged:
+            if time_ms == previous:
+                continue
+            previous = time_ms
+            buffers["ts"].append(time_ms)
+            buffers["rate"].append(rate)
+            buffers["src"].append(source)
+            kept += 1
+            if len(buffers["ts"]) >= _FLUSH_ROWS:
+                for name, values in buffers.items():
+                    values.tofile(files[name])
+                    del values[:]
+        for name, values in buffers.items():
+            values.tofile(files[name])
+    finally:
+        for f in files.values():
+            f.close()
+    return {"pair": pair, "rows": rows, "kept": kept, "invalid": invalid,
+            "runs": len(runs)}
+
+class HistoryReindexer:
+    """Параллельная пересборка колоночного хранилища из exchange_rates.json.
+
+    История читается потоково и раскладывается по парам во временные
+    файлы (в памяти не больше chunk_rows строк), затем пары сортируются
+    и очищаются от дубликатов в пуле процессов (sort_partition). Готовые
+    колонки собираются во временном каталоге и подменяют
+    data/history_columnar целиком; всё время работы история заблокирована
+    для записи, как при сжатии. Если процесс упал между двумя
+    переименованиями подмены, прежний каталог (.old) возвращается на место
+    при следующем запуске или обращении к хранилищу.
+    """
+    def __init__(self, config: Optional[ParserConfig] = None,
+                 workers: Optional[int] = None, chunk_rows: Optional[int] = None):
+        settings = SettingsLoader()
+        self.config = config or ParserConfig()
+        self.columnar = ColumnarHistory(self.config)
+        self.workers = workers or settings.get('history_reindex_workers', None) \
+            or os.cpu_count() or 1
+        self.chunk_rows = chunk_rows or settings.get('history_reindex_chunk_rows', 500000)#noqa: E501
+        self.work_dir = f"{self.columnar.directory}.reindex"
+
+    def _partition(self, spill_dir: str, progress: Optional[Callable[[int], None]],
+                   progress_every: int) -> Tuple[Dict[str, str], List[str], int, int]:
+        spills: Dict[str, str] = {}
+        sources: Dict[str, int] = {}
+        buffers: Dict[str, List[str]] = {}
+        buffered = rows = invalid = 0
+
+        def flush() -> None:
+            for pair, lines in buffers.items():
+                with open(spills[pair], 'a') as f:
+                    f.writelines(lines)
+            buffers.clear()
+
+        for entry in iter_json_array(self.config.HISTORY_FILE_PATH):
+            rows += 1
+            if progress and rows % progress_every == 0:
+                progress(rows)
+            try:
+                pair = f"{entry['from_currency']}_{entry['to_currency']}"
+                timestamp = str(entry["timestamp"])
+                rate = float(entry["rate"])
+            except (KeyError, TypeError, ValueError):
+                invalid += 1
+                continue
+            if "\t" in timestamp or "\n" in timestamp:
+                invalid += 1
+                continue
+            source = sources.setdefault(entry.get("source", ""), len(sources))
+            if pair not in spills:
+                spills[pair] = os.path.join(spill_dir, f"{pair}.tsv")
+            buffers.setdefault(pair, []).append(f"{timestamp}\t{rate!r}\t{source}\n")
+            buffered += 1
+            if buffered >= self.chunk_rows:
+                flush()
+                buffered = 0
+        flush()
+        return spills, list(sources), rows, invalid
+
+    def _sort(self, tasks: List[Tuple[str, str, str, int]]) -> List[Dict[str, Any]]:
+        workers = max(1, min(self.workers, len(tasks)))
+        if workers == 1:
+            return [sort_partition(task) for task in tasks]
+        # Крупные пары первыми, чтобы последняя не досталась одному процессу.
+        tasks = sorted(tasks, key=lambda task: os.path.getsize(task[1]), reverse=True)
+        with ProcessPoolExecutor(workers) as pool:
+            return list(pool.map(sort_partition, tasks))
+
+    def run(self, progress: Optional[Callable[[int], None]] = None,
+            progress_every: int = 100000) -> Dict[str, Any]:
+        """Пересобирает хранилище; возвращает счётчики строк и скорость."""
+        started = time.perf_counter()
+        spill_dir = os.path.join(self.work_dir, "spill")
+        out_dir = os.path.join(self.work_dir, "out")
+        directory = self.columnar.directory
+        old_dir = f"{directory}.old"
+        with Storage(self.config).history_file_lock(), Storage._history_lock:
+            if os.path.exists(old_dir) and not os.path.exists(directory):
+                # Прошлая пересборка прервалась посреди подмены.
+                os.replace(old_dir, directory)
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            os.makedirs(spill_dir)
+            os.makedirs(out_dir)
+            try:
+                spills, sources, rows, invalid = self._partition(
+                    spill_dir, progress, progress_every)
+                partitioned = time.perf_counter()
+                results = self._sort([(pair, path, out_dir, self.chunk_rows)
+                                      for pair, path in spills.items()])
+                pair_rows = {result["pair"]: result["kept"] for result in results}
+                meta = {"pairs": {pair: {"rows": pair_rows[pair]} for pair in spills},
+                        "sources": sources}
+                self.columnar._save_meta(meta, out_dir)
+                shutil.rmtree(old_dir, ignore_errors=True)
+                if os.path.exists(directory):
+                    os.replace(directory, old_dir)
+                os.replace(out_dir, directory)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            finally:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+        finished = time.perf_counter()
+        invalid += sum(result["invalid"] for result in results)
+        kept = sum(pair_rows.values())
+        seconds = finished - started
+        stats = {"rows": rows, "kept": kept, "invalid": invalid,
+                 "duplicates": rows - invalid - kept, "pairs": len(results),
+                 "external_pairs": sum(1 for result in results if result["runs"]),
+                 "workers": max(1, min(self.workers, len(results))),
+                 "partition_seconds": partitioned - started,
+                 "sort_seconds": finished - partitioned, "seconds": seconds,
+                 "rows_per_second": rows / seconds if seconds > 0 else 0.0}
+        logger.info(f"Reindexed {rows} history rows into {len(results)} pairs "
+                    f"({stats['rows_per_second']:.0f} rows/s)")
+        return stats
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+from .config import ParserConfig
+
+
+def load_ticks(file_path: str) -> List[Dict[str, any]]:
+    """Загружает тики из истории exchange_rates.json или файла JSON Lines."""
+    with open(file_path, 'r') as f:
+        if file_path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        history = json.load(f)
+    return [{
+        "pair": f"{entry['from_currency']}_{entry['to_currency']}",
+        "rate": entry["rate"],
+        "ts": entry["timestamp"],
+        "source": entry.get("source", "Replay")
+    } for entry in history]
+
+class ReplayServer(ThreadingHTTPServer):
+    """Локальный SSE-сервер, проигрывающий записанные тики для тестов."""
+    daemon_threads = True
+
+    def __init__(self, ticks: List[Dict[str, any]], host: str = "127.0.0.1",
+                 port: int = 8765, interval: float = 0.1, loop: bool = False):
+        super().__init__((host, port), ReplayHandler)
+        self.ticks = ticks
+        self.interval = interval
+        self.loop = loop
+
+    def iter_ticks(self) -> Iterator[Dict[str, any]]:
+        while True:
+            yield from self.ticks
+            if not self.loop:
+                return
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/stream":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for tick in self.server.iter_ticks():
+                self.wfile.write(f"data: {json.dumps(tick)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay-сервер потока котировок")
+    parser.add_argument('--file', type=str, default=ParserConfig.HISTORY_FILE_PATH)
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+
+    server = ReplayServer(load_ticks(args.file), args.host, args.port,
+                          args.interval, args.loop)
+    print(f"Поток доступен по адресу http://{args.host}:{args.port}/stream")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from threading import Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..infra.settings import SettingsLoader
+from .config import ParserConfig
+from .history_store import ColumnarHistory, to_epoch_ms
+from .storage import Storage, iter_json_array
+
+logger = logging.getLogger('ParserService')
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+RESOLUTIONS = {"1h": HOUR_MS, "1d": DAY_MS}
+
+def merge_candle(target: Dict[str, Any], other: Dict[str, Any]) -> None:
+    """Сливает частичную свечу other в target (тот же интервал)."""
+    if other["first"] < target["first"]:
+        target["open"], target["first"] = other["open"], other["first"]
+    if other["last"] >= target["last"]:
+        target["close"], target["last"] = other["close"], other["last"]
+    target["high"] = max(target["high"], other["high"])
+    target["low"] = min(target["low"], other["low"])
+    target["count"] += other["count"]
+
+def rebucket(candles: List[Dict[str, Any]], interval_ms: int) -> List[Dict[str, Any]]:#noqa: E501
+    """Пересобирает отсортированные свечи в интервалы длины interval_ms."""
+    result: List[Dict[str, Any]] = []
+    for candle in candles:
+        bucket = candle["bucket"] - candle["bucket"] % interval_ms
+        if result and result[-1]["bucket"] == bucket:
+            merge_candle(result[-1], candle)
+        else:
+            result.append(dict(candle, bucket=bucket))
+    return result
+
+class RollupWriter:
+    """Копит свечи OHLC по (разрешение, пара, интервал) и сбрасывает их частями.
+
+    Когда открытых свечей становится больше max_open, все они дописываются
+    в файлы как частичные и память освобождается; при чтении частичные
+    свечи одного интервала сливаются. Так сжатие обрабатывает историю
+    сегмент за сегментом с ограниченной памятью. Каждая свеча помечается
+    границей upto своего сжатия: до фиксации сжатия в meta.json такие
+    свечи не читаются.
+    """
+    def __init__(self, directory: str, max_open: int = 10000,
+                 upto: Optional[int] = None):
+        self.directory = directory
+        self.max_open = max_open
+        self.upto = upto
+        self._open: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        self.written = 0
+
+    def add(self, pair: str, time_ms: int, rate: float) -> None:
+        for resolution, size_ms in RESOLUTIONS.items():
+            bucket = time_ms - time_ms % size_ms
+            candle = self._open.get((resolution, pair, bucket))
+            point = {"bucket": bucket, "open": rate, "high": rate, "low": rate,
+                     "close": rate, "count": 1, "first": time_ms, "last": time_ms,
+                     "upto": self.upto}
+            if candle is None:
+                self._open[(resolution, pair, bucket)] = point
+            else:
+                merge_candle(candle, point)
+        if len(self._open) > self.max_open:
+            self.flush()
+
+    def flush(self) -> None:
+        grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for (resolution, pair, _), candle in sorted(self._open.items()):
+            grouped.setdefault((resolution, pair), []).append(candle)
+        for (resolution, pair), candles in grouped.items():
+            path = os.path.join(self.directory, resolution, f"{pair}.jsonl")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a') as f:
+                for candle in candles:
+                    f.write(json.dumps(candle) + "\n")
+            self.written += len(candles)
+        self._open = {}
+
+class HistoryRollups:
+    """Политика хранения истории: сырые записи за N дней, дальше — свечи OHLC.
+
+    Записи старше history_raw_retention_days сворачиваются в часовые и
+    дневные свечи (data/history_rollups/<1h|1d>/<PAIR>.jsonl); часовые
+    хранятся history_hourly_retention_days, дневные — бессрочно. Границы
+    разрешений записаны в meta.json, по ним запросы выбирают источник.
+
+    Сырые записи старше raw_since_ms, дописанные после сжатия (импорт,
+    запись не по порядку), читаются вместе со свечами и сворачиваются
+    следующим сжатием. Свечи с меткой upto новее зафиксированной границы
+    записаны прерванным сжатием: они не читаются и удаляются при
+    следующем запуске. swap_ms в meta.json есть только между фиксацией
+    свечей и заменой файла истории: записи старше него уже свёрнуты.
+    """
+    def __init__(self, config: Optional[ParserConfig] = None):
+        self.config = config or ParserConfig()
+        self.directory = self.config.HISTORY_ROLLUPS_DIR
+        self.meta_path = os.path.join(self.directory, "meta.json")
+
+    def load_meta(self) -> Dict[str, Optional[int]]:
+        """Границы разрешений: raw_since_ms — начало сырых записей,
+        hourly_since_ms — начало часовых свечей."""
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"raw_since_ms": None, "hourly_since_ms": None}
+
+    @staticmethod
+    def _boundary(meta: Dict[str, Optional[int]]) -> Optional[int]:
+        """Граница зафиксированных свечей (с учётом незавершённой замены файла)."""
+        return meta.get("swap_ms") or meta["raw_since_ms"]
+
+    def _save_meta(self, meta: Dict[str, Optional[int]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.meta_path}.tmp", 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+    def pairs(self, resolution: str) -> List[str]:
+        try:
+            names = os.listdir(os.path.join(self.directory, resolution))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(".jsonl")] for name in names
+                      if name.endswith(".jsonl"))
+
+    def candles(self, pair: str, resolution: str, since_ms: Optional[int] = None,
+                until_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Свечи пары заданного разрешения; частичные свечи сливаются."""
+        merged: Dict[int, Dict[str, Any]] = {}
+        path = os.path.join(self.directory, resolution, f"{pair.upper()}.jsonl")
+        committed = self._boundary(self.load_meta())
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    candle = json.loads(line)
+                    upto = candle.get("upto")
+                    if upto is not None and (committed is None or upto > committed):
+                        continue
+                    bucket = candle["bucket"]
+                    if since_ms is not None \
+                            and bucket + RESOLUTIONS[resolution] <= since_ms:
+                        continue
+                    if until_ms is not None and bucket > until_ms:
+                        continue
+                    if bucket in merged:
+                        merge_candle(merged[bucket], candle)
+                    else:
+                        merged[bucket] = candle
+        except FileNotFoundError:
+            pass
+        return [merged[bucket] for bucket in sorted(merged)]
+
+    def _raw_candles(self, pair: str, interval_ms: int, since_ms: Optional[int],
+                     until_ms: Optional[int]) -> List[Dict[str, Any]]:
+        columnar = ColumnarHistory(self.config)
+        if columnar.exists():
+            return columnar.ohlc(pair, interval_ms // 1000, since_ms, until_ms)
+        points = []
+        from_currency, to_currency = pair.split("_", 1)
+        try:
+            for entry in iter_json_array(self.config.HISTORY_FILE_PATH):
+                if entry.get("from_currency") != from_currency \
+                        or entry.get("to_currency") != to_currency:
+                    continue
+                time_ms = to_epoch_ms(entry.get("timestamp"))
+                if time_ms is None or (since_ms is not None and time_ms < since_ms) \
+                        or (until_ms is not None and time_ms > until_ms):
+                    continue
+                points.append((time_ms, float(entry["rate"])))
+        except FileNotFoundError:
+            return []
+        points.sort()
+        return rebucket([{"bucket": t, "open": r, "high": r, "low": r, "close": r,
+                          "count": 1, "first": t, "last": t} for t, r in points],
+                        interval_ms)
+
+    def _tiers(self, coarse: bool = False) -> List[Tuple[str, Optional[int], int]]:#noqa: E501
+        """Свёрнутые участки истории: (разрешение, начало, конец не включая)."""
+        meta = self.load_meta()
+        raw_since, hourly_since = self._boundary(meta), meta["hourly_since_ms"]
+        if raw_since is None:
+            return []
+        if coarse:
+            return [("1d", None, raw_since)]
+        tiers = [] if hourly_since is None else [("1d", None, hourly_since)]
+        return tiers + [("1h", hourly_since, raw_since)]
+
+    def ohlc(self, pair: str, interval_seconds: int, since_ms: Optional[int] = None,
+             until_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Свечи за период из подходящих разрешений.
+
+        Свёрнутая часть периода читается из часовых свечей (из дневных —
+        если интервал не меньше суток или часовые уже удалены), к ним
+        добавляются сырые записи за весь период, включая ещё не свёрнутые
+        старые. Интервал мельче разрешения источника даёт свечи этого
+        разрешения.
+        """
+        pair = pair.upper()
+        interval_ms = interval_seconds * 1000
+        candles: List[Dict[str, Any]] = []
+        raw_from = since_ms
+        swap_ms = self.load_meta().get("swap_ms")
+        if swap_ms is not None:
+            # Записи до swap_ms уже в свечах, файл истории ещё не заменён.
+            raw_from = swap_ms if raw_from is None else max(raw_from, swap_ms)
+        for resolution, start, end in self._tiers(coarse=interval_ms >= DAY_MS):
+            start = since_ms if start is None or (since_ms is not None
+                                                  and since_ms > start) else start
+            stop = end - 1 if until_ms is None else min(until_ms, end - 1)
+            if start is None or start <= stop:
+                candles += self.candles(pair, resolution, start, stop)
+        if until_ms is None or raw_from is None or raw_from <= until_ms:
+            candles += self._raw_candles(pair, interval_ms, raw_from, until_ms)
+        candles.sort(key=lambda candle: candle["bucket"])
+        return [{key: candle[key] for key in
+                 ("bucket", "open", "high", "low", "close", "count")}
+                for candle in rebucket(candles, interval_ms)]
+
+    def rate_points(self, pair: str, start_ms: int = 0) -> Iterator[Tuple[int, float]]:#noqa: E501
+        """Точки (время, курс закрытия) свёрнутой части истории по возрастанию."""
+        for resolution, start, end in self._tiers():
+            since_ms = max(start_ms, start or 0)
+            if since_ms >= end:
+                continue
+            for candle in self.candles(pair, resolution, since_ms, end - 1):
+                if since_ms <= candle["last"] < end:
+                    yield candle["last"], candle["close"]
+
+    def compact(self, now_ms: Optional[int] = None) -> Dict[str, int]:
+        """Сворачивает устаревшие сырые записи в свечи и удаляет старые часовые.
+
+        exchange_rates.json читается потоково, оставшиеся записи пишутся во
+        временный файл, который затем атомарно заменяет исходный. Свечи
+        фиксируются в meta.json (swap_ms) до замены файла, поэтому после
+        сбоя на любом шаге записи не сворачиваются дважды. Если граница не
+        сдвинулась с прошлого сжатия, файл не читается и в skipped
+        возвращается причина.
+        """
+        settings = SettingsLoader()
+        raw_days = settings.get('history_raw_retention_days', 30)
+        hourly_days = settings.get('history_hourly_retention_days', 365)
+        stats = {"compacted": 0, "kept": 0, "candles": 0, "hourly_dropped": 0,
+                 "skipped": None}
+        if not raw_days:
+            stats["skipped"] = "disabled"
+            return stats
+        if now_ms is None:
+            now_ms = to_epoch_ms(datetime.utcnow().isoformat())
+        raw_since = now_ms - raw_days * DAY_MS
+        raw_since -= raw_since % HOUR_MS
+        hourly_since = None
+        if hourly_days:
+            hourly_since = now_ms - hourly_days * DAY_MS
+            hourly_since -= hourly_since % DAY_MS
+
+        with Storage(self.config).history_file_lock(), Storage._history_lock:
+            meta = self.load_meta()
+            if meta["raw_since_ms"] is not None and meta["raw_since_ms"] >= raw_since:
+                stats["skipped"] = "up_to_date"
+                return stats
+            swap_ms = meta.pop("swap_ms", None)
+            if meta.pop("pending_ms", None) is not None:
+                self._drop_uncommitted(swap_ms or meta["raw_since_ms"])
+            self._save_meta(dict(meta, swap_ms=swap_ms, pending_ms=raw_since))
+            path = self.config.HISTORY_FILE_PATH
+            writer = RollupWriter(self.directory,
+                                  settings.get('history_compaction_max_open', 10000),
+                                  raw_since)
+            tmp_path = f"{path}.compact"
+            try:
+                with open(tmp_path, 'w') as out:
+                    out.write("[")
+                    for entry in iter_json_array(path):
+                        time_ms = to_epoch_ms(entry.get("timestamp"))
+                        if time_ms is not None and time_ms < raw_since:
+                            # Записи до swap_ms уже в свечах: прошлое сжатие
+                            # упало после фиксации, но до замены файла.
+                            if swap_ms is None or time_ms >= swap_ms:
+                                pair = f"{entry['from_currency']}_{entry['to_currency']}"#noqa: E501
+                                writer.add(pair, time_ms, float(entry["rate"]))
+                            stats["compacted"] += 1
+                            continue
+                        out.write(",\n  " if stats["kept"] else "\n  ")
+                        out.write(json.dumps(entry, indent=2).replace("\n", "\n  "))
+                        stats["kept"] += 1
+                    out.write("\n]" if stats["kept"] else "]")
+            except FileNotFoundError:
+                os.remove(tmp_path)
+                self._save_meta(dict(meta, swap_ms=swap_ms))
+                return stats
+            writer.flush()
+            stats["candles"] = writer.written
+            self._save_meta(dict(meta, swap_ms=raw_since))
+            columnar = ColumnarHistory(self.config)
+            if columnar.exists():
+                columnar.trim_before(raw_since)
+            os.replace(tmp_path, path)
+            # Последние курсы пар Storage перечитает из нового файла.
+            Storage._history_size = None
+            self._save_meta({"raw_since_ms": raw_since,
+                             "hourly_since_ms": meta["hourly_since_ms"]})
+            if hourly_since is not None and hourly_since != meta["hourly_since_ms"]:
+                stats["hourly_dropped"] = self._drop_hourly_before(hourly_since)
+                self._save_meta({"raw_since_ms": raw_since,
+                                 "hourly_since_ms": hourly_since})
+        logger.info(f"History compaction: {stats['compacted']} rows rolled up into "
+                    f"{stats['candles']} candles, {stats['kept']} rows kept")
+        return stats
+
+    def _drop_uncommitted(self, committed: Optional[int]) -> None:
+        """Удаляет свечи прерванного сжатия (upto новее зафиксированной границы)."""#noqa: E501
+        for resolution in RESOLUTIONS:
+            for pair in self.pairs(resolution):
+                path = os.path.join(self.directory, resolution, f"{pair}.jsonl")
+                with open(path, 'r') as f, open(f"{path}.tmp", 'w') as out:
+                    for line in f:
+                        upto = json.loads(line).get("upto")
+                        if upto is None or (committed is not None
+                                            and upto <= committed):
+                            out.write(line)
+                os.replace(f"{path}.tmp", path)
+        logger.warning("Dropped candles of an interrupted history compaction")
+
+    def _drop_hourly_before(self, hourly_since: int) -> int:
+        dropped = 0
+        for pair in self.pairs("1h"):
+            path = os.path.join(self.directory, "1h", f"{pair}.jsonl")
+            with open(path, 'r') as f, open(f"{path}.tmp", 'w') as out:
+                for line in f:
+                    if json.loads(line)["bucket"] >= hourly_since:
+                        out.write(line)
+                    else:
+                        dropped += 1
+            os.replace(f"{path}.tmp", path)
+        return dropped
+
+    def start_background(self, should_run: Callable[[], bool] = lambda: True) -> None:#noqa: E501
+        """Запускает периодическое сжатие (history_compaction_interval_seconds).
+
+        should_run — например, проверка, что процесс держит аренду лидера.
+        """
+        interval = SettingsLoader().get('history_compaction_interval_seconds', 3600)
+
+        def run():
+            while True:
+                try:
+                    if should_run():
+                        self.compact()
+                except Exception as e:
+                    logger.error(f"History compaction failed: {str(e)}")
+                time.sleep(interval)
+        Thread(target=run, daemon=True).start()
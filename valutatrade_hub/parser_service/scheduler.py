@@ -1,19 +1,60 @@
 #!/usr/bin/env python3
+import atexit
+import logging
+import os
 import time
+from datetime import datetime
 from threading import Thread
 
+from ..core.utils import get_rates_snapshot, parse_timestamp
+from ..infra.locks import LeaderLease
 from ..infra.settings import SettingsLoader
+from .retention import HistoryRollups
 from .updater import get_updater
 
+logger = logging.getLogger('ParserService')
+
 
 class Scheduler:
+    """Периодическое обновление курсов; опрашивает API только процесс-лидер.
+
+    Лидер держит аренду data/scheduler.lease и продлевает её на каждом
+    цикле. Остальные процессы ничего не запрашивают и читают курсы,
+    записанные лидером в rates.json; если лидер пропал, его аренду по
+    истечении scheduler_lease_seconds забирает один из них.
+    """
     def __init__(self):
         self.updater = get_updater()
-        self.ttl = SettingsLoader().get('rates_ttl_seconds', 300)
+        settings = SettingsLoader()
+        self.ttl = settings.get('rates_ttl_seconds', 300)
+        self.lease = LeaderLease(
+            os.path.join(settings.get('data_dir', 'data'), 'scheduler.lease'),
+            settings.get('scheduler_lease_seconds', 3 * self.ttl))
+
+    def _initial_delay(self) -> float:
+        """Сколько ещё свежи курсы в rates.json: после перезапуска сеть не
+        опрашивается, пока они не устарели."""
+        refreshed = parse_timestamp(get_rates_snapshot().last_refresh)
+        if refreshed is None:
+            return 0.0
+        age = (datetime.utcnow() - refreshed).total_seconds()
+        return min(max(self.ttl - age, 0.0), self.ttl)
 
     def start(self):
+        role = "leader" if self.lease.acquire() else "follower"
+        logger.info(f"Scheduler started as {role} ({self.lease.owner})")
+        delay = self._initial_delay()
+
         def run():
+            if delay:
+                logger.info(f"Cached rates are fresh, first fetch in {delay:.0f}s")
+                time.sleep(delay)
             while True:
-                self.updater.run_update()
+                if self.lease.acquire():
+                    self.updater.run_update()
+                else:
+                    logger.debug(f"Scheduler lease held by {self.lease.holder().get('owner')}, skipping fetch")#noqa: E501
                 time.sleep(self.ttl)
-        Thread(target=run, daemon=True).start()
\ No newline at end of file
+        Thread(target=run, daemon=True).start()
+        atexit.register(self.lease.release)
+        HistoryRollups(self.updater.storage.config).start_background(self.lease.held)
@@ -1,45 +1,259 @@
 #!/usr/bin/env python3
 import json
+import logging
 import os
-from typing import Dict
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from ..core.utils import parse_timestamp
+from ..infra import codecs
+from ..infra.locks import FileLock
+from ..infra.settings import SettingsLoader
 from .config import ParserConfig
 
+logger = logging.getLogger('ParserService')
+
+def append_json_array(file_path: str, entries: List[Dict[str, any]]) -> None:
+    """Дописывает элементы в конец JSON-массива, не перечитывая файл целиком."""
+    chunk = ",\n".join("  " + json.dumps(entry, indent=2).replace("\n", "\n  ")
+                       for entry in entries)
+    try:
+        with open(file_path, 'r+b') as f:
+            position = f.seek(0, os.SEEK_END)
+            tail = b""
+            while position > 0 and not tail.strip():
+                position = f.seek(max(position - 64, 0))
+                tail = f.read(64) + tail
+            stripped = tail.rstrip()
+            if not stripped.endswith(b"]"):
+                raise ValueError(f"{file_path} не является JSON-массивом")
+            before = stripped[:-1].rstrip()
+            is_empty = before.endswith(b"[") or (not before and position == 0)
+            f.seek(position + len(before))
+            f.truncate()
+            f.write(("\n" if is_empty else ",\n").encode() + chunk.encode() + b"\n]")
+    except FileNotFoundError:
+        with open(file_path, 'w') as f:
+            f.write(f"[\n{chunk}\n]")
+
+def iter_json_array(file_path: str, chunk_size: int = 1 << 16) -> Iterator[any]:
+    """Потоково отдаёт элементы JSON-массива, читая файл кусками."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buffer, pos, eof = "", 0, False
+        started = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer) - 1 and not eof:
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if pos >= len(buffer):
+                raise ValueError(f"{file_path}: неожиданный конец JSON-массива")
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{file_path} не является JSON-массивом")
+                started, pos = True, pos + 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buffer)
+            if end >= len(buffer) and not eof:
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield item
+            pos = end
+
+def _same_moment(first: str, second: str) -> bool:
+    """Совпадают ли метки времени с точностью до миллисекунды (колонки
+    истории хранят время в миллисекундах и в формате ISO 8601)."""
+    if first == second:
+        return True
+    first_time, second_time = parse_timestamp(first), parse_timestamp(second)
+    return first_time is not None and second_time is not None \
+        and abs(first_time - second_time) < timedelta(milliseconds=1)
 
 class Storage:
     """Хранит и управляет данными о курсах валют."""
+    _rates_lock = threading.Lock()
+    _history_lock = threading.Lock()
+    _last_history: Dict[str, Tuple[float, str]] = {}
+    _history_size: Optional[int] = None
+
     def __init__(self, config: ParserConfig):
         self.config = config
         os.makedirs('data', exist_ok=True)
 
-    def save_rates(self, rates: Dict[str, Dict[str, any]], last_refresh: str) -> None:
-        """Сохраняет курсы валют в rates.json."""
+    def save_rates(self, rates: Dict[str, Dict[str, any]], last_refresh: str,
+                   version: int = 0) -> None:
+        """Сохраняет полный снимок курсов в rates.json."""
         data = {
             "pairs": rates,
-            "last_refresh": last_refresh
+            "last_refresh": last_refresh,
+            "version": version
         }
-        with open(self.config.RATES_FILE_PATH, 'w') as f:
-            json.dump(data, f, indent=2)
+        codecs.write_file(self.config.RATES_FILE_PATH, data)
+        with open(self.config.RATES_PATCH_FILE_PATH, 'w'):
+            pass
 
-    def save_history(self, rates: Dict[str, Dict[str, any]]) -> None:
-        """Сохраняет историю курсов в exchange_rates.json."""
-        history = self._load_history()
+    @staticmethod
+    def diff_rates(rates: Dict[str, Dict[str, any]], current: Dict[str, Dict[str, any]],
+                   threshold: float = 0.0) -> Tuple[Dict[str, Dict[str, any]],
+                                                    Dict[str, str]]:
+        """Делит пары на изменившиеся и подтверждённые (курс не сдвинулся)."""
+        changed, confirmed = {}, {}
         for key, rate_data in rates.items():
-            timestamp = rate_data["updated_at"]
-            hist_id = f"{key}_{timestamp}"
-            entry = {
-                "id": hist_id,
-                "from_currency": key.split("_")[0],
-                "to_currency": key.split("_")[1],
-                "rate": rate_data["rate"],
-                "timestamp": timestamp,
-                "source": rate_data["source"],
-                "meta": {}
-            }
-            if hist_id not in [e["id"] for e in history]:
-                history.append(entry)
-        with open(self.config.HISTORY_FILE_PATH, 'w') as f:
-            json.dump(history, f, indent=2)
+            old = current.get(key)
+            if old is None or old.get("source") != rate_data.get("source") \
+                    or abs(rate_data["rate"] - old["rate"]) > threshold * abs(old["rate"]):#noqa: E501
+                changed[key] = rate_data
+            elif old.get("updated_at") != rate_data.get("updated_at"):
+                confirmed[key] = rate_data.get("updated_at")
+        return changed, confirmed
+
+    def merge_rates(self, rates: Dict[str, Dict[str, any]],
+                    last_refresh: str) -> Dict[str, Dict[str, any]]:
+        """Записывает только изменившиеся пары в журнал правок rates.patch.jsonl.
+
+        Возвращает изменившиеся пары. Когда журнал дорастает до
+        RATES_COMPACT_EVERY записей, он сворачивается в полный rates.json.
+        """
+        with self._rates_lock:
+            data, patches = self._load_rates_with_patches()
+            changed, confirmed = self.diff_rates(rates, data["pairs"],
+                                                 self.config.RATE_CHANGE_THRESHOLD)
+            version = data["version"] + 1
+            if patches + 1 >= self.config.RATES_COMPACT_EVERY:
+                self.save_rates(self._apply(data, changed, confirmed)["pairs"],
+                                last_refresh, version)
+            else:
+                record = {"version": version, "last_refresh": last_refresh,
+                          "pairs": changed, "confirmed": confirmed}
+                with open(self.config.RATES_PATCH_FILE_PATH, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+                self._apply(data, changed, confirmed)
+            data["version"], data["last_refresh"] = version, last_refresh
+            self._save_last_known_good(data)
+        return changed
+
+    @staticmethod
+    def _apply(data: Dict[str, any], changed: Dict[str, Dict[str, any]],
+               confirmed: Dict[str, str]) -> Dict[str, any]:
+        data["pairs"].update(changed)
+        for key, updated_at in confirmed.items():
+            data["pairs"][key]["updated_at"] = updated_at
+        return data
+
+    def _save_last_known_good(self, data: Dict[str, any]) -> None:
+        """Копия полного снимка курсов на случай потери или порчи rates.json.
+
+        Пишется не чаще раза в rates_lkg_interval_seconds (60 с).
+        """
+        path = self.config.RATES_LKG_FILE_PATH
+        interval = SettingsLoader().get('rates_lkg_interval_seconds', 60)
+        try:
+            if time.time() - os.path.getmtime(path) < interval:
+                return
+        except OSError:
+            pass
+        codecs.write_file(path, data)
+
+    def _load_last_known_good(self) -> Dict[str, any]:
+        try:
+            return codecs.read_file(self.config.RATES_LKG_FILE_PATH)
+        except (FileNotFoundError, ValueError):
+            return {"pairs": {}, "last_refresh": None}
+
+    def save_history(self, rates: Dict[str, Dict[str, any]]) -> int:
+        """Дописывает в exchange_rates.json записи по парам, курс которых заметно сдвинулся."""#noqa: E501
+        with self.history_file_lock(), self._history_lock:
+            self._sync_last_history()
+            entries = []
+            for key, rate_data in rates.items():
+                timestamp = rate_data["updated_at"]
+                last = self._last_history.get(key)
+                if last is not None:
+                    last_rate, last_timestamp = last
+                    min_move = self.config.HISTORY_MIN_CHANGE * abs(last_rate)
+                    if _same_moment(last_timestamp, timestamp) \
+                            or abs(rate_data["rate"] - last_rate) < min_move:
+                        continue
+                entries.append({
+                    "id": f"{key}_{timestamp}",
+                    "from_currency": key.split("_")[0],
+                    "to_currency": key.split("_")[1],
+                    "rate": rate_data["rate"],
+                    "timestamp": timestamp,
+                    "source": rate_data["source"],
+                    "meta": {field: rate_data[field] for field in ("sources", "rejected")#noqa: E501
+                             if rate_data.get(field)}
+                })
+                self._last_history[key] = (rate_data["rate"], timestamp)
+            if entries:
+                try:
+                    append_json_array(self.config.HISTORY_FILE_PATH, entries)
+                except ValueError:
+                    with open(self.config.HISTORY_FILE_PATH, 'w') as f:
+                        json.dump(self._load_history() + entries, f, indent=2)
+                Storage._history_size = os.path.getsize(self.config.HISTORY_FILE_PATH)
+                from .history_store import ColumnarHistory
+                columnar = ColumnarHistory(self.config)
+                if columnar.exists():
+                    columnar.append(entries)
+            return len(entries)
+
+    def history_file_lock(self) -> FileLock:
+        """Межпроцессная блокировка exchange_rates.json (запись и сжатие)."""
+        return FileLock(os.path.join(os.path.dirname(self.config.HISTORY_FILE_PATH)
+                                     or '.', 'history.lock'))
+
+    def _sync_last_history(self) -> None:
+        """Перечитывает последние курсы истории, если файл менял другой процесс.
+
+        Берёт их из хвостов колоночного хранилища, а без него читает
+        exchange_rates.json потоково, не загружая историю целиком.
+        """
+        try:
+            size = os.path.getsize(self.config.HISTORY_FILE_PATH)
+        except OSError:
+            size = None
+        if size == Storage._history_size:
+            return
+        Storage._last_history = self._columnar_last_history()
+        if Storage._last_history is None:
+            Storage._last_history = {}
+            try:
+                for entry in iter_json_array(self.config.HISTORY_FILE_PATH):
+                    key = f"{entry['from_currency']}_{entry['to_currency']}"
+                    Storage._last_history[key] = (entry["rate"], entry["timestamp"])
+            except (FileNotFoundError, ValueError):
+                pass
+        Storage._history_size = size
+
+    def _columnar_last_history(self) -> Optional[Dict[str, Tuple[float, str]]]:
+        """Последние курсы пар из хвостов колонок (None — хранилища нет)."""
+        from .history_store import ColumnarHistory, from_epoch_ms
+        columnar = ColumnarHistory(self.config)
+        if not columnar.exists():
+            return None
+        last_history = {}
+        for pair in columnar.pairs():
+            with columnar.open_pair(pair) as columns:
+                if len(columns.ts):
+                    last_history[pair] = (columns.rate[-1],
+                                          from_epoch_ms(columns.ts[-1]))
+        return last_history
 
     def _load_history(self) -> list:
         """Загружает историю курсов из exchange_rates.json."""
@@ -49,10 +263,41 @@ class Storage:
         except (FileNotFoundError, json.JSONDecodeError):
             return []
 
-    def load_rates(self) -> Dict[str, any]:
-        """Загружает курсы валют из rates.json."""
+    def _load_rates_with_patches(self) -> Tuple[Dict[str, any], int]:
+        corrupt = False
         try:
-            with open(self.config.RATES_FILE_PATH, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"pairs": {}, "last_refresh": None}
\ No newline at end of file
+            data = codecs.read_file(self.config.RATES_FILE_PATH)
+        except (FileNotFoundError, ValueError) as e:
+            # Правки журнала новее копии ложатся поверх неё, как поверх rates.json.
+            data = self._load_last_known_good()
+            corrupt = isinstance(e, ValueError)
+        data.setdefault("version", 0)
+        patches = 0
+        try:
+            with open(self.config.RATES_PATCH_FILE_PATH, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    # Считаются все записи журнала: от них зависит его сворачивание.
+                    patches += 1
+                    if record["version"] <= data["version"]:
+                        continue
+                    data["pairs"].update(record["pairs"])
+                    for key, updated_at in record["confirmed"].items():
+                        if key in data["pairs"]:
+                            data["pairs"][key]["updated_at"] = updated_at
+                    data["last_refresh"] = record["last_refresh"]
+                    data["version"] = record["version"]
+        except FileNotFoundError:
+            pass
+        if data["pairs"] and (corrupt or data["version"] and not patches
+                              and not os.path.exists(self.config.RATES_FILE_PATH)):
+            logger.warning(f"{self.config.RATES_FILE_PATH} is missing or corrupt, "
+                           f"serving last known good rates ({data['last_refresh']})")
+        return data, patches
+
+    def load_rates(self) -> Dict[str, any]:
+        """Загружает курсы валют: снимок rates.json плюс журнал правок."""
+        return self._load_rates_with_patches()[0]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import json
+import logging
+import math
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Dict, Optional
+
+import requests
+
+from ..core.exceptions import ApiRequestError
+from .api_clients import BaseApiClient
+from .config import ParserConfig
+from .registry import register_provider
+from .storage import Storage
+
+logger = logging.getLogger('ParserService')
+
+
+class StreamingClient(BaseApiClient):
+    """Долгоживущий клиент потока котировок в формате SSE."""
+    provider_name = "stream"
+
+    def __init__(self, config: ParserConfig, url: Optional[str] = None):
+        self.config = config
+        self.url = url or config.STREAM_URL
+        self._state: Dict[str, Dict[str, any]] = {}
+        self._dirty: Dict[str, Dict[str, any]] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._currencies = {config.BASE_CURRENCY, *config.FIAT_CURRENCIES,
+                            *config.CRYPTO_CURRENCIES}
+
+    def start(self) -> None:
+        """Запускает фоновое чтение потока (повторный вызов ничего не делает)."""
+        if self._thread and self._thread.is_alive():
+            return
+        if not self.url:
+            raise ValueError("PRICE_STREAM_URL не задан в переменных окружения")
+        self._stop.clear()
+        self._thread = Thread(target=self._consume_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает чтение потока."""
+        self._stop.set()
+
+    def _consume_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._consume()
+            except (requests.RequestException, ValueError) as e:
+                logger.error(f"Price stream {self.url} failed: {str(e)}")
+            except Exception:
+                # Поток должен переподключиться, а не умереть молча.
+                logger.exception(f"Price stream {self.url} failed unexpectedly")
+            self._stop.wait(self.config.STREAM_RECONNECT_DELAY)
+
+    def _consume(self) -> None:
+        with requests.get(self.url, stream=True,
+                          timeout=(self.config.REQUEST_TIMEOUT, None)) as response:
+            response.raise_for_status()
+            logger.info(f"Connected to price stream {self.url}")
+            for line in response.iter_lines(decode_unicode=True):
+                if self._stop.is_set():
+                    return
+                if line and line.startswith("data:"):
+                    try:
+                        self.apply_tick(json.loads(line[5:]))
+                    except ValueError as e:
+                        logger.warning(f"Skipping bad stream tick {line[5:200]!r}: {e}")#noqa: E501
+
+    def apply_tick(self, tick: Dict[str, any]) -> None:
+        """Применяет один тик вида {"pair": "BTC_USD", "rate": ..., "ts": ...}.
+
+        Тик без известной пары или с неположительным (нечисловым) курсом
+        отклоняется ValueError, состояние при этом не меняется.
+        """
+        if not isinstance(tick, dict):
+            raise ValueError("тик должен быть объектом")
+        pair = tick.get("pair")
+        key = pair.upper() if isinstance(pair, str) else ""
+        base, _, quote = key.partition("_")
+        if base not in self._currencies or quote not in self._currencies \
+                or base == quote:
+            raise ValueError(f"неизвестная пара {pair!r}")
+        rate = tick.get("rate")
+        if isinstance(rate, bool) or not isinstance(rate, (int, float, str)):
+            raise ValueError(f"некорректный курс {rate!r}")
+        try:
+            rate = float(rate)
+        except ValueError:
+            raise ValueError(f"некорректный курс {tick['rate']!r}") from None
+        if not math.isfinite(rate) or rate <= 0:
+            raise ValueError(f"курс должен быть положительным числом, получено {rate}")
+        ts = tick.get("ts")
+        record = {
+            "rate": rate,
+            "updated_at": ts if isinstance(ts, str) and ts \
+                else datetime.utcnow().isoformat() + "Z",
+            "source": str(tick.get("source") or "Stream"),
+            "providers": [self.provider_name]
+        }
+        with self._lock:
+            self._state[key] = record
+            self._dirty[key] = record
+
+    def drain(self) -> Dict[str, Dict[str, any]]:
+        """Возвращает пары, изменившиеся с прошлого вызова (последний тик на пару)."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def fetch_rates(self) -> Dict[str, Dict[str, any]]:
+        with self._lock:
+            rates = dict(self._state)
+        if not rates:
+            raise ApiRequestError("поток котировок ещё не прислал данных")
+        return rates
+
+class StreamIngestor:
+    """Периодически сбрасывает накопленные тики потока в rates.json."""
+    def __init__(self, client: StreamingClient, storage: Storage):
+        self.client = client
+        self.storage = storage
+        self.interval = client.config.STREAM_FLUSH_INTERVAL
+
+    def flush(self) -> int:
+        """Записывает изменившиеся пары и возвращает их количество."""
+        dirty = self.client.drain()
+        if dirty:
+            self.storage.merge_rates(dirty, datetime.utcnow().isoformat() + "Z")
+        return len(dirty)
+
+    def start(self) -> None:
+        self.client.start()
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f"Failed to flush stream ticks: {str(e)}")
+        Thread(target=run, daemon=True).start()
+
+_stream_client: Optional[StreamingClient] = None
+
+@register_provider("stream")
+def get_stream_client(config: ParserConfig) -> StreamingClient:
+    """Возвращает общий для процесса клиент потока."""
+    global _stream_client
+    if _stream_client is None:
+        _stream_client = StreamingClient(config)
+    return _stream_client
@@ -1,51 +1,169 @@
 #!/usr/bin/env python3
+import asyncio
 import logging
 from datetime import datetime
-from typing import List
+from typing import Any, Callable, Dict, List, Tuple
 
 from ..core.exceptions import ApiRequestError
-from .api_clients import BaseApiClient, CoinGeckoClient, ExchangeRateApiClient
+from .aggregator import RateAggregator
+from .api_clients import BaseApiClient
+from .async_clients import AsyncBaseApiClient, build_async_clients
+from .circuit import CircuitBreaker
 from .config import ParserConfig
+from .quota import take_quota
+from .registry import build_clients
 from .storage import Storage
 
 logger = logging.getLogger('ParserService')
 
 class RatesUpdater:
-    """Обновляет курсы валют из внешних API."""
+    """Обновляет курсы валют из внешних API.
+
+    Итог последнего обновления по каждому источнику — в report
+    ('ok', 'error', 'circuit_open' или 'quota' и пояснение).
+    """
     def __init__(self, clients: List[BaseApiClient], storage: Storage):
         self.clients = clients
         self.storage = storage
         self.config = ParserConfig()
+        self.breaker = CircuitBreaker()
+        self.listeners: List[Callable[[Dict[str, Dict[str, any]]], any]] = []
+        self.report: Dict[str, Tuple[str, str]] = {}
+
+    def add_listener(self, listener: Callable[[Dict[str, Dict[str, any]]], any]) -> None:#noqa: E501
+        """Подписывает обработчик на новые курсы после каждого обновления."""
+        self.listeners.append(listener)
+
+    def admit(self, provider: str, name: str) -> bool:
+        """Пропускает провайдера с разомкнутой цепью или без квоты (в report)."""
+        wait = self.breaker.allow(provider)
+        if wait > 0:
+            self.report[name] = ('circuit_open',
+                                 f"источник отключён после сбоев, проба через {wait:.0f} с")#noqa: E501
+            logger.warning(f"Skipping {name}: circuit open for {wait:.0f}s")
+            return False
+        try:
+            take_quota(provider, name)
+        except ApiRequestError as e:
+            self.report[name] = ('quota', e.message)
+            logger.error(f"Failed to fetch from {name}: {str(e)}")
+            return False
+        return True
+
+    def record(self, provider: str, name: str, rates: Any) -> bool:
+        """Учитывает ответ провайдера в report и автомате отключения."""
+        if isinstance(rates, ApiRequestError):
+            self.breaker.record_failure(provider, str(rates))
+            self.report[name] = ('error', rates.message)
+            logger.error(f"Failed to fetch from {name}: {str(rates)}")
+            return False
+        self.breaker.record_success(provider)
+        self.report[name] = ('ok', f"получено курсов: {len(rates)}")
+        logger.info(f"Fetching from {name}... OK ({len(rates)} rates)")
+        return True
 
     def run_update(self, source: str = None) -> int:
         """Обновляет курсы валют из указанного или всех источников."""
         logger.info("Starting rates update...")
-        all_rates = {}
-        updated_count = 0
+        self.report = {}
+        aggregator = RateAggregator(self.config)
         for client in self.clients:
             client_name = type(client).__name__.replace("Client", "")
-            if source and source.lower() != client_name.lower():
+            if source and source.lower() not in (client_name.lower(),
+                                                 client.provider_name):
+                continue
+            if not self.admit(client.provider_name, client_name):
                 continue
             try:
                 rates = client.fetch_rates()
-                all_rates.update(rates)
-                updated_count += len(rates)
-                logger.info(f"Fetching from {client_name}... OK ({len(rates)} rates)")
             except ApiRequestError as e:
-                logger.error(f"Failed to fetch from {client_name}: {str(e)}")
+                rates = e
+            if self.record(client.provider_name, client_name, rates):
+                aggregator.add(rates, client_name, client.provider_name)
+        return self.store(aggregator.aggregate(previous=self.stored_rates))
+
+    def stored_rates(self) -> Dict[str, Dict[str, any]]:
+        """Сохранённые курсы пар: опора агрегатора при расхождении источников."""
+        return self.storage.load_rates().get("pairs", {})
+
+    def store(self, all_rates: Dict[str, Dict[str, any]]) -> int:
+        """Записывает сведённые курсы и историю, возвращает число курсов."""
+        updated_count = len(all_rates)
         if all_rates:
             current_time = datetime.utcnow().isoformat() + "Z"
-            self.storage.save_rates(all_rates, current_time)
-            self.storage.save_history(all_rates)
-            logger.info(f"Writing {updated_count} rates to {self.config.RATES_FILE_PATH}...")#noqa: E501
+            changed = self.storage.merge_rates(all_rates, current_time)
+            history_count = self.storage.save_history(changed)
+            logger.info(f"Writing {len(changed)} changed of {updated_count} rates "
+                        f"to {self.config.RATES_FILE_PATH}, {history_count} to history")
+            for listener in self.listeners:
+                try:
+                    listener(all_rates)
+                except Exception as e:
+                    logger.error(f"Rates listener {listener!r} failed: {str(e)}")
         return updated_count
 
+class AsyncRatesUpdater:
+    """Асинхронно опрашивает все источники одновременно в одном цикле событий."""
+    def __init__(self, clients: List[AsyncBaseApiClient], storage: Storage):
+        self.clients = clients
+        self.storage = storage
+        self.config = ParserConfig()
+        self._writer = RatesUpdater([], storage)
+
+    async def run_update(self, source: str = None) -> int:
+        """Обновляет курсы; запись в файлы выполняется в пуле потоков."""
+        logger.info("Starting async rates update...")
+        writer = self._writer
+        writer.report = {}
+        clients = [client for client in self.clients
+                   if not source or source.lower() in (client.name.lower(),
+                                                       client.provider_name)]
+        clients = [client for client in clients
+                   if writer.admit(client.provider_name, client.name)]
+        results = await asyncio.gather(*(client.fetch_rates() for client in clients),
+                                       return_exceptions=True)
+        aggregator = RateAggregator(self.config)
+        for client, rates in zip(clients, results):
+            if isinstance(rates, BaseException) \
+                    and not isinstance(rates, ApiRequestError):
+                raise rates
+            if writer.record(client.provider_name, client.name, rates):
+                aggregator.add(rates, client.name, client.provider_name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: writer.store(aggregator.aggregate(previous=writer.stored_rates)))#noqa: E501
+
+    async def run_forever(self, interval: float) -> None:
+        """Фоновое обновление курсов рядом с обработкой запросов."""
+        try:
+            while True:
+                await self.run_update()
+                await asyncio.sleep(interval)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        for client in self.clients:
+            await client.close()
+
 def get_updater() -> RatesUpdater:
     """Создаёт экземпляр RatesUpdater."""
     config = ParserConfig()
-    clients = [
-        CoinGeckoClient(config),
-        ExchangeRateApiClient(config)
-    ]
+    clients = build_clients(config)
     storage = Storage(config)
-    return RatesUpdater(clients, storage)
\ No newline at end of file
+    updater = RatesUpdater(clients, storage)
+    from ..core.alerts import get_alert_engine
+    from ..core.orders import get_order_book
+    updater.add_listener(get_order_book().process)
+    updater.add_listener(get_alert_engine().process)
+    return updater
+
+def get_async_updater() -> AsyncRatesUpdater:
+    """Создаёт экземпляр AsyncRatesUpdater."""
+    config = ParserConfig()
+    updater = AsyncRatesUpdater(build_async_clients(config), Storage(config))
+    from ..core.alerts import get_alert_engine
+    from ..core.orders import get_order_book
+    updater._writer.add_listener(get_order_book().process)
+    updater._writer.add_listener(get_alert_engine().process)
+    return updater
\ No newline at end of file